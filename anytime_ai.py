@@ -0,0 +1,210 @@
+# The file contains an anytime computer player: it is given a time budget
+# for each move and refines its choice in stages until the budget runs out.
+#
+#   1. density: the densest cells of the probability-density strategy (see
+#      probability_density.py), which takes well under a millisecond.
+#   2. monte carlo: fleet layouts consistent with everything the player
+#      knows are sampled (see posterior_sampler.py), and the UNKNOWN cell
+#      covered by the most samples is chosen.
+#   3. exact: if the consistent layouts are few enough to list before the
+#      deadline, the UNKNOWN cell covered by the most of them is chosen.
+#   4. endgame: if at most endgame_layouts of the listed layouts differ, the
+#      shot that minimizes the expected number of moves left is searched
+#      for (see endgame_solver.py).  Given a DecisionCache (see zobrist.py),
+#      the shot found is kept by the position's hash, symmetries folded in,
+#      and the search is skipped when the position or a mirror image of it
+#      comes up again.
+#
+# A layout is consistent when no ship covers a MISS, every HIT is covered,
+# every sunk ship lies on HIT cells only and every ship still afloat covers
+# at least one cell that is not a HIT.  A stage's choice only replaces the
+# previous one once the stage has finished, so the move returned at the
+# deadline is always that of the deepest stage completed.  If listing the
+# layouts stops at MAX_EXACT_LAYOUTS, sampling continues until the deadline.
+
+import time
+from typing import NamedTuple
+from bitboard_grid import full_mask, cell_bit
+from endgame_solver import DEFAULT_MAX_LAYOUTS, solve_layouts
+from posterior_sampler import NODES_PER_CHECK, PosteriorSampler, \
+                              get_ship_placements, share_equal_placements, \
+                              list_layouts
+from probability_density import Observation, get_observation, \
+                                get_observation_guess_cells, add_to_counter, \
+                                get_densest_cells, choose_random_cell
+from zobrist import DecisionCache, solve_cached_endgame
+
+# The name of the strategy, for the server's NEW VERSUS command.
+ANYTIME_STRATEGY = 'anytime'
+
+# The default time budget of a move, in milliseconds.
+DEFAULT_DEADLINE_MS = 50
+
+# How far past its deadline, in milliseconds, a move may run: the clock is
+# only looked at between batches of work.
+DEADLINE_TOLERANCE_MS = 40
+
+# The share of the time budget spent sampling before trying to list every
+# consistent layout.
+MONTE_CARLO_SHARE = 0.5
+
+# The number of layouts drawn between looks at the clock.
+SAMPLE_BATCH = 32
+
+# The most different sets of cells covered by consistent layouts that the
+# exact stage lists before giving up.
+MAX_EXACT_LAYOUTS = 5000
+
+# The stages, from shallowest to deepest.
+DENSITY_DEPTH = 'density'
+MONTE_CARLO_DEPTH = 'monte carlo'
+EXACT_DEPTH = 'exact'
+ENDGAME_DEPTH = 'endgame'
+
+
+class MoveChoice(NamedTuple):
+    """A move chosen by choose_move: its row and column, the deepest stage
+    that was completed, the number of consistent layouts sampled and listed,
+    and the time taken in milliseconds."""
+    row: int
+    col: int
+    depth: str
+    samples: int
+    layouts: int
+    elapsed_ms: float
+
+
+def observe_journal(journal) -> Observation:
+    """Return the Observation of the player whose shots are recorded in
+    journal, a MoveJournal (see move_journal.py)."""
+    tracker = journal.tracker
+    sunk_sizes = [tracker.ship_sizes[i]
+                  for i in range(len(tracker.ship_sizes)) if tracker.is_sunk(i)]
+    return get_observation(journal.target_grid, tracker.afloat_sizes(),
+                           sunk_sizes)
+
+
+def _sample_layouts(sampler: PosteriorSampler, planes: list[int],
+                    until: float) -> int:
+    """Add the cells of layouts drawn by sampler to the bit-sliced counter
+    planes (see probability_density.py) until the clock passes until, and
+    return the number of layouts added."""
+    samples = 0
+    while time.perf_counter() < until:
+        try:
+            sampler.add_samples(planes, SAMPLE_BATCH)
+        except OverflowError:
+            # The layouts turned out too rare to draw in time
+            break
+        samples += SAMPLE_BATCH
+    return samples
+
+
+def choose_move(observation: Observation,
+                deadline_ms: float = DEFAULT_DEADLINE_MS,
+                endgame_layouts: int = DEFAULT_MAX_LAYOUTS,
+                cache: DecisionCache = None) -> MoveChoice:
+    """Return the move chosen for observation within about deadline_ms
+    milliseconds, and how far the search got.  The density stage always
+    runs, however small deadline_ms is, and the endgame stage only runs if
+    at most endgame_layouts consistent layouts are left.  The endgame
+    stage's shots are looked up in and added to cache if it is not None.
+    Raise ValueError if there is no UNKNOWN cell.
+
+    >>> observation = Observation(3, 0b10000, 0b101000101, (2,), ())
+    >>> choice = choose_move(observation, 20)
+    >>> [choice.row, choice.col] in [[0, 1], [1, 0], [1, 2], [2, 1]]
+    True
+    >>> choice.depth, choice.layouts
+    ('endgame', 4)
+    >>> choose_move(observation, 20, endgame_layouts=3).depth
+    'exact'
+    >>> cache = DecisionCache()
+    >>> choices = [choose_move(observation, 20, cache=cache) for _ in range(2)]
+    >>> choices[0][:2] == choices[1][:2], cache.hits
+    (True, 1)
+
+    The deadline also bounds the sampler's count of the layouts and the
+    listing of them, which can take far longer in a crowded mid-game.  The
+    move then takes at most about DEADLINE_TOLERANCE_MS more than the
+    deadline (benchmark_game_functions.py --anytime measures it):
+
+    >>> observation = Observation(10, 0x78100400000000000000,
+    ...                           0x40e8241201100800000, (5, 4, 3, 2), (3,))
+    >>> choice = choose_move(observation, 10)
+    >>> choice.depth in (DENSITY_DEPTH, MONTE_CARLO_DEPTH, EXACT_DEPTH,
+    ...                  ENDGAME_DEPTH)
+    True
+    >>> bit = cell_bit(choice.row, choice.col, 10)
+    >>> bit & (observation.hits | observation.misses)
+    0
+    >>> choice.elapsed_ms <= 10 + DEADLINE_TOLERANCE_MS  # doctest: +SKIP
+    True
+    """
+    start = time.perf_counter()
+    deadline = start + deadline_ms / 1000
+    grid_size = observation.grid_size
+    hits = observation.hits
+    unknown = full_mask(grid_size) & ~(hits | observation.misses)
+    if not unknown:
+        raise ValueError('there are no UNKNOWN cells left')
+
+    best = get_observation_guess_cells(observation)
+    depth = DENSITY_DEPTH
+
+    legal = share_equal_placements(get_ship_placements(observation))
+    planes = []
+    monte_carlo_deadline = start + deadline_ms * MONTE_CARLO_SHARE / 1000
+    sampler = None
+    if time.perf_counter() < monte_carlo_deadline:
+        try:
+            sampler = PosteriorSampler(observation, monte_carlo_deadline,
+                                       legal)
+        except (ValueError, OverflowError):
+            # No layout, or none found in time: skip sampling on this move
+            pass
+    samples = 0
+    if sampler is not None:
+        samples = _sample_layouts(sampler, planes, monte_carlo_deadline)
+    if get_densest_cells(planes, unknown):
+        best = get_densest_cells(planes, unknown)
+        depth = MONTE_CARLO_DEPTH
+
+    layouts = list_layouts(legal, hits, MAX_EXACT_LAYOUTS, deadline)
+    if layouts:
+        exact_planes = []
+        for i in range(len(layouts)):
+            if i % NODES_PER_CHECK == 0 and time.perf_counter() > deadline:
+                layouts = None
+                break
+            add_to_counter(exact_planes, layouts[i])
+        else:
+            if get_densest_cells(exact_planes, unknown):
+                best = get_densest_cells(exact_planes, unknown)
+                depth = EXACT_DEPTH
+            if cache is None:
+                solution = solve_layouts(layouts, unknown, grid_size,
+                                         endgame_layouts, deadline=deadline)
+            else:
+                solution = solve_cached_endgame(observation, cache,
+                                                endgame_layouts,
+                                                deadline=deadline,
+                                                layouts=layouts)
+            if solution is not None:
+                best = cell_bit(solution.row, solution.col, grid_size)
+                depth = ENDGAME_DEPTH
+    if layouts is None and sampler is not None:
+        samples += _sample_layouts(sampler, planes, deadline)
+        if get_densest_cells(planes, unknown):
+            best = get_densest_cells(planes, unknown)
+            depth = MONTE_CARLO_DEPTH
+
+    row, col = choose_random_cell(best, grid_size)
+    return MoveChoice(row, col, depth, samples,
+                      len(layouts) if layouts else 0,
+                      (time.perf_counter() - start) * 1000)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
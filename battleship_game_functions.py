@@ -148,6 +148,16 @@ def get_ship_symbol_count(fleet_grid: list[list[str]],
     >>> get_ship_symbol_count(grid, 'k')
     0
     """
+    if hasattr(fleet_grid, 'occupied_cells'):
+        return sum(1 for row, col in fleet_grid.occupied_cells()
+                   if fleet_grid[row][col] == ship_symbol)
+
+    count = 0
+    for row in fleet_grid:
+        for symbol in row:
+            if symbol == ship_symbol:
+                count += 1
+    return count
 
 
 def has_ship(fleet_grid: list[list[str]], row_start: int, col_start: int,
@@ -185,6 +195,25 @@ def has_ship(fleet_grid: list[list[str]], row_start: int, col_start: int,
     >>> has_ship(grid, 0, 0, 'b', 3)
     False
     """
+    run_index = getattr(fleet_grid, 'run_index', None)
+    if run_index is not None:
+        return run_index.has_ship(row_start, col_start, ship_symbol, ship_size)
+
+    grid_size = len(fleet_grid)
+    if fleet_grid[row_start][col_start] != ship_symbol:
+        return False
+
+    across = 0
+    while col_start + across < grid_size \
+          and fleet_grid[row_start][col_start + across] == ship_symbol:
+        across += 1
+    down = 0
+    while row_start + down < grid_size \
+          and fleet_grid[row_start + down][col_start] == ship_symbol:
+        down += 1
+
+    return (across == ship_size and down == 1) \
+           or (down == ship_size and across == 1)
 
 
 def validate_symbol_counts(fleet_grid: list[list[str]],
@@ -226,6 +255,28 @@ def validate_symbol_counts(fleet_grid: list[list[str]],
     >>> validate_symbol_counts(grid, ships, sizes)
     False
     """
+    if hasattr(fleet_grid, 'occupied_cells'):
+        # Count every symbol in one pass over the ship cells
+        counts = {}
+        for row, col in fleet_grid.occupied_cells():
+            symbol = fleet_grid[row][col]
+            counts[symbol] = counts.get(symbol, 0) + 1
+        for i in range(len(ship_symbols)):
+            if counts.get(ship_symbols[i], 0) != ship_sizes[i]:
+                return False
+        return sum(counts.values()) == sum(ship_sizes)
+
+    for i in range(len(ship_symbols)):
+        if get_ship_symbol_count(fleet_grid, ship_symbols[i]) \
+           != ship_sizes[i]:
+            return False
+
+    ship_cell_count = 0
+    for row in fleet_grid:
+        for symbol in row:
+            if symbol != EMPTY:
+                ship_cell_count += 1
+    return ship_cell_count == sum(ship_sizes)
 
 
 def validate_ship_positions(fleet_grid: list[list[str]],
@@ -259,6 +310,58 @@ def validate_ship_positions(fleet_grid: list[list[str]],
     >>> validate_ship_positions(grid, ships, sizes)
     False
     """
+    if hasattr(fleet_grid, 'occupied_cells'):
+        # Find every ship start in one pass over the ship cells
+        starts = {}
+        for row, col in fleet_grid.occupied_cells():
+            symbol = fleet_grid[row][col]
+            if symbol not in starts or [row, col] < starts[symbol]:
+                starts[symbol] = [row, col]
+        for i in range(len(ship_symbols)):
+            start = starts.get(ship_symbols[i], [])
+            if start == [] or not has_ship(fleet_grid, start[0], start[1],
+                                           ship_symbols[i], ship_sizes[i]):
+                return False
+        return True
+
+    for i in range(len(ship_symbols)):
+        start = find_ship_start(fleet_grid, ship_symbols[i])
+        if start == [] or not has_ship(fleet_grid, start[0], start[1],
+                                       ship_symbols[i], ship_sizes[i]):
+            return False
+    return True
+
+
+def find_ship_start(fleet_grid: list[list[str]],
+                    ship_symbol: str) -> list[int]:
+    """Return the row and column of the top-most/left-most occurrence of
+    ship_symbol in fleet_grid, or an empty list if ship_symbol does not appear
+    in fleet_grid.
+
+    Preconditions:
+        - 0 < len(fleet_grid)
+        - len(fleet_grid[i]) == len(fleet_grid)
+              for each value of i in range(len(fleet_grid))
+
+    >>> grid = [[EMPTY, 'b', EMPTY], [EMPTY, 'b', EMPTY], ['a', 'a', 'a']]
+    >>> find_ship_start(grid, 'b')
+    [0, 1]
+    >>> find_ship_start(grid, 'c')
+    []
+    """
+    run_index = getattr(fleet_grid, 'run_index', None)
+    if run_index is not None:
+        return run_index.ship_start(ship_symbol)
+    if hasattr(fleet_grid, 'occupied_cells'):
+        cells = [[row, col] for row, col in fleet_grid.occupied_cells()
+                 if fleet_grid[row][col] == ship_symbol]
+        return min(cells, default=[])
+
+    for row in range(len(fleet_grid)):
+        for col in range(len(fleet_grid)):
+            if fleet_grid[row][col] == ship_symbol:
+                return [row, col]
+    return []
 
 
 if __name__ == '__main__':
@@ -346,53 +449,74 @@ def randomly_place_ship(fleet_grid: list[list[str]], ship_symbol: str,
 
 
 def generate_fleet_grid(grid_size: int, ship_symbols: list[str],
-                        ship_sizes: list[int]) -> list[list[str]]:
+                        ship_sizes: list[int],
+                        uniform: bool = False) -> list[list[str]]:
     """Return a new grid_size by grid_size fleet grid using the ship symbols
-    in ship_symbols and the corresponding ship sizes in ship_sizes."""
-    fleet_grid = make_empty_fleet_grid(grid_size)
-
-    for index in range(len(ship_symbols) - 1, -1, -1):
-        ship = ship_symbols[index]
-        ship_size = ship_sizes[index]
-        placed = False
-        while not placed:
-            placed = randomly_place_ship(fleet_grid, ship, ship_size)
+    in ship_symbols and the corresponding ship sizes in ship_sizes.
 
+    If uniform is True, every possible fleet layout is equally likely.  Raise
+    ValueError if the ships cannot all be placed (see fleet_placement.py)."""
+    # Imported here because fleet_placement imports this module
+    from fleet_placement import place_fleet, fill_fleet_grid
+    fleet_grid = make_empty_fleet_grid(grid_size)
+    placements = place_fleet(grid_size, ship_sizes, uniform)
+    fill_fleet_grid(fleet_grid, ship_symbols, placements)
     return fleet_grid
 
 
 def make_computer_guess(target_grid: list[list[str]]) -> list[int]:
     """Return row and column indexes for a randomly chosen UNKNOWN cell in the
-    target_grid to use as the computer's next guess."""
+    target_grid to use as the computer's next guess.
+
+    If target_grid keeps an unknown_pool (see unknown_cell_pool.py), the guess
+    is a single draw from it.  Otherwise random cells are tried, falling back
+    to a scan of the grid once grid_size * grid_size tries have failed.
+    Raise ValueError if target_grid has no UNKNOWN cell."""
+    pool = getattr(target_grid, 'unknown_pool', None)
+    if pool is not None:
+        return pool.choose()
+
     grid_size = len(target_grid)
     row = randint(0, grid_size - 1)
     col = randint(0, grid_size - 1)
+    tries = 1
     while target_grid[row][col] != UNKNOWN:
+        if tries == grid_size * grid_size:
+            from unknown_cell_pool import UnknownCellPool
+            return UnknownCellPool(target_grid).choose()
         row = randint(0, grid_size - 1)
         col = randint(0, grid_size - 1)
+        tries += 1
     return [row, col]
 
 
-def display_grid(grid: list[list[str]]) -> None:
+def display_grid(grid: list[list[str]], renderer=None) -> None:
     """Print grid, a list of lists representing a grid, with each list on a
-    new line."""
-    for row in grid:
-        print(' '.join(row))
+    new line, in one call, or draw it with renderer, a GridRenderer (see
+    grid_renderer.py), if renderer is not None."""
+    if renderer is None:
+        print(''.join(' '.join(row) + '\n' for row in grid), end='')
+    else:
+        renderer.render_grid(grid)
 
 
-def human_player_move(target_grid: list[list[str]]) -> tuple[int, int]:
+def human_player_move(target_grid: list[list[str]],
+                      renderer=None) -> tuple[int, int]:
     """Return the row and column indexes for the human player's guess on
-    the target_grid."""
+    the target_grid.  The prompts go through renderer, a GridRenderer (see
+    grid_renderer.py), if renderer is not None."""
+    show = print if renderer is None else renderer.print
+    ask = input if renderer is None else renderer.input
     grid_size = len(target_grid)
-    print('Enter your guess in the format row,col (e.g., 1,2)')
-    guess = input('> ')
+    show('Enter your guess in the format row,col (e.g., 1,2)')
+    guess = ask('> ')
     guess_parts = guess.split(',')
     row = int(guess_parts[0]) - 1
     col = int(guess_parts[1]) - 1
     while not valid_cell_indexes(row, col, grid_size) \
           or target_grid[row][col] != UNKNOWN:
-        print('Please enter a valid guess in the format row,col')
-        guess = input('> ')
+        show('Please enter a valid guess in the format row,col')
+        guess = ask('> ')
         guess_parts = guess.split(',')
         row = int(guess_parts[0]) - 1
         col = int(guess_parts[1]) - 1
@@ -400,10 +524,18 @@ def human_player_move(target_grid: list[list[str]]) -> tuple[int, int]:
 
 
 
-def computer_player_move(target_grid: list[list[str]]) -> tuple[int, int]:
+def computer_player_move(target_grid: list[list[str]], strategy=None,
+                         afloat_sizes: list[int] = (),
+                         sunk_sizes: list[int] = ()) -> tuple[int, int]:
     """Return the row and column indexes for the computer player's guess on
-    the target_grid."""
-    return make_computer_guess(target_grid)
+    the target_grid, chosen by strategy (a Strategy, see strategies.py) when
+    the ships in afloat_sizes are afloat and those in sunk_sizes are sunk.
+    Without a strategy, the guess is a random UNKNOWN cell."""
+    if strategy is None:
+        return make_computer_guess(target_grid)
+    from probability_density import get_observation
+    return strategy.next_shot(get_observation(target_grid, afloat_sizes,
+                                              sunk_sizes))
 
 
 def process_player_move(row: int, col: int, target_grid: list[list[str]],
@@ -418,20 +550,33 @@ def process_player_move(row: int, col: int, target_grid: list[list[str]],
 
 
 def get_ship_symbols(ship_sizes: list[int]) -> list[str]:
-    """Return a list of uppercase letters of length len(ship_sizes) starting
-    with 'A'."""
-    symbols = []
-    current_symbol = 'A'
-    for _ in ship_sizes:
-        symbols.append(current_symbol)
-        current_symbol = chr(ord(current_symbol) + 1)
-    return symbols
+    """Return a list of distinct lower-case ship symbols of length
+    len(ship_sizes) starting with 'a' (see ship_table.py).  Lower-case
+    symbols keep upper case free to show hits, and looking a symbol up in
+    the returned list with index takes constant time.  Only the first 56
+    symbols, up to 'ÿ', fit in the Latin-1 bytes of a GameState (see
+    game_state.py).
+
+    >>> get_ship_symbols([5, 4, 3])
+    ['a', 'b', 'c']
+    """
+    from ship_table import make_ship_symbols
+    return make_ship_symbols(len(ship_sizes))
 
 
 
-def play_game(grid_size: int, ship_sizes: list[int]) -> None:
-    """Play a game of Battleship until the player or computer wins."""
+def play_game(grid_size: int, ship_sizes: list[int],
+              strategy_name: str = 'random', renderer=None) -> None:
+    """Play a game of Battleship until the player or computer wins, with the
+    computer using the strategy registered as strategy_name (see
+    strategies.py).  If renderer, a GridRenderer (see grid_renderer.py), is
+    not None, the four grids are drawn by it as one frame, redrawing only
+    what changed since the previous turn, and the prompts go through it."""
+    from ship_tracker import ShipTracker, WIN_RESULT
+    from strategies import get_strategy
     ship_symbols = get_ship_symbols(ship_sizes)
+    strategy = get_strategy(strategy_name)
+    strategy.new_game(grid_size, ship_sizes)
 
     # Create the fleet grid for the human player
     human_fleet_grid = generate_fleet_grid(grid_size, ship_symbols, ship_sizes)
@@ -439,57 +584,65 @@ def play_game(grid_size: int, ship_sizes: list[int]) -> None:
     # Create the fleet grid for the computer player
     computer_fleet_grid = generate_fleet_grid(grid_size, ship_symbols, ship_sizes)
 
+    # Track the ships of each fleet so that a win is seen as soon as the
+    # last ship cell is hit
+    human_tracker = ShipTracker(human_fleet_grid, ship_symbols, ship_sizes)
+    computer_tracker = ShipTracker(computer_fleet_grid, ship_symbols,
+                                   ship_sizes)
+
     # Create the target grid for the human player
-    human_target_grid = make_empty_fleet_grid(grid_size)
+    human_target_grid = [[UNKNOWN] * grid_size for _ in range(grid_size)]
 
     # Create the target grid for the computer player
-    computer_target_grid = make_empty_fleet_grid(grid_size)
+    computer_target_grid = [[UNKNOWN] * grid_size for _ in range(grid_size)]
 
+    panels = [("Your target grid:", human_target_grid),
+              ("Your fleet grid:", human_fleet_grid),
+              ("Opponent's target grid:", computer_target_grid),
+              ("Opponent's fleet grid:", computer_fleet_grid)]
+    show = print if renderer is None else renderer.print
     player_turn = True
 
     while True:
+        if renderer is None:
+            for title, grid in panels:
+                print(title)
+                display_grid(grid)
+        else:
+            renderer.render_panels(panels)
+
         if player_turn:
-            print("Your target grid:")
-            display_grid(human_target_grid)
-            print("Your fleet grid:")
-            display_grid(human_fleet_grid)
-            print("Opponent's target grid:")
-            display_grid(computer_target_grid)
-            print("Opponent's fleet grid:")
-            display_grid(computer_fleet_grid)
-
-            print("Your turn!")
-            move = human_player_move(computer_fleet_grid)
-            process_player_move(move[0], move[1], computer_target_grid,
+            show("Your turn!")
+            move = human_player_move(human_target_grid, renderer)
+            process_player_move(move[0], move[1], human_target_grid,
                                 computer_fleet_grid)
 
-            if is_win(ship_sizes, human_target_grid):
-                print("You win!")
+            if computer_tracker.shoot(move[0], move[1]).kind == WIN_RESULT:
+                show("You win!")
                 break
         else:
-            print("Your target grid:")
-            display_grid(human_target_grid)
-            print("Your fleet grid:")
-            display_grid(human_fleet_grid)
-            print("Opponent's target grid:")
-            display_grid(computer_target_grid)
-            print("Opponent's fleet grid:")
-            display_grid(computer_fleet_grid)
-
-            print("Opponent's turn!")
-            move = computer_player_move(human_fleet_grid)
-            process_player_move(move[0], move[1], human_target_grid,
+            show("Opponent's turn!")
+            sunk_sizes = [ship_sizes[i] for i in range(len(ship_sizes))
+                          if human_tracker.is_sunk(i)]
+            move = computer_player_move(computer_target_grid, strategy,
+                                        human_tracker.afloat_sizes(),
+                                        sunk_sizes)
+            process_player_move(move[0], move[1], computer_target_grid,
                                 human_fleet_grid)
 
-            if is_win(ship_sizes, computer_target_grid):
-                print("Opponent wins!")
+            if human_tracker.shoot(move[0], move[1]).kind == WIN_RESULT:
+                show("Opponent wins!")
                 break
 
         player_turn = not player_turn
 
 
 if __name__ == '__main__':
+    import sys
+    from grid_renderer import GridRenderer
     grid_size = 5
     ship_sizes = [2, 3]
-    play_game(grid_size, ship_sizes)
+    # Redraw in place on a terminal, and print every turn otherwise
+    play_game(grid_size, ship_sizes,
+              renderer=GridRenderer() if sys.stdout.isatty() else None)
 
@@ -0,0 +1,410 @@
+# The file contains an asyncio game server that hosts many games at once
+# over a line-based TCP protocol, and a load test that measures it.
+#
+# Each connection plays one game at a time.  Commands, one per line:
+#
+#     NEW SINGLE <grid size> <ship sizes...>
+#         start a single-player game against a random fleet
+#     NEW VERSUS <strategy> <grid size> <ship sizes...>
+#         start a game against a computer player that uses the strategy
+#         registered under that name (see strategies.py); a strategy that
+#         thinks for deadline_ms milliseconds, like 'anytime' (see
+#         anytime_ai.py), gets AI_DEADLINE_MS per move
+#     MOVE <row> <col>
+#         fire at (row, col); the reply is MISS, HIT, SUNK <symbol> <size> or
+#         WIN <moves>, followed in a versus game by the computer's reply
+#         AI <row> <col> <result>, where a winning result is LOSE <moves>
+#     SHOW
+#         the grids, as display_grids prints them, followed by END
+#     RESUME <id>
+#         continue the game with the id sent in reply to its NEW command,
+#         for example after reconnecting
+#     QUIT
+#         BYE, and the connection is closed
+#
+# NEW replies OK <id>, and every other reply is OK or ERR <reason>.  A
+# session holds only its move journals (see move_journal.py), and sessions
+# are kept in a SessionStore (see session_store.py), which moves idle games
+# to a SQLite file, so each computer move is chosen by a fresh strategy
+# object that sees only the Observation.  Fleets are generated and computer
+# moves are chosen in the event loop's default executor, so a slow computer
+# move does not hold up the other sessions.
+#
+# Run a server with:
+#     python battleship_server.py --port 8765
+# or measure one with a load test of 1000 concurrent sessions:
+#     python battleship_server.py --load-test 1000
+
+import argparse
+import asyncio
+import math
+import random
+import sys
+import time
+from battleship_game_functions import EMPTY, UNKNOWN, valid_cell_indexes, \
+                                      is_not_given_symbol, get_ship_symbols
+from computer_play_functions import generate_fleet_grid
+from play_battleship_game import validate_game_parameters
+from move_journal import MoveJournal, ShotRecord
+from session_store import GameSession, SessionStore, DEFAULT_MEMORY_BUDGET
+from ship_tracker import SUNK_RESULT, WIN_RESULT
+from grid_renderer import format_grids
+from anytime_ai import DEFAULT_DEADLINE_MS, observe_journal
+from probability_density import Observation
+from strategies import get_strategy, get_strategy_names
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_DATABASE = 'sessions.sqlite3'
+
+# The game played by each load test session.
+LOAD_TEST_GRID_SIZE = 10
+LOAD_TEST_SHIP_SIZES = [5, 4, 3, 3, 2]
+LOAD_TEST_STRATEGY = 'density'
+
+# The time budget of each move of the anytime computer player, in
+# milliseconds.
+AI_DEADLINE_MS = DEFAULT_DEADLINE_MS
+
+
+def describe_shot(record: ShotRecord, journal: MoveJournal) -> str:
+    """Return the protocol reply for the shot in record, which was made
+    through journal.
+
+    >>> journal = MoveJournal([['a', 'b'], [EMPTY, EMPTY]],
+    ...                       [[UNKNOWN] * 2 for _ in range(2)], ['a', 'b'],
+    ...                       [1, 1], [0, 0])
+    >>> describe_shot(journal.shoot(0, 1), journal)
+    'SUNK b 1'
+    """
+    if record.kind == WIN_RESULT:
+        return f'WIN {journal.num_moves()}'
+    if record.kind == SUNK_RESULT:
+        table = journal.tracker.table
+        return f'SUNK {table.symbol_of(record.ship_index)} ' \
+               f'{table.sizes[record.ship_index]}'
+    if record.ship_index == -1:
+        return 'MISS'
+    return 'HIT'
+
+
+def parse_new_game(words: list[str]) -> list:
+    """Return [strategy, grid size, ship sizes] for the words of a NEW
+    command after NEW, with strategy None for a single-player game.  Raise
+    ValueError if the command is not valid.
+
+    >>> parse_new_game(['VERSUS', 'density', '10', '5', '4'])
+    ['density', 10, [5, 4]]
+    >>> parse_new_game(['SINGLE', '0', '1'])
+    Traceback (most recent call last):
+    ...
+    ValueError: invalid grid size or ship sizes
+    >>> parse_new_game(['SINGLE', '3', '4'])
+    Traceback (most recent call last):
+    ...
+    ValueError: a ship is longer than the grid
+    """
+    if len(words) >= 3 and words[0] == 'SINGLE':
+        strategy = None
+        numbers = words[1:]
+    elif len(words) >= 4 and words[0] == 'VERSUS':
+        strategy = words[1]
+        numbers = words[2:]
+    else:
+        raise ValueError('usage: NEW SINGLE|VERSUS [strategy] size sizes...')
+    if strategy is not None and strategy not in get_strategy_names():
+        raise ValueError(f'unknown strategy {strategy}')
+    if not all(number.isdigit() for number in numbers):
+        raise ValueError('invalid grid size or ship sizes')
+    grid_size = int(numbers[0])
+    ship_sizes = [int(number) for number in numbers[1:]]
+    empty_grid = [[EMPTY] * grid_size for _ in range(grid_size)]
+    if not validate_game_parameters(empty_grid, get_ship_symbols(ship_sizes),
+                                    ship_sizes):
+        raise ValueError('invalid grid size or ship sizes')
+    if max(ship_sizes) > grid_size:
+        raise ValueError('a ship is longer than the grid')
+    return [strategy, grid_size, ship_sizes]
+
+
+async def new_session(words: list[str]) -> GameSession:
+    """Return a new session for the words of a NEW command after NEW.  Raise
+    ValueError if the command is not valid or the fleet cannot be placed."""
+    strategy, grid_size, ship_sizes = parse_new_game(words)
+    ship_symbols = get_ship_symbols(ship_sizes)
+    loop = asyncio.get_running_loop()
+    num_fleets = 1 if strategy is None else 2
+    fleet_grids = []
+    for _ in range(num_fleets):
+        fleet_grids.append(await loop.run_in_executor(
+            None, generate_fleet_grid, grid_size, ship_symbols, ship_sizes))
+
+    journals = []
+    for fleet_grid in fleet_grids:
+        target_grid = [[UNKNOWN] * grid_size for _ in range(grid_size)]
+        journals.append(MoveJournal(fleet_grid, target_grid, ship_symbols,
+                                    ship_sizes, [0] * len(ship_sizes)))
+    if strategy is None:
+        return GameSession(journals[0])
+    return GameSession(journals[0], journals[1], strategy)
+
+
+async def play_move(session: GameSession, words: list[str]) -> list[str]:
+    """Return the reply lines to the words of a MOVE command after MOVE in
+    session.  Raise ValueError if the move is not valid.  If the computer
+    fails to choose its move, the player's shot is undone and the error is
+    raised again."""
+    journal = session.journal
+    if len(words) != 2 or not words[0].isdigit() or not words[1].isdigit():
+        raise ValueError('usage: MOVE row col')
+    row, col = int(words[0]), int(words[1])
+    grid_size = len(journal.target_grid)
+    if not valid_cell_indexes(row, col, grid_size):
+        raise ValueError('the cell is not on the grid')
+    if is_game_over(session):
+        raise ValueError('the game is over')
+    if is_not_given_symbol(row, col, journal.target_grid, UNKNOWN):
+        raise ValueError('the cell has already been shot at')
+
+    ship_sizes = journal.tracker.ship_sizes
+    record = journal.shoot(row, col)
+    replies = [describe_shot(record, journal)]
+    if session.ai_journal is None or record.kind == WIN_RESULT:
+        return replies
+
+    ai_journal = session.ai_journal
+    loop = asyncio.get_running_loop()
+    try:
+        ai_row, ai_col = await loop.run_in_executor(
+            None, choose_shot_before, session.strategy, ship_sizes,
+            observe_journal(ai_journal),
+            time.perf_counter() + AI_DEADLINE_MS / 1000)
+    except Exception:
+        # Take the player's shot back, so the turns stay in step
+        journal.undo()
+        raise
+    ai_record = ai_journal.shoot(ai_row, ai_col)
+    result = describe_shot(ai_record, ai_journal)
+    replies.append(f'AI {ai_row} {ai_col} {result.replace("WIN", "LOSE")}')
+    return replies
+
+
+def choose_shot_before(strategy_name: str, ship_sizes: list[int],
+                       observation: Observation, deadline: float) -> list[int]:
+    """Return the [row, col] that the strategy registered as strategy_name
+    shoots at next for observation, in a game against ships of the sizes in
+    ship_sizes.  A strategy with a deadline_ms thinks until deadline on the
+    time.perf_counter clock, so that time spent waiting for a worker thread
+    counts against the move's budget.
+
+    >>> choose_shot_before('density', [1], Observation(2, 0, 0b111, (1,), ()),
+    ...                    time.perf_counter() + 1)
+    [1, 1]
+    """
+    strategy = get_strategy(strategy_name)
+    if hasattr(strategy, 'deadline_ms'):
+        strategy.deadline_ms = max(0.0,
+                                   (deadline - time.perf_counter()) * 1000)
+    strategy.new_game(observation.grid_size, ship_sizes)
+    return strategy.next_shot(observation)
+
+
+def is_game_over(session: GameSession) -> bool:
+    """Return True if and only if a player has won the game in session."""
+    return session.journal.tracker.has_won() \
+        or session.ai_journal is not None \
+        and session.ai_journal.tracker.has_won()
+
+
+def show_session(session: GameSession) -> list[str]:
+    """Return the reply lines to a SHOW command in session: the player's
+    target grid and own fleet grid, as display_grids prints them."""
+    own_journal = session.journal if session.ai_journal is None \
+        else session.ai_journal
+    grids = format_grids(session.journal.target_grid, own_journal.fleet_grid)
+    return grids.splitlines() + ['END']
+
+
+async def handle_client(reader: asyncio.StreamReader,
+                        writer: asyncio.StreamWriter,
+                        store: SessionStore) -> None:
+    """Serve the commands sent on one connection, with the sessions in
+    store, until QUIT or the end of the connection.  Finished games are
+    removed from store when a new game is started or the player quits."""
+    session_id = None
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            words = line.decode('ascii', 'replace').split()
+            command = words[0].upper() if words else ''
+            try:
+                if command == 'NEW':
+                    session = await new_session(words[1:])
+                    _remove_if_over(store, session_id)
+                    session_id = store.add(session)
+                    replies = [f'OK {session_id}']
+                elif command == 'RESUME':
+                    if len(words) != 2:
+                        raise ValueError('usage: RESUME id')
+                    try:
+                        store.get(words[1])
+                    except KeyError:
+                        raise ValueError(f'unknown game {words[1]}')
+                    session_id = words[1]
+                    replies = ['OK']
+                elif command == 'QUIT':
+                    _remove_if_over(store, session_id)
+                    writer.write(b'BYE\n')
+                    break
+                elif session_id is None:
+                    raise ValueError('no game; send NEW first')
+                elif command == 'MOVE':
+                    session = store.get(session_id)
+                    replies = await play_move(session, words[1:])
+                    store.put(session_id, session)
+                elif command == 'SHOW':
+                    replies = show_session(store.get(session_id))
+                else:
+                    raise ValueError(f'unknown command {command!r}')
+            except ValueError as error:
+                replies = [f'ERR {error}']
+            except Exception as error:
+                # A failure to create a game or choose a computer move ends
+                # the command, not the connection
+                replies = [f'ERR {type(error).__name__}: {error}']
+            writer.write(''.join(reply + '\n' for reply in replies).encode())
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+def _remove_if_over(store: SessionStore, session_id: str) -> None:
+    """Remove the session with id session_id from store if its game is
+    over.  Do nothing if session_id is None or not in store."""
+    if session_id is not None:
+        try:
+            if is_game_over(store.get(session_id)):
+                store.remove(session_id)
+        except KeyError:
+            pass
+
+
+async def serve(host: str, port: int, database: str,
+                memory_budget: int = DEFAULT_MEMORY_BUDGET) -> None:
+    """Run a game server on host and port, with evicted sessions kept in the
+    SQLite file database, until it is cancelled."""
+    store = SessionStore(database, memory_budget)
+    server = await asyncio.start_server(
+        lambda reader, writer: handle_client(reader, writer, store),
+        host, port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        store.close()
+
+
+def get_percentile(values: list[float], fraction: float) -> float:
+    """Return the nearest-rank fraction percentile of values.
+
+    >>> get_percentile([4.0, 1.0, 3.0, 2.0], 0.5), get_percentile([1.0], 0.99)
+    (2.0, 1.0)
+    """
+    ordered = sorted(values)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+
+async def run_client(host: str, port: int, latencies: list[float]) -> int:
+    """Play one versus game on the server at host and port with random
+    moves, append the latency in seconds of each MOVE to latencies and
+    return the number of moves made."""
+    reader, writer = await asyncio.open_connection(host, port)
+    sizes = ' '.join(str(size) for size in LOAD_TEST_SHIP_SIZES)
+    writer.write(f'NEW VERSUS {LOAD_TEST_STRATEGY} {LOAD_TEST_GRID_SIZE} '
+                 f'{sizes}\n'.encode())
+    await reader.readline()
+    cells = [(row, col) for row in range(LOAD_TEST_GRID_SIZE)
+             for col in range(LOAD_TEST_GRID_SIZE)]
+    random.shuffle(cells)
+    moves = 0
+    for row, col in cells:
+        start = time.perf_counter()
+        writer.write(f'MOVE {row} {col}\n'.encode())
+        await writer.drain()
+        reply = (await reader.readline()).decode()
+        if not reply.startswith('WIN'):
+            reply = (await reader.readline()).decode()
+        latencies.append(time.perf_counter() - start)
+        moves += 1
+        if reply.startswith('WIN') or ' LOSE ' in reply:
+            break
+    writer.write(b'QUIT\n')
+    await reader.readline()
+    writer.close()
+    return moves
+
+
+async def run_load_test(num_sessions: int, host: str = DEFAULT_HOST,
+                        port: int = 0,
+                        memory_budget: int = DEFAULT_MEMORY_BUDGET) -> dict:
+    """Start a server on host and port (any free port if port is 0), with
+    an in-memory database and a memory budget of memory_budget bytes, play
+    num_sessions concurrent versus games against it and return a dictionary
+    of the number of sessions, the total moves, the elapsed seconds, the
+    moves per second, the median and 99th percentile move latency in
+    milliseconds and the number of sessions evicted and restored."""
+    store = SessionStore(':memory:', memory_budget)
+    server = await asyncio.start_server(
+        lambda reader, writer: handle_client(reader, writer, store),
+        host, port, backlog=num_sessions)
+    port = server.sockets[0].getsockname()[1]
+    latencies = []
+    start = time.perf_counter()
+    async with server:
+        moves = await asyncio.gather(*[run_client(host, port, latencies)
+                                       for _ in range(num_sessions)])
+    elapsed = time.perf_counter() - start
+    return {'sessions': num_sessions,
+            'moves': sum(moves),
+            'seconds': elapsed,
+            'moves_per_second': sum(moves) / elapsed,
+            'p50_ms': get_percentile(latencies, 0.5) * 1000,
+            'p99_ms': get_percentile(latencies, 0.99) * 1000,
+            'evictions': store.evictions,
+            'restores': store.restores}
+
+
+def main(arguments: list[str]) -> int:
+    """Run the server, or a load test, as described by the command-line
+    arguments and return the exit status."""
+    parser = argparse.ArgumentParser(description='Serve Battleship games.')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--load-test', type=int, metavar='SESSIONS',
+                        help='measure a server with this many sessions')
+    parser.add_argument('--database', default=DEFAULT_DATABASE,
+                        help='the SQLite file for idle sessions')
+    parser.add_argument('--memory-budget', type=float,
+                        default=DEFAULT_MEMORY_BUDGET / 2 ** 20,
+                        help='the memory for sessions, in MiB')
+    options = parser.parse_args(arguments)
+    memory_budget = int(options.memory_budget * 2 ** 20)
+
+    if options.load_test:
+        report = asyncio.run(run_load_test(options.load_test, options.host,
+                                           memory_budget=memory_budget))
+        for name, value in report.items():
+            print(f'{name:20} {value:12.2f}')
+    else:
+        asyncio.run(serve(options.host, options.port, options.database,
+                          memory_budget))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,247 @@
+# The file contains a microbenchmark suite for the public functions in
+# battleship_game_functions.py.
+#
+# Each function is timed on fleet grids of several sizes and fleet densities
+# (the fraction of cells covered by ships).  Results can be saved as JSON and
+# a later run can be compared against a saved baseline, failing when a
+# function got slower by more than a threshold.
+#
+# Run it from the command line, for example:
+#     python benchmark_game_functions.py --save baseline.json
+#     python benchmark_game_functions.py --compare baseline.json
+#
+# With --anytime, it instead times the anytime player's moves (see
+# anytime_ai.py) on a crowded mid-game and fails when a move runs more than
+# DEADLINE_TOLERANCE_MS past its deadline.
+
+import argparse
+import io
+import json
+import platform
+import sys
+import timeit
+from contextlib import redirect_stdout
+import battleship_game_functions as bgf
+from anytime_ai import DEADLINE_TOLERANCE_MS, choose_move
+from fleet_placement import place_fleet, fill_fleet_grid
+from probability_density import Observation
+
+DEFAULT_GRID_SIZES = [5, 10]
+DEFAULT_DENSITIES = [0.2, 0.5]
+
+# A function regresses when it takes more than (1 + DEFAULT_THRESHOLD) times
+# its baseline time.
+DEFAULT_THRESHOLD = 0.25
+
+# The number of timing runs; the fastest one is reported.
+REPEATS = 5
+
+# The ship sizes used, in turn, to fill a fleet to the requested density.
+FLEET_SHIP_SIZES = [5, 4, 3, 3, 2]
+
+# The crowded mid-game on which the anytime player's moves are timed, the
+# deadline of each move in milliseconds and the number of moves timed.
+ANYTIME_OBSERVATION = Observation(10, 0x78100400000000000000,
+                                  0x40e8241201100800000, (5, 4, 3, 2), (3,))
+ANYTIME_DEADLINE_MS = 10
+ANYTIME_MOVES = 20
+
+
+def make_fleet(grid_size: int, density: float) -> list[list]:
+    """Return a two-item list of the ship symbols and ship sizes of a fleet
+    that covers about density of the cells of a grid_size by grid_size grid.
+
+    >>> make_fleet(5, 0.2)
+    [['a'], [5]]
+    """
+    ship_sizes = []
+    covered = 0
+    while covered < density * grid_size * grid_size or not ship_sizes:
+        ship_size = min(FLEET_SHIP_SIZES[len(ship_sizes)
+                                         % len(FLEET_SHIP_SIZES)], grid_size)
+        ship_sizes.append(ship_size)
+        covered += ship_size
+    ship_symbols = bgf.get_ship_symbols(ship_sizes)
+    return [ship_symbols, ship_sizes]
+
+
+def make_cases(grid_size: int, density: float) -> dict:
+    """Return a dictionary from the name of each benchmarked function to a
+    function of no arguments that calls it once on a fleet of the given grid
+    size and density."""
+    ship_symbols, ship_sizes = make_fleet(grid_size, density)
+    fleet_grid = bgf.make_empty_fleet_grid(grid_size)
+    fill_fleet_grid(fleet_grid, ship_symbols,
+                    place_fleet(grid_size, ship_sizes))
+    target_grid = [[bgf.UNKNOWN] * grid_size for _ in range(grid_size)]
+    for row in range(0, grid_size, 2):
+        for col in range(grid_size):
+            bgf.update_target_grid(row, col, target_grid, fleet_grid)
+    hits_list = [0] * len(ship_sizes)
+    ship_start = bgf.find_ship_start(fleet_grid, ship_symbols[-1])
+    row, col = ship_start
+    last = grid_size - 1
+
+    def update_fleet_grid() -> None:
+        bgf.update_fleet_grid(row, col, fleet_grid, ship_symbols, hits_list)
+        fleet_grid[row][col] = ship_symbols[-1]
+        hits_list[-1] = 0
+
+    def display_grid() -> None:
+        with redirect_stdout(io.StringIO()):
+            bgf.display_grid(fleet_grid)
+
+    def place_ship() -> None:
+        scratch_grid = bgf.make_empty_fleet_grid(grid_size)
+        bgf.place_ship(0, 0, 0, last, scratch_grid, 'z')
+
+    return {
+        'valid_cell_indexes': lambda: bgf.valid_cell_indexes(row, col,
+                                                             grid_size),
+        'is_not_given_symbol': lambda: bgf.is_not_given_symbol(
+            row, col, target_grid, bgf.UNKNOWN),
+        'is_win': lambda: bgf.is_win(ship_sizes, hits_list),
+        'update_target_grid': lambda: bgf.update_target_grid(
+            row, col, target_grid, fleet_grid),
+        'update_fleet_grid': update_fleet_grid,
+        'get_ship_symbol_count': lambda: bgf.get_ship_symbol_count(
+            fleet_grid, ship_symbols[-1]),
+        'has_ship': lambda: bgf.has_ship(fleet_grid, row, col,
+                                         ship_symbols[-1], ship_sizes[-1]),
+        'validate_symbol_counts': lambda: bgf.validate_symbol_counts(
+            fleet_grid, ship_symbols, ship_sizes),
+        'validate_ship_positions': lambda: bgf.validate_ship_positions(
+            fleet_grid, ship_symbols, ship_sizes),
+        'find_ship_start': lambda: bgf.find_ship_start(fleet_grid,
+                                                       ship_symbols[-1]),
+        'make_empty_fleet_grid': lambda: bgf.make_empty_fleet_grid(grid_size),
+        'is_occupied': lambda: bgf.is_occupied(last, 0, last, last,
+                                               fleet_grid),
+        'get_end_indexes': lambda: bgf.get_end_indexes(row, col,
+                                                       ship_sizes[-1]),
+        'place_ship': place_ship,
+        'randomly_place_ship': lambda: bgf.randomly_place_ship(
+            bgf.make_empty_fleet_grid(grid_size), 'z', 1),
+        'generate_fleet_grid': lambda: bgf.generate_fleet_grid(
+            grid_size, ship_symbols, ship_sizes),
+        'make_computer_guess': lambda: bgf.make_computer_guess(target_grid),
+        'display_grid': display_grid,
+        'process_player_move': lambda: bgf.process_player_move(
+            row, col, target_grid, fleet_grid),
+        'get_ship_symbols': lambda: bgf.get_ship_symbols(ship_sizes),
+    }
+
+
+def time_call(function: callable) -> float:
+    """Return the time, in seconds, of one call to function: the fastest of
+    REPEATS runs of enough calls to take at least 0.2 seconds."""
+    timer = timeit.Timer(function)
+    number = timer.autorange()[0]
+    return min(timer.repeat(repeat=REPEATS, number=number)) / number
+
+
+def run_benchmarks(grid_sizes: list[int], densities: list[float],
+                   name_filter: str = '') -> dict:
+    """Return a dictionary from a benchmark name, such as
+    'has_ship[grid=10,density=0.2]', to the time in seconds of one call, for
+    every function whose name contains name_filter, on every grid size in
+    grid_sizes and fleet density in densities."""
+    results = {}
+    for grid_size in grid_sizes:
+        for density in densities:
+            cases = make_cases(grid_size, density)
+            for name, function in cases.items():
+                if name_filter in name:
+                    key = f'{name}[grid={grid_size},density={density}]'
+                    results[key] = time_call(function)
+    return results
+
+
+def time_anytime_moves(deadline_ms: float = ANYTIME_DEADLINE_MS,
+                       num_moves: int = ANYTIME_MOVES) -> list[float]:
+    """Return the time, in milliseconds, that each of num_moves anytime moves
+    with a deadline of deadline_ms milliseconds took on
+    ANYTIME_OBSERVATION."""
+    return [choose_move(ANYTIME_OBSERVATION, deadline_ms).elapsed_ms
+            for _ in range(num_moves)]
+
+
+def compare_results(results: dict, baseline: dict,
+                    threshold: float) -> list[list]:
+    """Return a list of [benchmark name, baseline time, current time] for
+    every benchmark in both results and baseline whose current time is more
+    than (1 + threshold) times its baseline time.
+
+    >>> compare_results({'f': 1.3, 'g': 1.0}, {'f': 1.0, 'g': 1.0}, 0.25)
+    [['f', 1.0, 1.3]]
+    """
+    regressions = []
+    for name, seconds in results.items():
+        if name in baseline and seconds > baseline[name] * (1 + threshold):
+            regressions.append([name, baseline[name], seconds])
+    return regressions
+
+
+def save_results(results: dict, filename: str) -> None:
+    """Save results, with a description of this Python, to the JSON file
+    filename."""
+    with open(filename, 'w') as results_file:
+        json.dump({'python': platform.python_version(),
+                   'platform': platform.platform(),
+                   'results': results}, results_file, indent=2)
+
+
+def load_results(filename: str) -> dict:
+    """Return the results saved in the JSON file filename."""
+    with open(filename) as results_file:
+        return json.load(results_file)['results']
+
+
+def main(arguments: list[str]) -> int:
+    """Run the benchmarks as described by the command-line arguments and
+    return the exit status: 1 if a benchmark regressed, and 0 otherwise."""
+    parser = argparse.ArgumentParser(
+        description='Time the functions in battleship_game_functions.py.')
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=DEFAULT_GRID_SIZES)
+    parser.add_argument('--densities', type=float, nargs='+',
+                        default=DEFAULT_DENSITIES)
+    parser.add_argument('--filter', default='',
+                        help='only run functions whose name contains this')
+    parser.add_argument('--save', help='save the results to this JSON file')
+    parser.add_argument('--compare', help='compare against this JSON file')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument('--anytime', action='store_true',
+                        help="time the anytime player's moves instead")
+    options = parser.parse_args(arguments)
+
+    if options.anytime:
+        elapsed = sorted(time_anytime_moves())
+        print(f'anytime moves with a {ANYTIME_DEADLINE_MS} ms deadline: '
+              f'median {elapsed[len(elapsed) // 2]:.1f} ms, '
+              f'max {elapsed[-1]:.1f} ms')
+        if elapsed[-1] > ANYTIME_DEADLINE_MS + DEADLINE_TOLERANCE_MS:
+            print(f'OVERRUN: a move took more than {DEADLINE_TOLERANCE_MS} '
+                  f'ms past its deadline')
+            return 1
+        return 0
+
+    results = run_benchmarks(options.sizes, options.densities, options.filter)
+    for name, seconds in results.items():
+        print(f'{name:60} {seconds * 1e6:12.3f} us')
+    if options.save:
+        save_results(results, options.save)
+
+    if options.compare:
+        regressions = compare_results(results, load_results(options.compare),
+                                      options.threshold)
+        for name, before, after in regressions:
+            print(f'REGRESSION {name}: {before * 1e6:.3f} us -> '
+                  f'{after * 1e6:.3f} us')
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
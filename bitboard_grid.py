@@ -0,0 +1,294 @@
+# The file contains a grid engine that stores fleet and target grids as
+# integer bitboards.  Cell (row, col) of a grid_size by grid_size grid is bit
+# row * grid_size + col of each board.  Python integers have arbitrary width,
+# so the same code works for any grid size.
+#
+# The grids support grid[row][col] like a list[list[str]], so the functions
+# in battleship_game_functions.py work on them unchanged, and they also offer
+# bit-operation shortcuts for shot resolution, sunk checks, overlap tests
+# and move counts.
+
+from battleship_game_functions import EMPTY, UNKNOWN, HIT, MISS
+from grid_engine import GridEngine
+
+
+def cell_bit(row: int, col: int, grid_size: int) -> int:
+    """Return the bitboard bit for the cell at (row, col) in a grid_size by
+    grid_size grid.
+
+    >>> cell_bit(0, 0, 3)
+    1
+    >>> cell_bit(1, 2, 3) == 1 << 5
+    True
+    """
+    return 1 << (row * grid_size + col)
+
+
+def line_mask(row1: int, col1: int, row2: int, col2: int,
+              grid_size: int) -> int:
+    """Return the bitboard covering every cell from (row1, col1) to
+    (row2, col2), inclusive, where the two cells share a row or a column.
+
+    >>> bin(line_mask(0, 1, 0, 2, 3))
+    '0b110'
+    >>> bin(line_mask(2, 0, 0, 0, 3))
+    '0b1001001'
+    """
+    if row1 == row2:
+        low_col = min(col1, col2)
+        length = abs(col2 - col1) + 1
+        return ((1 << length) - 1) << (row1 * grid_size + low_col)
+    mask = 0
+    for row in range(min(row1, row2), max(row1, row2) + 1):
+        mask |= 1 << (row * grid_size + col1)
+    return mask
+
+
+def full_mask(grid_size: int) -> int:
+    """Return the bitboard with every cell of a grid_size by grid_size grid
+    set.
+
+    >>> bin(full_mask(2))
+    '0b1111'
+    """
+    return (1 << (grid_size * grid_size)) - 1
+
+
+def iter_cells(mask: int, grid_size: int):
+    """Yield the (row, col) of every cell set in mask, in row-major order.
+
+    >>> list(iter_cells(0b100010, 3))
+    [(0, 1), (1, 2)]
+    """
+    while mask:
+        low_bit = mask & -mask
+        index = low_bit.bit_length() - 1
+        yield divmod(index, grid_size)
+        mask ^= low_bit
+
+
+class BitboardFleetGrid(GridEngine):
+    """A fleet grid stored as an occupancy bitboard, a hit bitboard and one
+    bitboard per ship symbol, with an index from each occupied cell number
+    row * grid_size + col to its ship symbol so that a cell is read in
+    constant time.
+
+    A ship symbol that is converted to upper case (as update_fleet_grid does)
+    is recorded as a hit on that ship.
+
+    >>> from battleship_game_functions import update_fleet_grid
+    >>> fleet = BitboardFleetGrid.from_grid([[EMPTY, 'a'], [EMPTY, 'a']])
+    >>> hits_list = [0]
+    >>> update_fleet_grid(0, 1, fleet, ['a'], hits_list)
+    >>> hits_list
+    [1]
+    >>> fleet == [[EMPTY, 'A'], [EMPTY, 'a']]
+    True
+    >>> fleet.is_sunk('a')
+    False
+    >>> fleet.shoot(1, 1)
+    'a'
+    >>> fleet.is_sunk('a'), fleet.all_sunk()
+    (True, True)
+    """
+
+    def __init__(self, grid_size: int) -> None:
+        """Initialize an EMPTY grid_size by grid_size fleet grid."""
+        self.grid_size = grid_size
+        self.occupied = 0
+        self.hits = 0
+        self.ship_masks = {}
+        self._symbols = {}
+
+    @classmethod
+    def from_grid(cls, fleet_grid: list[list[str]]) -> 'BitboardFleetGrid':
+        """Return a bitboard copy of fleet_grid.
+
+        An upper-case cell is recorded as a hit on the ship of its
+        lower-case symbol, whether or not that ship has an unhit cell.
+
+        >>> fleet = BitboardFleetGrid.from_grid([['A', 'a'], [EMPTY, EMPTY]])
+        >>> fleet.ship_masks, fleet.hit_count('a')
+        ({'a': 3}, 1)
+        >>> fleet = BitboardFleetGrid.from_grid([['A', 'A'], [EMPTY, 'b']])
+        >>> fleet.ship_masks, fleet.hit_count('a'), fleet.is_sunk('a')
+        ({'a': 3, 'b': 8}, 2, True)
+        >>> fleet.shoot(1, 1), fleet.all_sunk()
+        ('b', True)
+        """
+        bitboard = cls(len(fleet_grid))
+        for row in range(len(fleet_grid)):
+            for col in range(len(fleet_grid)):
+                value = fleet_grid[row][col]
+                if value == EMPTY:
+                    continue
+                cell = row * bitboard.grid_size + col
+                bit = 1 << cell
+                symbol = value.lower()
+                if symbol != value:
+                    bitboard.hits |= bit
+                bitboard.ship_masks[symbol] = \
+                    bitboard.ship_masks.get(symbol, 0) | bit
+                bitboard.occupied |= bit
+                bitboard._symbols[cell] = symbol
+        return bitboard
+
+    def get_cell(self, row: int, col: int) -> str:
+        cell = row * self.grid_size + col
+        symbol = self._symbols.get(cell, EMPTY)
+        if self.hits >> cell & 1:
+            return symbol.upper()
+        return symbol
+
+    def set_cell(self, row: int, col: int, value: str) -> None:
+        """Set the cell at (row, col) to value.  An upper-case value whose
+        lower-case symbol is a ship (this cell's included) is a hit on that
+        ship.
+
+        >>> fleet = BitboardFleetGrid.from_grid([['a', EMPTY]])
+        >>> fleet[0][0] = 'A'
+        >>> fleet.ship_masks, fleet.is_sunk('a'), fleet.all_sunk()
+        ({'a': 1}, True, True)
+        """
+        cell = row * self.grid_size + col
+        bit = 1 << cell
+        # Resolve a hit before the old symbol's bitboard can be emptied
+        symbol = value
+        is_hit = value not in self.ship_masks and value.lower() != value \
+            and value.lower() in self.ship_masks
+        if is_hit:
+            symbol = value.lower()
+        old_symbol = self._symbols.pop(cell, None)
+        if old_symbol is not None:
+            self.ship_masks[old_symbol] &= ~bit
+            if not self.ship_masks[old_symbol]:
+                del self.ship_masks[old_symbol]
+            self.occupied &= ~bit
+            self.hits &= ~bit
+        if value == EMPTY:
+            return
+        if is_hit:
+            self.hits |= bit
+        self.ship_masks[symbol] = self.ship_masks.get(symbol, 0) | bit
+        self.occupied |= bit
+        self._symbols[cell] = symbol
+
+    def place_ship(self, row1: int, col1: int, row2: int, col2: int,
+                   ship_symbol: str) -> None:
+        """Place ship_symbol from (row1, col1) to (row2, col2), inclusive.
+
+        The cells must be EMPTY.
+        """
+        mask = line_mask(row1, col1, row2, col2, self.grid_size)
+        self.ship_masks[ship_symbol] = self.ship_masks.get(ship_symbol, 0) \
+                                       | mask
+        self.occupied |= mask
+        for row, col in iter_cells(mask, self.grid_size):
+            self._symbols[row * self.grid_size + col] = ship_symbol
+
+    def is_occupied(self, row1: int, col1: int, row2: int, col2: int) -> bool:
+        """Return True if a cell between (row1, col1) and (row2, col2),
+        inclusive, holds a ship."""
+        mask = line_mask(row1, col1, row2, col2, self.grid_size)
+        return self.occupied & mask != 0
+
+    def shoot(self, row: int, col: int) -> str:
+        """Record a shot at (row, col) and return the lower-case symbol of
+        the ship that was hit, or EMPTY for a miss."""
+        cell = row * self.grid_size + col
+        symbol = self._symbols.get(cell, EMPTY)
+        if symbol != EMPTY:
+            self.hits |= 1 << cell
+        return symbol
+
+    def hit_count(self, ship_symbol: str) -> int:
+        """Return the number of cells of ship_symbol that have been hit."""
+        return (self.ship_masks.get(ship_symbol, 0) & self.hits).bit_count()
+
+    def is_sunk(self, ship_symbol: str) -> bool:
+        """Return True if and only if every cell of ship_symbol is hit."""
+        return self.ship_masks.get(ship_symbol, 0) & ~self.hits == 0
+
+    def all_sunk(self) -> bool:
+        """Return True if and only if every ship cell is hit."""
+        return self.occupied & ~self.hits == 0
+
+
+class BitboardTargetGrid(GridEngine):
+    """A target grid stored as a hit bitboard and a miss bitboard.  Every
+    other cell is UNKNOWN.
+
+    >>> from battleship_game_functions import update_target_grid
+    >>> target = BitboardTargetGrid(2)
+    >>> fleet = BitboardFleetGrid.from_grid([[EMPTY, EMPTY], [EMPTY, 'a']])
+    >>> update_target_grid(1, 1, target, fleet)
+    >>> target == [[UNKNOWN, UNKNOWN], [UNKNOWN, HIT]]
+    True
+    >>> target.record_shot(0, 0, fleet)
+    False
+    >>> target.num_moves()
+    2
+    >>> bin(target.unknown_mask())
+    '0b110'
+    """
+
+    def __init__(self, grid_size: int) -> None:
+        """Initialize a grid_size by grid_size target grid of UNKNOWN
+        cells."""
+        self.grid_size = grid_size
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_grid(cls, target_grid: list[list[str]]) -> 'BitboardTargetGrid':
+        """Return a bitboard copy of target_grid."""
+        bitboard = cls(len(target_grid))
+        for row in range(len(target_grid)):
+            for col in range(len(target_grid)):
+                if target_grid[row][col] != UNKNOWN:
+                    bitboard.set_cell(row, col, target_grid[row][col])
+        return bitboard
+
+    def get_cell(self, row: int, col: int) -> str:
+        bit = 1 << (row * self.grid_size + col)
+        if self.hits & bit:
+            return HIT
+        if self.misses & bit:
+            return MISS
+        return UNKNOWN
+
+    def set_cell(self, row: int, col: int, value: str) -> None:
+        bit = 1 << (row * self.grid_size + col)
+        self.hits &= ~bit
+        self.misses &= ~bit
+        if value == HIT:
+            self.hits |= bit
+        elif value == MISS:
+            self.misses |= bit
+        elif value != UNKNOWN:
+            raise ValueError(f'{value!r} is not a target grid symbol')
+
+    def record_shot(self, row: int, col: int,
+                    fleet_grid: BitboardFleetGrid) -> bool:
+        """Mark (row, col) as HIT or MISS using fleet_grid, record the hit in
+        fleet_grid, and return True if and only if the shot was a hit."""
+        bit = 1 << (row * self.grid_size + col)
+        if fleet_grid.occupied & bit:
+            self.hits |= bit
+            fleet_grid.hits |= bit
+            return True
+        self.misses |= bit
+        return False
+
+    def num_moves(self) -> int:
+        """Return the number of cells that are not UNKNOWN."""
+        return (self.hits | self.misses).bit_count()
+
+    def unknown_mask(self) -> int:
+        """Return the bitboard of UNKNOWN cells."""
+        return full_mask(self.grid_size) & ~(self.hits | self.misses)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
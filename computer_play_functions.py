@@ -4,7 +4,12 @@ from random import randint
 from battleship_game_functions import MIN_SHIP_SIZE, MAX_SHIP_SIZE, \
                                       MAX_GRID_SIZE, EMPTY, UNKNOWN
 from battleship_game_functions import valid_cell_indexes, is_not_given_symbol
+from unknown_cell_pool import UnknownCellPool
+from fleet_placement import place_fleet, fill_fleet_grid
 
+# Names of the strategies that the computer player can use to guess.
+RANDOM_STRATEGY = 'random'
+DENSITY_STRATEGY = 'density'
 
 
 def make_empty_fleet_grid(grid_size: int) -> list[list[str]]:
@@ -78,30 +83,41 @@ def randomly_place_ship(fleet_grid: list[list[str]], ship_symbol: str,
 
 
 def generate_fleet_grid(grid_size: int, ship_symbols: list[str],
-                        ship_sizes: list[int]) -> list[list[str]]:
+                        ship_sizes: list[int],
+                        uniform: bool = False) -> list[list[str]]:
     """Return a new grid_size by grid_size fleet grid using the ship symbols
-    in ship_symbols and the corresponding ship sizes in ship_sizes."""
-    fleet_grid = make_empty_fleet_grid(grid_size)
-
-    for index in range(len(ship_symbols) - 1, -1, -1):
-        ship = ship_symbols[index]
-        ship_size = ship_sizes[index]
-        placed = False
-        while not placed:
-            placed = randomly_place_ship(fleet_grid, ship, ship_size)
+    in ship_symbols and the corresponding ship sizes in ship_sizes.
 
+    If uniform is True, every possible fleet layout is equally likely.  Raise
+    ValueError if the ships cannot all be placed (see fleet_placement.py)."""
+    fleet_grid = make_empty_fleet_grid(grid_size)
+    placements = place_fleet(grid_size, ship_sizes, uniform)
+    fill_fleet_grid(fleet_grid, ship_symbols, placements)
     return fleet_grid
 
 
 def make_computer_guess(target_grid: list[list[str]]) -> list[int]:
     """Return row and column indexes for a randomly chosen UNKNOWN cell in the
-    target_grid to use as the computer's next guess."""
+    target_grid to use as the computer's next guess.
+
+    If target_grid keeps an unknown_pool (see unknown_cell_pool.py), the guess
+    is a single draw from it.  Otherwise random cells are tried, falling back
+    to a scan of the grid once grid_size * grid_size tries have failed.
+    Raise ValueError if target_grid has no UNKNOWN cell."""
+    pool = getattr(target_grid, 'unknown_pool', None)
+    if pool is not None:
+        return pool.choose()
+
     grid_size = len(target_grid)
     row = randint(0, grid_size - 1)
     col = randint(0, grid_size - 1)
+    tries = 1
     while is_not_given_symbol(row, col, target_grid, UNKNOWN):
+        if tries == grid_size * grid_size:
+            return UnknownCellPool(target_grid).choose()
         row = randint(0, grid_size - 1)
         col = randint(0, grid_size - 1)
+        tries += 1
     return [row, col]
 
 
@@ -0,0 +1,262 @@
+# The file contains an exact endgame solver: once few fleet layouts are
+# consistent with what a player has seen (see posterior_sampler.py), it finds
+# the shot that minimizes the expected number of moves left.
+#
+# Whatever the order of the shots, a player fires one shot at each cell of
+# the true layout plus some misses, so minimizing the expected number of
+# moves is minimizing the expected number of misses.  A shot at a cell that
+# some layouts cover and others do not splits the layouts into those that
+# cover it (a HIT) and those that do not (a MISS); a cell that every layout
+# covers is a sure HIT that tells nothing new.  So the expected number of
+# misses left only depends on the set of layouts still consistent, which is
+# kept as a bitmask over the layouts' indexes, and the search memoizes it by
+# that bitmask:
+#
+#     misses(S) = min over cells c of  P(MISS at c) * (1 + misses(S0))
+#                                    + P(HIT at c) * misses(S1)
+#
+# where S1 and S0 are the layouts of S that do and do not cover c, and
+# misses(S) = 0 when S has a single layout.  Layouts that cover the same
+# cells are merged and weighted by how many there are.  The search works
+# with total weights, so every value is an integer, and is a branch and
+# bound: cells are tried from the least likely to miss, each subproblem is
+# given the most it may cost before the shot is no better than the best one
+# found, and subproblems that go over are memoized as lower bounds so they
+# are only searched again with a larger budget.  A shot that sinks a ship is
+# treated as a plain HIT, so the solver plays well without relying on that
+# extra information.
+#
+# The solver expands at most max_nodes sets of layouts and gives up (returns
+# None) past that, or past a deadline, so it never stalls a game.
+
+import time
+from collections import Counter
+from typing import NamedTuple
+from bitboard_grid import full_mask
+from posterior_sampler import get_ship_placements, \
+                              share_equal_placements, list_layouts
+from probability_density import Observation
+
+# The default largest number of consistent layouts the solver takes on.
+DEFAULT_MAX_LAYOUTS = 16
+
+# The default largest number of sets of layouts the solver expands.
+DEFAULT_MAX_NODES = 5000
+
+
+class EndgameSolution(NamedTuple):
+    """The best shot found by the endgame solver, the expected number of
+    moves left (that shot included) if the player keeps playing the
+    solver's shots, and the number of sets of layouts expanded."""
+    row: int
+    col: int
+    expected_moves: float
+    nodes: int
+
+
+class EndgameSolver:
+    """A memoized search for the shots that minimize the expected number of
+    misses over a list of layouts, each a bitboard of the UNKNOWN cells that
+    its ships cover, with the weights in weights.
+
+    >>> solver = EndgameSolver([0b0011, 0b0110], [1, 1])
+    >>> solver.misses(0b11), solver.best_cell(0b11)
+    (0.5, 0)
+    >>> solver = EndgameSolver([0b01, 0b10], [3, 1])
+    >>> solver.misses(0b11), solver.best_cell(0b11)
+    (0.25, 0)
+    """
+
+    def __init__(self, layouts: list[int], weights: list[int],
+                 max_nodes: int = DEFAULT_MAX_NODES,
+                 deadline: float = float('inf')) -> None:
+        """Initialize a solver over layouts that expands at most max_nodes
+        sets of layouts and stops once the clock (time.perf_counter) passes
+        deadline."""
+        self.max_nodes = max_nodes
+        self.deadline = deadline
+        self.nodes = 0
+        self._memo = {}
+        self._lower = {}
+        self._best = {}
+        self._same_size = len({layout.bit_count() for layout in layouts}) == 1
+        cells = 0
+        for layout in layouts:
+            cells |= layout
+        self._covering = {}
+        while cells:
+            cell = cells & -cells
+            self._covering[cell.bit_length() - 1] = sum(
+                1 << i for i in range(len(layouts)) if layouts[i] & cell)
+            cells ^= cell
+        # The weights are bit-sliced like a counter: bit i of plane j is
+        # bit j of the weight of layout i.
+        self._weight_planes = []
+        for plane in range(max(weights, default=0).bit_length()):
+            self._weight_planes.append(sum(
+                1 << i for i in range(len(weights))
+                if weights[i] >> plane & 1))
+
+    def weight(self, layout_set: int) -> int:
+        """Return the total weight of the layouts in layout_set."""
+        return sum((layout_set & self._weight_planes[plane]).bit_count()
+                   << plane for plane in range(len(self._weight_planes)))
+
+    def misses(self, layout_set: int) -> float:
+        """Return the least expected number of misses before every cell of
+        the true layout is hit, if it is equally likely to be any layout of
+        layout_set by weight.  Raise OverflowError if the search goes past
+        max_nodes nodes or its deadline."""
+        return self._search(layout_set, float('inf')) \
+            / self.weight(layout_set)
+
+    def best_cell(self, layout_set: int) -> int:
+        """Return the number of a cell whose shot minimizes the expected
+        number of misses over layout_set, or -1 if layout_set has a single
+        layout."""
+        self._search(layout_set, float('inf'))
+        return self._best.get(layout_set, -1)
+
+    def _lower_bound(self, layout_set: int, weight: int) -> int:
+        """Return a lower bound on the least total weight of the misses over
+        the layouts of layout_set, whose weight is weight.
+
+        Layouts of the same size are never inside one another, so a single
+        one of them can be finished without a miss: the others add at least
+        their weight.  The heaviest weight is bounded by that of the highest
+        weight plane that holds a layout of layout_set.
+        """
+        if layout_set & (layout_set - 1) == 0:
+            return 0
+        if layout_set in self._memo:
+            return self._memo[layout_set]
+        lower = self._lower.get(layout_set, 0)
+        if self._same_size:
+            top_plane = len(self._weight_planes) - 1
+            while not layout_set & self._weight_planes[top_plane]:
+                top_plane -= 1
+            lower = max(lower, weight - (2 << top_plane) + 1)
+        return lower
+
+    def _search(self, layout_set: int, bound: float) -> int:
+        """Return the least total weight of the misses over the layouts of
+        layout_set (the expected number of misses times the weight of
+        layout_set) if it is less than bound, and otherwise a lower bound
+        on it that is at least bound."""
+        if layout_set & (layout_set - 1) == 0:
+            return 0
+        if layout_set in self._memo:
+            return self._memo[layout_set]
+        total = self.weight(layout_set)
+        lower = self._lower_bound(layout_set, total)
+        if lower >= bound:
+            return lower
+        self.nodes += 1
+        if self.nodes > self.max_nodes or time.perf_counter() > self.deadline:
+            raise OverflowError('the endgame search is over budget')
+
+        splits = {}
+        for cell, covering in self._covering.items():
+            hit_set = layout_set & covering
+            if hit_set and hit_set != layout_set and hit_set not in splits:
+                splits[hit_set] = cell
+        shots = sorted((total - self.weight(hit_set), cell, hit_set)
+                       for hit_set, cell in splits.items())
+        best = float('inf')
+        best_cell = -1
+        for miss_weight, cell, hit_set in shots:
+            limit = min(best, bound)
+            if miss_weight >= limit:
+                break
+            miss_set = layout_set ^ hit_set
+            miss_lower = self._lower_bound(miss_set, miss_weight)
+            if miss_weight + miss_lower \
+                    + self._lower_bound(hit_set, total - miss_weight) >= limit:
+                continue
+            hit_misses = self._search(hit_set,
+                                      limit - miss_weight - miss_lower)
+            if miss_weight + miss_lower + hit_misses >= limit:
+                continue
+            cost = miss_weight + hit_misses \
+                + self._search(miss_set, limit - miss_weight - hit_misses)
+            if cost < best:
+                best = cost
+                best_cell = cell
+        if best < bound:
+            self._memo[layout_set] = best
+            self._best[layout_set] = best_cell
+            return best
+        lower = max(lower, bound, shots[0][0])
+        self._lower[layout_set] = lower
+        return lower
+
+
+def solve_layouts(layouts: list[int], unknown: int, grid_size: int,
+                  max_layouts: int = DEFAULT_MAX_LAYOUTS,
+                  max_nodes: int = DEFAULT_MAX_NODES,
+                  deadline: float = float('inf')) -> EndgameSolution:
+    """Return the best shot at the UNKNOWN cells in the bitboard unknown of
+    a grid_size by grid_size grid, given that the true layout is equally
+    likely to be any of layouts, bitboards of the cells covered by ships.
+    Return None if more than max_layouts of them cover different UNKNOWN
+    cells, or the search expands more than max_nodes sets of layouts or the
+    clock passes deadline first.  Raise ValueError if layouts is empty.
+
+    >>> solution = solve_layouts([0b0011, 0b0110, 0b1100], 0b1111, 2)
+    >>> [solution.row, solution.col], round(solution.expected_moves, 2)
+    ([0, 1], 2.67)
+    """
+    weights = Counter(layout & unknown for layout in layouts)
+    if not weights:
+        raise ValueError('no fleet layout is consistent with the observation')
+    if len(weights) > max_layouts:
+        return None
+    distinct = list(weights)
+    solver = EndgameSolver(distinct, [weights[layout] for layout in distinct],
+                           max_nodes, deadline)
+    layout_set = (1 << len(distinct)) - 1
+    try:
+        misses = solver.misses(layout_set)
+    except OverflowError:
+        return None
+    cell = solver.best_cell(layout_set)
+    if cell == -1:
+        layout = distinct[0]
+        cell = (layout & -layout).bit_length() - 1
+    ship_cells = sum(layout.bit_count() * weights[layout]
+                     for layout in distinct) / len(layouts)
+    return EndgameSolution(cell // grid_size, cell % grid_size,
+                           ship_cells + misses, solver.nodes)
+
+
+def solve_endgame(observation: Observation,
+                  max_layouts: int = DEFAULT_MAX_LAYOUTS,
+                  max_nodes: int = DEFAULT_MAX_NODES,
+                  deadline: float = float('inf')) -> EndgameSolution:
+    """Return the best shot for observation (see probability_density.py) if
+    the fleet layouts consistent with it cover at most max_layouts different
+    sets of cells, and None if they cover more or the search goes over
+    max_nodes nodes or its deadline.
+
+    >>> observation = Observation(3, 0b10000, 0b101000101, (2,), ())
+    >>> solution = solve_endgame(observation)
+    >>> [solution.row, solution.col] in [[0, 1], [1, 0], [1, 2], [2, 1]]
+    True
+    >>> solution.expected_moves
+    2.5
+    >>> solve_endgame(observation, max_layouts=3) is None
+    True
+    """
+    grid_size = observation.grid_size
+    unknown = full_mask(grid_size) & ~(observation.hits | observation.misses)
+    legal = share_equal_placements(get_ship_placements(observation))
+    layouts = list_layouts(legal, observation.hits, max_layouts, deadline)
+    if not layouts:
+        return None
+    return solve_layouts(layouts, unknown, grid_size, max_layouts, max_nodes,
+                         deadline)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
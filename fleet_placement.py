@@ -0,0 +1,395 @@
+# The file contains the fleet generator used by generate_fleet_grid.
+#
+# Every placement of a ship is a bitboard (see bitboard_grid.py).  The
+# generator keeps, for each ship still to place, the list of its placements
+# that are still legal, and filters those lists as ships are placed.  When a
+# ship has no legal placement left, or the remaining ships can no longer
+# cover enough cells, it backtracks.  It remembers the partial fleets that
+# cannot be completed, so it always terminates and reports a fleet that
+# cannot be placed instead of looping forever.
+#
+# The uniform mode draws every complete fleet layout with the same
+# probability.  It first draws each ship independently a few times and keeps
+# the first draw without overlaps, which is exactly uniform and is fast for
+# sparse fleets.  Otherwise it counts the completions of each partial fleet
+# and picks each placement in proportion to its number of completions, and
+# if there are too many partial fleets to count it goes back to independent
+# draws until one has no overlaps, giving up after MAX_REJECTION_DRAWS.
+#
+# The default mode also starts with one independent draw.  If that draw
+# overlaps, it places the ships one at a time, drawing each until it misses
+# the ships already placed, and backtracks only if a ship keeps missing.
+
+from functools import lru_cache
+from random import randint, shuffle
+from battleship_game_functions import EMPTY
+from bitboard_grid import line_mask, iter_cells
+
+# The largest number of partial fleets whose completions are counted in the
+# uniform mode before it switches to drawing ships independently.
+MAX_COUNTED_STATES = 200000
+
+# The number of independent draws the uniform mode tries before counting.
+REJECTION_TRIES = 100
+
+# The number of independent draws the uniform mode makes before giving up
+# when there are too many partial fleets to count.
+MAX_REJECTION_DRAWS = 100000
+
+# The number of draws the default mode makes for a ship, when placing the
+# ships one at a time, before it gives up and backtracks.
+SEQUENTIAL_TRIES = 100
+
+
+@lru_cache(maxsize=None)
+def get_placements(grid_size: int, ship_size: int) -> tuple[int, ...]:
+    """Return the bitboards of every placement of a ship of size ship_size in
+    a grid_size by grid_size grid.
+
+    >>> [bin(mask) for mask in get_placements(2, 2)]
+    ['0b11', '0b1100', '0b101', '0b1010']
+    >>> len(get_placements(2, 1)), len(get_placements(2, 3))
+    (4, 0)
+    """
+    placements = []
+    for row in range(grid_size):
+        for col in range(grid_size - ship_size + 1):
+            placements.append(line_mask(row, col, row, col + ship_size - 1,
+                                        grid_size))
+    if ship_size > 1:
+        for row in range(grid_size - ship_size + 1):
+            for col in range(grid_size):
+                placements.append(line_mask(row, col, row + ship_size - 1,
+                                            col, grid_size))
+    return tuple(placements)
+
+
+def get_legal_placements(grid_size: int, ship_size: int,
+                         blocked: int) -> list[int]:
+    """Return the placements of a ship of size ship_size in a grid_size by
+    grid_size grid that do not cover a cell of the bitboard blocked.
+
+    >>> [bin(mask) for mask in get_legal_placements(2, 2, 0b1)]
+    ['0b1100', '0b1010']
+    """
+    return [mask for mask in get_placements(grid_size, ship_size)
+            if not mask & blocked]
+
+
+def place_fleet(grid_size: int, ship_sizes: list[int], uniform: bool = False,
+                blocked: int = 0) -> list[int]:
+    """Return a random, non-overlapping placement bitboard for each ship in
+    ship_sizes, in the same order, in a grid_size by grid_size grid with no
+    ship on a cell of the bitboard blocked.
+
+    If uniform is True, every possible fleet layout is equally likely.
+    Raise ValueError if the ships cannot all be placed, and OverflowError if
+    uniform is True and the fleet is too dense to sample uniformly in
+    reasonable time.
+
+    >>> masks = place_fleet(3, [3, 3, 3])
+    >>> sorted(mask.bit_count() for mask in masks), sum(masks) == 0b111111111
+    ([3, 3, 3], True)
+    >>> place_fleet(3, [3, 3, 3, 1])
+    Traceback (most recent call last):
+    ...
+    ValueError: the fleet cannot be placed on a 3 by 3 grid
+    >>> place_fleet(3, [4])
+    Traceback (most recent call last):
+    ...
+    ValueError: the fleet cannot be placed on a 3 by 3 grid
+    """
+    order = sorted(range(len(ship_sizes)), key=lambda i: -ship_sizes[i])
+    # Ships of the same size share one list, which _filter_legal filters once
+    size_legal = {}
+    for ship_size in set(ship_sizes):
+        size_legal[ship_size] = get_legal_placements(grid_size, ship_size,
+                                                     blocked)
+    legal = [size_legal[ship_sizes[i]] for i in order]
+    if [] in legal:
+        chosen = None
+    elif uniform:
+        chosen = _place_uniformly(legal)
+    else:
+        chosen = _draw_independently(legal)
+        if chosen is None:
+            chosen = _draw_sequentially(legal)
+        if chosen is None:
+            chosen = _place_with_backtracking(legal)
+    if chosen is None:
+        raise ValueError(f'the fleet cannot be placed on a {grid_size} by '
+                         f'{grid_size} grid')
+    masks = [0] * len(ship_sizes)
+    for depth in range(len(order)):
+        masks[order[depth]] = chosen[depth]
+    return masks
+
+
+def _filter_legal(legal: list[list[int]], mask: int) -> list[list[int]]:
+    """Return the placement lists in legal without the placements that
+    overlap mask, or None if one of them would become empty.  Lists that
+    are the same object in legal are filtered once and stay shared."""
+    filtered = []
+    shared = {}
+    for placements in legal:
+        remaining = shared.get(id(placements))
+        if remaining is None:
+            remaining = [placement for placement in placements
+                         if not placement & mask]
+            if not remaining:
+                return None
+            shared[id(placements)] = remaining
+        filtered.append(remaining)
+    return filtered
+
+
+def _place_with_backtracking(legal: list[list[int]]) -> list[int]:
+    """Return one placement from each list in legal with no two overlapping,
+    chosen by randomized backtracking, or None if there is no such choice.
+
+    While the remaining ships can still cover many more cells than they need,
+    the next ship to place is the first one left.  Once there are fewer
+    spare cells than ships left, the search instead takes the first cell
+    that could still be covered and tries each ship that can cover it, or
+    leaving it empty if there is a spare cell to give up.
+
+    The search keeps its partial fleets on a stack rather than recursing,
+    so fleets of any number of ships can be placed.
+
+    >>> masks = _place_with_backtracking([list(get_placements(40, 1))] * 1500)
+    >>> len(masks), sum(masks).bit_count()
+    (1500, 1500)
+    """
+    dead_ends = set()
+    chosen = {}
+    # Each frame is a partial fleet: the cells occupied, the ships left,
+    # their legal placements, its dead-end key, the candidates left to try
+    # (None until it is first reached) and the ship placed to reach it.
+    stack = [[0, list(range(len(legal))), legal, None, None, None]]
+    while stack:
+        frame = stack[-1]
+        occupied, ships, frame_legal, key, candidates, _ = frame
+        if not ships:
+            return [chosen[i] for i in range(len(legal))]
+        if candidates is None:
+            sizes = tuple(placements[0].bit_count()
+                          for placements in frame_legal)
+            key = (sizes, occupied)
+            candidates = [] if key in dead_ends \
+                else _get_candidates(frame_legal, sizes)
+            frame[3] = key
+            frame[4] = candidates
+
+        while candidates:
+            i, placement = candidates.pop()
+            if i is None:
+                rest = _filter_legal(frame_legal, placement)
+                rest_ships = ships
+            else:
+                rest = _filter_legal(frame_legal[:i] + frame_legal[i + 1:],
+                                     placement)
+                rest_ships = ships[:i] + ships[i + 1:]
+            if rest is not None:
+                ship = None
+                if i is not None:
+                    ship = ships[i]
+                    chosen[ship] = placement
+                stack.append([occupied | placement, rest_ships, rest, None,
+                              None, ship])
+                break
+        else:
+            dead_ends.add(key)
+            stack.pop()
+            if frame[5] is not None:
+                del chosen[frame[5]]
+    return None
+
+
+def _get_candidates(legal: list[list[int]],
+                    sizes: tuple[int, ...]) -> list[tuple]:
+    """Return, in random order, the moves that _place_with_backtracking
+    tries from a partial fleet whose ships left have the sizes in sizes and
+    the placements in legal: pairs of the index of a ship in legal and a
+    placement for it, or of None and a cell to leave empty."""
+    coverable = 0
+    for placements in {id(placements): placements
+                       for placements in legal}.values():
+        for placement in placements:
+            coverable |= placement
+    slack = coverable.bit_count() - sum(sizes)
+    candidates = []
+    if 0 <= slack < len(legal):
+        first_cell = coverable & -coverable
+        tried_sizes = set()
+        for i in range(len(legal)):
+            if sizes[i] not in tried_sizes:
+                tried_sizes.add(sizes[i])
+                candidates.extend((i, placement) for placement in legal[i]
+                                  if placement & first_cell)
+        if slack > 0:
+            candidates.append((None, first_cell))
+    elif slack >= len(legal):
+        candidates = [(0, placement) for placement in legal[0]]
+    shuffle(candidates)
+    return candidates
+
+
+def _count_completions(legal: list[list[int]], counts: dict) -> int:
+    """Return the number of ways to choose one placement from each list in
+    legal with no two overlapping, given that every placement already
+    filtered out of legal is unavailable.
+
+    counts maps (number of lists placed, occupied bitboard) to known counts;
+    raise OverflowError once it holds more than MAX_COUNTED_STATES entries.
+    """
+
+    def count(depth: int, occupied: int) -> int:
+        if depth == len(legal):
+            return 1
+        key = (depth, occupied)
+        if key not in counts:
+            if len(counts) >= MAX_COUNTED_STATES:
+                raise OverflowError('too many partial fleets to count')
+            total = 0
+            for placement in legal[depth]:
+                if not placement & occupied:
+                    total += count(depth + 1, occupied | placement)
+            counts[key] = total
+        return counts[key]
+
+    return count(0, 0)
+
+
+def _place_uniformly(legal: list[list[int]]) -> list[int]:
+    """Return one placement from each list in legal with no two overlapping,
+    chosen uniformly at random among all such choices, or None if there is no
+    such choice.
+
+    A few independent draws are tried first; an accepted draw is uniform, so
+    sparse fleets never need counting.
+    """
+    for _ in range(REJECTION_TRIES):
+        chosen = _draw_independently(legal)
+        if chosen is not None:
+            return chosen
+
+    counts = {}
+    try:
+        total = _count_completions(legal, counts)
+    except OverflowError:
+        return _place_by_rejection(legal)
+    if total == 0:
+        return None
+
+    chosen = []
+    occupied = 0
+    for depth in range(len(legal)):
+        pick = randint(0, total - 1)
+        for placement in legal[depth]:
+            if placement & occupied:
+                continue
+            if depth + 1 == len(legal):
+                completions = 1
+            else:
+                completions = counts[(depth + 1, occupied | placement)]
+            if pick < completions:
+                break
+            pick -= completions
+        chosen.append(placement)
+        occupied |= placement
+        total = completions
+    return chosen
+
+
+def _draw_independently(legal: list[list[int]]) -> list[int]:
+    """Return one placement drawn uniformly at random from each list in
+    legal, or None if two of the drawn placements overlap."""
+    chosen = []
+    occupied = 0
+    for placements in legal:
+        if not placements:
+            return None
+        placement = placements[randint(0, len(placements) - 1)]
+        if placement & occupied:
+            return None
+        chosen.append(placement)
+        occupied |= placement
+    return chosen
+
+
+def _draw_sequentially(legal: list[list[int]]) -> list[int]:
+    """Return one placement from each list in legal with no two
+    overlapping, drawing each at random until it misses the ones drawn
+    before it, or None if SEQUENTIAL_TRIES draws of a ship all overlap.
+
+    >>> masks = _draw_sequentially([list(get_placements(10, 2))] * 20)
+    >>> masks is None or sum(masks).bit_count() == 40
+    True
+    """
+    chosen = []
+    occupied = 0
+    for placements in legal:
+        for _ in range(SEQUENTIAL_TRIES):
+            placement = placements[randint(0, len(placements) - 1)]
+            if not placement & occupied:
+                break
+        else:
+            return None
+        chosen.append(placement)
+        occupied |= placement
+    return chosen
+
+
+def _place_by_rejection(legal: list[list[int]]) -> list[int]:
+    """Return one placement from each list in legal with no two overlapping,
+    chosen uniformly at random by drawing each placement independently and
+    starting again on any overlap, or None if there is no such choice.
+    Raise OverflowError if MAX_REJECTION_DRAWS draws all overlap."""
+    if _place_with_backtracking(legal) is None:
+        return None
+    for _ in range(MAX_REJECTION_DRAWS):
+        chosen = _draw_independently(legal)
+        if chosen is not None:
+            return chosen
+    raise OverflowError('the fleet is too dense to place uniformly')
+
+
+def count_layouts(grid_size: int, ship_sizes: list[int],
+                  blocked: int = 0) -> int:
+    """Return the number of fleet layouts of the ships in ship_sizes in a
+    grid_size by grid_size grid with no ship on a cell of the bitboard
+    blocked.  Ships are told apart, so swapping two ships of the same size
+    gives a different layout.
+
+    Raise OverflowError if there are more than MAX_COUNTED_STATES partial
+    fleets to count.
+
+    >>> count_layouts(2, [2, 2])
+    4
+    >>> count_layouts(3, [3, 3, 3, 1])
+    0
+    """
+    legal = [get_legal_placements(grid_size, size, blocked)
+             for size in sorted(ship_sizes, reverse=True)]
+    return _count_completions(legal, {})
+
+
+def fill_fleet_grid(fleet_grid: list[list[str]], ship_symbols: list[str],
+                    placements: list[int]) -> None:
+    """Modify fleet_grid by placing each ship symbol in ship_symbols on the
+    cells of the corresponding bitboard in placements.
+
+    >>> grid = [[EMPTY, EMPTY], [EMPTY, EMPTY]]
+    >>> fill_fleet_grid(grid, ['a', 'b'], [0b101, 0b10])
+    >>> grid
+    [['a', 'b'], ['a', '.']]
+    """
+    grid_size = len(fleet_grid)
+    for ship_symbol, mask in zip(ship_symbols, placements):
+        for row, col in iter_cells(mask, grid_size):
+            fleet_grid[row][col] = ship_symbol
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
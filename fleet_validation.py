@@ -0,0 +1,130 @@
+# The file contains a fleet grid validator that walks the grid once.
+#
+# While walking the grid it keeps, for each ship, the number of cells with
+# its symbol and their bounding box, in a list indexed by the ship's id in a
+# ship table (see ship_table.py).  A ship is valid when it has exactly
+# ship size cells and its bounding box is a single row or column that is
+# ship size cells long: then its cells must fill that line.  This gives the
+# same verdict as validate_symbol_counts followed by validate_ship_positions,
+# which scan the grid once per ship, and also says which ship is wrong and
+# why.
+
+from typing import NamedTuple
+from battleship_game_functions import EMPTY
+from ship_table import ShipTable
+
+# The reasons that a fleet grid can be invalid.
+UNKNOWN_SYMBOL = 'unknown symbol'
+MISSING_SHIP = 'missing ship'
+WRONG_SIZE = 'wrong size'
+NOT_STRAIGHT = 'not straight'
+NOT_CONTIGUOUS = 'not contiguous'
+
+
+class FleetProblem(NamedTuple):
+    """A problem with one ship symbol in a fleet grid: the symbol, one of the
+    reasons above, and a message for the player."""
+    ship_symbol: str
+    reason: str
+    message: str
+
+
+def iter_ship_cells(fleet_grid: list[list[str]]):
+    """Yield (row, col, symbol) for every cell of fleet_grid that is not
+    EMPTY, in no particular order."""
+    if hasattr(fleet_grid, 'occupied_cells'):
+        for row, col in fleet_grid.occupied_cells():
+            yield row, col, fleet_grid[row][col]
+        return
+    for row_index, row in enumerate(fleet_grid):
+        for col_index, symbol in enumerate(row):
+            if symbol != EMPTY:
+                yield row_index, col_index, symbol
+
+
+def diagnose_fleet_grid(fleet_grid: list[list[str]], ship_symbols: list[str],
+                        ship_sizes: list[int]) -> list[FleetProblem]:
+    """Return the problems that stop fleet_grid from holding exactly one ship
+    of each symbol in ship_symbols with the corresponding size in ship_sizes,
+    each in a single straight line, and nothing else except EMPTY.  Return an
+    empty list if fleet_grid is valid.
+
+    ship_symbols and ship_sizes are parallel lists.
+
+    >>> grid = [[EMPTY, 'b', EMPTY], [EMPTY, 'b', EMPTY], ['a', 'a', 'a']]
+    >>> diagnose_fleet_grid(grid, ['a', 'b'], [3, 2])
+    []
+    >>> grid = [['b', EMPTY, 'c'], [EMPTY, 'b', EMPTY], ['a', EMPTY, 'a']]
+    >>> for problem in diagnose_fleet_grid(grid, ['a', 'b', 'd'], [2, 2, 1]):
+    ...     print(problem.ship_symbol, '-', problem.message)
+    c - c is not one of the ship symbols
+    a - the cells of ship a are not next to each other
+    b - ship b is not in a single row or column
+    d - ship d is missing
+    """
+    table = ShipTable(ship_sizes, ship_symbols)
+    symbols = table.symbols
+    stats = [None] * len(table)
+    unknown_symbols = set()
+    for row, col, symbol in iter_ship_cells(fleet_grid):
+        if symbol not in symbols:
+            unknown_symbols.add(symbol)
+            continue
+        ship_id = symbols.index(symbol)
+        ship_stats = stats[ship_id]
+        if ship_stats is None:
+            stats[ship_id] = [1, row, row, col, col]
+        else:
+            ship_stats[0] += 1
+            ship_stats[1] = min(ship_stats[1], row)
+            ship_stats[2] = max(ship_stats[2], row)
+            ship_stats[3] = min(ship_stats[3], col)
+            ship_stats[4] = max(ship_stats[4], col)
+
+    problems = []
+    for symbol in sorted(unknown_symbols):
+        problems.append(FleetProblem(
+            symbol, UNKNOWN_SYMBOL,
+            f'{symbol} is not one of the ship symbols'))
+
+    for ship_id in range(len(table)):
+        symbol = table.symbol_of(ship_id)
+        ship_size = table.sizes[ship_id]
+        # A repeated symbol shares the cells of its first ship
+        ship_stats = stats[symbols.index(symbol)]
+        if ship_stats is None:
+            problems.append(FleetProblem(symbol, MISSING_SHIP,
+                                         f'ship {symbol} is missing'))
+            continue
+        count, min_row, max_row, min_col, max_col = ship_stats
+        if count != ship_size:
+            problems.append(FleetProblem(
+                symbol, WRONG_SIZE,
+                f'ship {symbol} has {count} cells but its size is '
+                f'{ship_size}'))
+        elif min_row != max_row and min_col != max_col:
+            problems.append(FleetProblem(
+                symbol, NOT_STRAIGHT,
+                f'ship {symbol} is not in a single row or column'))
+        elif max_row - min_row + max_col - min_col + 1 != ship_size:
+            problems.append(FleetProblem(
+                symbol, NOT_CONTIGUOUS,
+                f'the cells of ship {symbol} are not next to each other'))
+    return problems
+
+
+def is_valid_fleet_grid(fleet_grid: list[list[str]], ship_symbols: list[str],
+                        ship_sizes: list[int]) -> bool:
+    """Return True if and only if diagnose_fleet_grid finds no problem with
+    fleet_grid.
+
+    >>> grid = [[EMPTY, 'b', EMPTY], [EMPTY, 'b', EMPTY], ['a', 'b', 'a']]
+    >>> is_valid_fleet_grid(grid, ['a', 'b'], [2, 3])
+    False
+    """
+    return diagnose_fleet_grid(fleet_grid, ship_symbols, ship_sizes) == []
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,145 @@
+# The file contains functions that read and write game corpus files, which
+# hold many boards in one file.
+#
+# Each board is written exactly like a game file (a line of ship symbols, a
+# line of ship sizes and then the rows of the fleet grid), and boards are
+# separated by a line that holds only CORPUS_SEPARATOR.  Blank lines are
+# ignored.  For example:
+#
+#     a b
+#     1 2
+#     a..
+#     .bb
+#     ...
+#     %
+#     t
+#     1
+#     t
+
+from typing import Iterator, TextIO
+from play_battleship_game import is_valid_game, read_fleet_grid
+
+CORPUS_SEPARATOR = '%'
+
+
+def parse_game_record(lines: list[str]) -> list[list]:
+    """Return the ship symbols, ship sizes and fleet grid described by lines,
+    the lines of one board in a corpus file, in the same form as
+    read_game_file.  As there, a grid wider than MAX_GRID_SIZE is read into
+    a large-board grid.
+
+    >>> parse_game_record(['a b\\n', '1 2\\n', 'a..\\n', '.bb\\n', '...\\n'])
+    [['a', 'b'], [1, 2], [['a', '.', '.'], ['.', 'b', 'b'], ['.', '.', '.']]]
+    >>> game = parse_game_record(['a\\n', '2\\n', 'aa' + '.' * 10]
+    ...                          + ['.' * 12] * 11)
+    >>> is_valid_game(game[2], game[0], game[1]), game[2][0][1]
+    (True, 'a')
+    """
+    lines = [line.strip() for line in lines if line.strip() != '']
+    ship_symbols = lines[0].split()
+    ship_sizes = [int(size) for size in lines[1].split()]
+    fleet_grid = read_fleet_grid(lines[2:])
+    return [ship_symbols, ship_sizes, fleet_grid]
+
+
+def _checked_game(lines: list[str], board_number: int,
+                  skip_invalid: bool) -> list[list]:
+    """Return the board in lines, board number board_number of its corpus,
+    or None if it is not valid and skip_invalid is True.  Raise ValueError if
+    it is not valid and skip_invalid is False."""
+    try:
+        game = parse_game_record(lines)
+        valid = is_valid_game(game[2], game[0], game[1])
+    except (IndexError, ValueError):
+        valid = False
+    if valid:
+        return game
+    if skip_invalid:
+        return None
+    raise ValueError(f'board {board_number} of the corpus is not valid')
+
+
+def _read_boards(corpus_lines: Iterator[str],
+                 skip_invalid: bool) -> Iterator[list[list]]:
+    """Yield each board in corpus_lines, the lines of a corpus file, as
+    described in read_corpus."""
+    board_number = 0
+    lines = []
+    for line in corpus_lines:
+        if line.strip() == CORPUS_SEPARATOR:
+            game = _checked_game(lines, board_number, skip_invalid)
+            if game is not None:
+                yield game
+            board_number += 1
+            lines = []
+        else:
+            lines.append(line)
+    if any(line.strip() != '' for line in lines):
+        game = _checked_game(lines, board_number, skip_invalid)
+        if game is not None:
+            yield game
+
+
+def read_corpus(corpus_file: TextIO,
+                skip_invalid: bool = False) -> Iterator[list[list]]:
+    """Yield each board in corpus_file, in the same form as read_game_file,
+    one at a time.  Only one board is held in memory at once.
+
+    Invalid boards are skipped if skip_invalid is True, and raise ValueError
+    otherwise.
+
+    >>> import io
+    >>> corpus = io.StringIO('t\\n1\\nt\\n%\\nt\\n1\\n.t\\n')
+    >>> games = read_corpus(corpus, skip_invalid=True)
+    >>> next(games)
+    [['t'], [1], [['t']]]
+    >>> list(games)
+    []
+    """
+    return _read_boards(corpus_file, skip_invalid)
+
+
+def read_corpus_bulk(corpus_file: TextIO,
+                     skip_invalid: bool = False) -> Iterator[list[list]]:
+    """Yield each board in corpus_file like read_corpus, but read the whole
+    file with a single read call and split it in memory, which is faster
+    for corpus files that fit in memory.
+
+    >>> import io
+    >>> corpus = io.StringIO('t\\n1\\nt\\n%\\na\\n2\\na.\\na.\\n')
+    >>> [game[1] for game in read_corpus_bulk(corpus)]
+    [[1], [2]]
+    """
+    return _read_boards(corpus_file.read().splitlines(), skip_invalid)
+
+
+def write_corpus(corpus_file: TextIO, games: Iterator[list[list]]) -> None:
+    """Write each board in games, in the same form as read_game_file returns,
+    to corpus_file.
+
+    >>> import io
+    >>> corpus = io.StringIO()
+    >>> write_corpus(corpus, [[['t'], [1], [['t']]], [['a'], [1], [['a']]]])
+    >>> print(corpus.getvalue(), end='')
+    t
+    1
+    t
+    %
+    a
+    1
+    a
+    """
+    first = True
+    for ship_symbols, ship_sizes, fleet_grid in games:
+        if not first:
+            corpus_file.write(CORPUS_SEPARATOR + '\n')
+        first = False
+        corpus_file.write(' '.join(ship_symbols) + '\n')
+        corpus_file.write(' '.join(str(size) for size in ship_sizes) + '\n')
+        for row in fleet_grid:
+            corpus_file.write(''.join(row) + '\n')
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
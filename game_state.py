@@ -0,0 +1,212 @@
+# The file contains GameState, a compact object that holds the state of one
+# player's game: the fleet grid being shot at, the target grid and the hits
+# list, all in a single bytearray.
+#
+# The game functions pass this state around as parallel lists and lists of
+# lists, which take about 3 KB for a 10 by 10 game.  A GameState takes about
+# a tenth of that: one byte per cell of each grid and per ship, plus the
+# object itself, whose attributes are in __slots__.  The ship symbols and
+# ship sizes lists are shared, not copied, so games of the same fleet share
+# them.  Copying a state copies one bytearray, and reset rewrites the
+# bytearray in place instead of allocating new grids.  A cell is one Latin-1
+# byte, so every ship symbol, and its upper case that marks a hit, must be
+# at most U+00FF: that is the first 56 symbols of make_ship_symbols (see
+# ship_table.py).
+#
+# The grids are exposed as ByteGrid views, grid engines (see grid_engine.py)
+# that look like list[list[str]], and the hits list as a memoryview, so the
+# existing functions accept them unchanged.  GameState also has thin
+# adapters for the common ones.
+
+from functools import lru_cache
+from battleship_game_functions import UNKNOWN, EMPTY, HIT, is_win
+from grid_engine import GridEngine
+from play_battleship_game import make_move, display_grids
+from grid_renderer import GridRenderer
+
+
+class ByteGrid(GridEngine):
+    """A grid_size by grid_size grid stored one byte per cell, row by row,
+    in the bytearray cells starting at index offset.
+
+    >>> grid = ByteGrid(bytearray(b'xx-.'), 1, 2)
+    >>> grid[0][0] = 'X'
+    >>> grid, grid.cells
+    (ByteGrid([['X']]), bytearray(b'xxX.'))
+    """
+
+    __slots__ = ('cells', 'grid_size', 'offset')
+
+    def __init__(self, cells: bytearray, grid_size: int,
+                 offset: int = 0) -> None:
+        """Initialize a view of the grid in cells at offset."""
+        self.cells = cells
+        self.grid_size = grid_size
+        self.offset = offset
+
+    def get_cell(self, row: int, col: int) -> str:
+        return chr(self.cells[self.offset + row * self.grid_size + col])
+
+    def set_cell(self, row: int, col: int, value: str) -> None:
+        self.cells[self.offset + row * self.grid_size + col] = ord(value)
+
+    def count(self, value: str) -> int:
+        """Return the number of cells holding value."""
+        return self.cells.count(ord(value), self.offset,
+                                self.offset + self.grid_size * self.grid_size)
+
+
+@lru_cache(maxsize=None)
+def _get_unhit_table(ship_symbols: tuple[str, ...]) -> bytes:
+    """Return a bytes.translate table that turns every hit ship cell of the
+    ships in ship_symbols back into the ship's symbol."""
+    table = bytearray(range(256))
+    for ship_symbol in ship_symbols:
+        if ship_symbol.upper() not in ship_symbols:
+            table[ord(ship_symbol.upper())] = ord(ship_symbol)
+    return bytes(table)
+
+
+class GameState:
+    """The state of one player's game: the fleet grid being shot at, the
+    player's target grid and hits list, and the ship symbols and sizes.
+
+    ship_symbols, ship_sizes and the hits list are parallel lists.
+
+    >>> state = GameState.from_lists([['a', 'a'], [EMPTY, EMPTY]], ['a'], [2])
+    >>> state.make_move(0, 1), state.make_move(1, 1)
+    ('hit a ship', 'missed')
+    >>> state.fleet_grid, state.target_grid, list(state.hits_list)
+    (ByteGrid([['a', 'A'], ['.', '.']]), ByteGrid([['-', 'X'], ['-', 'M']]), [1])
+    >>> saved = state.copy()
+    >>> state.make_move(0, 0), state.is_win(), state.num_moves()
+    ('hit a ship', True, 3)
+    >>> state.reset()
+    >>> state.fleet_grid, state.num_moves(), saved.num_moves()
+    (ByteGrid([['a', 'a'], ['.', '.']]), 0, 2)
+    """
+
+    __slots__ = ('grid_size', 'ship_symbols', 'ship_sizes', 'cells')
+
+    def __init__(self, grid_size: int, ship_symbols: list[str],
+                 ship_sizes: list[int]) -> None:
+        """Initialize the state of a game on a grid_size by grid_size grid,
+        with an EMPTY fleet grid, an UNKNOWN target grid and no hits.  Raise
+        ValueError if a ship symbol or its upper case is not a single
+        Latin-1 character, or a ship size is not less than 256.
+
+        >>> GameState(2, ['a', 'ÿ'], [1, 1])
+        Traceback (most recent call last):
+        ...
+        ValueError: ship symbol 'ÿ' does not fit in one byte when hit
+        """
+        for ship_symbol in ship_symbols:
+            if len(ship_symbol) != 1 or ord(ship_symbol) > 0xFF:
+                raise ValueError(f'ship symbol {ship_symbol!r} does not fit '
+                                 f'in one byte')
+            if len(ship_symbol.upper()) != 1 \
+               or ord(ship_symbol.upper()) > 0xFF:
+                raise ValueError(f'ship symbol {ship_symbol!r} does not fit '
+                                 f'in one byte when hit')
+        for ship_size in ship_sizes:
+            if not 0 <= ship_size < 256:
+                raise ValueError(f'ship size {ship_size} does not fit in one '
+                                 f'byte')
+        num_cells = grid_size * grid_size
+        self.grid_size = grid_size
+        self.ship_symbols = ship_symbols
+        self.ship_sizes = ship_sizes
+        self.cells = bytearray(EMPTY.encode() * num_cells
+                               + UNKNOWN.encode() * num_cells
+                               + bytes(len(ship_sizes)))
+
+    @classmethod
+    def from_lists(cls, fleet_grid: list[list[str]], ship_symbols: list[str],
+                   ship_sizes: list[int], target_grid: list[list[str]] = None,
+                   hits_list: list[int] = None) -> 'GameState':
+        """Return the state of a game with fleet_grid, target_grid (all
+        UNKNOWN if None) and hits_list (all 0 if None).
+
+        >>> state = GameState.from_lists([['à', EMPTY], [EMPTY, EMPTY]],
+        ...                              ['à'], [1])
+        >>> state.make_move(0, 0), state.fleet_grid[0][0], state.is_win()
+        ('hit a ship', 'À', True)
+        """
+        state = cls(len(fleet_grid), ship_symbols, ship_sizes)
+        num_cells = state.grid_size * state.grid_size
+        state.cells[:num_cells] = ''.join(
+            ''.join(row) for row in fleet_grid).encode('latin-1')
+        if target_grid is not None:
+            state.cells[num_cells:2 * num_cells] = ''.join(
+                ''.join(row) for row in target_grid).encode('latin-1')
+        if hits_list is not None:
+            state.cells[2 * num_cells:] = bytes(hits_list)
+        return state
+
+    @property
+    def fleet_grid(self) -> ByteGrid:
+        """The fleet grid being shot at."""
+        return ByteGrid(self.cells, self.grid_size)
+
+    @property
+    def target_grid(self) -> ByteGrid:
+        """The player's target grid."""
+        return ByteGrid(self.cells, self.grid_size,
+                        self.grid_size * self.grid_size)
+
+    @property
+    def hits_list(self) -> memoryview:
+        """The number of hits on each ship, as a writable view."""
+        return memoryview(self.cells)[2 * self.grid_size * self.grid_size:]
+
+    def copy(self) -> 'GameState':
+        """Return a copy of this state that shares only the ship symbols and
+        ship sizes."""
+        state = GameState.__new__(GameState)
+        state.grid_size = self.grid_size
+        state.ship_symbols = self.ship_symbols
+        state.ship_sizes = self.ship_sizes
+        state.cells = self.cells[:]
+        return state
+
+    def reset(self) -> None:
+        """Undo every move, in place: un-hit every ship cell, make every
+        target grid cell UNKNOWN and every hit count 0."""
+        num_cells = self.grid_size * self.grid_size
+        cells = self.cells
+        cells[:num_cells] = cells[:num_cells].translate(
+            _get_unhit_table(tuple(self.ship_symbols)))
+        cells[num_cells:2 * num_cells] = UNKNOWN.encode() * num_cells
+        cells[2 * num_cells:] = bytes(len(self.ship_sizes))
+
+    def make_move(self, row: int, col: int) -> str:
+        """Make a move at (row, col) with make_move and return its message."""
+        return make_move(row, col, self.fleet_grid, self.ship_symbols,
+                         self.hits_list, self.target_grid)
+
+    def is_win(self) -> bool:
+        """Return True if and only if every ship is sunk, like is_win."""
+        return is_win(list(self.ship_sizes), list(self.hits_list))
+
+    def num_moves(self) -> int:
+        """Return the number of moves made, like get_num_moves."""
+        return self.grid_size * self.grid_size \
+            - self.target_grid.count(UNKNOWN)
+
+    def num_hits(self) -> int:
+        """Return the number of moves that hit a ship."""
+        return self.target_grid.count(HIT)
+
+    def display(self, renderer: GridRenderer = None) -> None:
+        """Display the target grid and fleet grid with display_grids."""
+        display_grids(self.target_grid, self.fleet_grid, renderer)
+
+    def to_lists(self) -> list[list]:
+        """Return [fleet grid, target grid, hits list] as new lists."""
+        return [self.fleet_grid.to_lists(), self.target_grid.to_lists(),
+                list(self.hits_list)]
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
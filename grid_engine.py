@@ -0,0 +1,143 @@
+# The file contains the shared plumbing for grid engines: objects that store
+# a grid in something other than a list of lists of one-character strings,
+# but that still look like a list[list[str]] to the game functions.
+#
+# A grid engine only has to provide get_cell and set_cell.  GridEngine turns
+# those into grid[row][col] reads and writes, len(grid), iteration over rows
+# and equality with the list of lists that the engine represents.
+
+
+class GridRow:
+    """One row of a grid engine that can be indexed, assigned, measured with
+    len and iterated over like a list[str]."""
+
+    __slots__ = ('_grid', '_row')
+
+    def __init__(self, grid: 'GridEngine', row: int) -> None:
+        """Initialize a view of row number row of grid."""
+        self._grid = grid
+        self._row = row
+
+    def _col_index(self, col: int) -> int:
+        """Return col as a non-negative column index, following the same
+        rules as list indexing."""
+        grid_size = self._grid.grid_size
+        if col < 0:
+            col += grid_size
+        if not 0 <= col < grid_size:
+            raise IndexError('grid column index out of range')
+        return col
+
+    def __len__(self) -> int:
+        return self._grid.grid_size
+
+    def __getitem__(self, col: int) -> str:
+        return self._grid.get_cell(self._row, self._col_index(col))
+
+    def __setitem__(self, col: int, value: str) -> None:
+        self._grid.set_cell(self._row, self._col_index(col), value)
+
+    def __iter__(self):
+        get_cell = self._grid.get_cell
+        for col in range(self._grid.grid_size):
+            yield get_cell(self._row, col)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, GridRow):
+            other = list(other)
+        return list(self) == other
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
+class GridEngine:
+    """A square grid of one-character cells with the same interface as a
+    list[list[str]].
+
+    Subclasses set grid_size and implement get_cell and set_cell.
+    """
+
+    __slots__ = ()
+
+    grid_size: int
+
+    def get_cell(self, row: int, col: int) -> str:
+        """Return the symbol in the cell at (row, col)."""
+        raise NotImplementedError
+
+    def set_cell(self, row: int, col: int, value: str) -> None:
+        """Store value in the cell at (row, col)."""
+        raise NotImplementedError
+
+    def to_lists(self) -> list[list[str]]:
+        """Return a new list of lists with the same contents as this grid."""
+        return [list(row) for row in self]
+
+    def __len__(self) -> int:
+        return self.grid_size
+
+    def __getitem__(self, row: int) -> GridRow:
+        if row < 0:
+            row += self.grid_size
+        if not 0 <= row < self.grid_size:
+            raise IndexError('grid row index out of range')
+        return GridRow(self, row)
+
+    def __iter__(self):
+        for row in range(self.grid_size):
+            yield GridRow(self, row)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, GridEngine):
+            other = other.to_lists()
+        return self.to_lists() == other
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self.to_lists()!r})'
+
+
+class ObservedGrid(GridEngine):
+    """A list[list[str]] grid that reports every cell change to its
+    observers.
+
+    Each observer has a method cell_changed(row, col, old_value, new_value)
+    that is called after a cell's value changes.
+
+    >>> class Printer:
+    ...     def cell_changed(self, row, col, old_value, new_value):
+    ...         print(row, col, old_value, new_value)
+    >>> grid = ObservedGrid([['-', '-'], ['-', '-']], [Printer()])
+    >>> grid[1][0] = 'X'
+    1 0 - X
+    >>> grid.grid
+    [['-', '-'], ['X', '-']]
+    """
+
+    def __init__(self, grid: list[list[str]], observers: list = ()) -> None:
+        """Initialize a view of grid that reports changes to observers."""
+        self.grid = grid
+        self.grid_size = len(grid)
+        self.observers = list(observers)
+
+    def get_cell(self, row: int, col: int) -> str:
+        return self.grid[row][col]
+
+    def set_cell(self, row: int, col: int, value: str) -> None:
+        old_value = self.grid[row][col]
+        self.grid[row][col] = value
+        if old_value != value:
+            for observer in self.observers:
+                observer.cell_changed(row, col, old_value, value)
+
+    def to_lists(self) -> list[list[str]]:
+        return [list(row) for row in self.grid]
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,386 @@
+# The file contains a buffered, diff-based terminal renderer for grids.
+#
+# A frame is a list of lines of text.  The renderer builds the output for a
+# frame in one string and writes and flushes it once.  The first frame
+# clears the screen and is drawn in full; every later frame only redraws
+# the runs of characters that changed since the previous frame, moving the
+# cursor to them with ANSI escape sequences, so a turn that changes two
+# cells writes a few dozen bytes instead of the whole board.
+#
+# Frames taller or wider than the terminal are shown through a viewport,
+# which can be scrolled, so that the frame never makes the terminal scroll
+# (which would invalidate the cursor positions of the previous frame).
+# Prompts shown below the frame through the renderer's print and input are
+# counted, and if they take more lines than are free below the frame, so
+# that the terminal may have scrolled, the next frame is drawn in full.
+
+import shutil
+import sys
+from typing import TextIO
+from battleship_game_functions import HIT, MISS
+
+CLEAR_SCREEN = '\x1b[2J'
+CLEAR_TO_END_OF_SCREEN = '\x1b[J'
+
+# The number of terminal lines left free below the viewport for prompts.
+PROMPT_LINES = 6
+
+# The text of display_grids has this many lines besides the grid rows, and
+# the first grid row is on this line.
+GRIDS_EXTRA_LINES = 7
+GRIDS_FIRST_ROW_LINE = 4
+
+# The title and legend lines of the text of display_grids.
+GRIDS_TITLE = 'My target grid.               My fleet grid.'
+HIT_LEGEND = ' ' + HIT + ' means hit,                Upper-case means hit.'
+MISS_LEGEND = ' ' + MISS + ' means miss.'
+
+# Changed runs separated by fewer unchanged characters than this are
+# redrawn as one run, since a cursor move costs about as many bytes.
+MIN_GAP = 8
+
+
+def format_grids(target_grid: list[list[str]],
+                 fleet_grid: list[list[str]]) -> str:
+    """Return the text that display_grids prints for target_grid and
+    fleet_grid.
+
+    >>> print(format_grids([['-', 'X'], ['M', '-']], [['a', 'A'], ['.', '.']]))
+    <BLANKLINE>
+    My target grid.               My fleet grid.
+    <BLANKLINE>
+     01                           01
+    0-X                          0aA
+    1M-                          1..
+    <BLANKLINE>
+     X means hit,                Upper-case means hit.
+     M means miss.
+    <BLANKLINE>
+    """
+    return ''.join(format_grids_line(target_grid, fleet_grid, line) + '\n'
+                   for line in range(len(target_grid) + GRIDS_EXTRA_LINES))
+
+
+def format_grids_line(target_grid: list[list[str]],
+                      fleet_grid: list[list[str]], line: int) -> str:
+    """Return line number line of the text of format_grids(target_grid,
+    fleet_grid), without its newline, reading only one row of each grid.
+
+    >>> format_grids_line([['-', 'X'], ['M', '-']], [['a', 'A'], ['.', '.']],
+    ...                   5)
+    '1M-                          1..'
+    """
+    grid_size = len(target_grid)
+    gap_between_grids = ' ' * (28 - grid_size)
+    if line == 1:
+        return GRIDS_TITLE
+    if line == 3:
+        col_numbers = ''.join(str(col) for col in range(grid_size))
+        return ' ' + col_numbers + gap_between_grids + ' ' + col_numbers
+    row = line - GRIDS_FIRST_ROW_LINE
+    if 0 <= row < grid_size:
+        return str(row) + ''.join(target_grid[row]) + gap_between_grids \
+            + str(row) + ''.join(fleet_grid[row])
+    if row == grid_size + 1:
+        return HIT_LEGEND
+    if row == grid_size + 2:
+        return MISS_LEGEND
+    return ''
+
+
+def crop_grids(target_grid: list[list[str]], fleet_grid: list[list[str]],
+               top: int, left: int, num_lines: int,
+               num_chars: int) -> list[str]:
+    """Return the num_lines lines of the text of format_grids(target_grid,
+    fleet_grid) from line number top on, each cut to its num_chars
+    characters from left on.  Only the cells shown are read, so the cost
+    grows with the size of the window rather than with the grids.
+
+    >>> target_grid = [['-'] * 30 for _ in range(30)]
+    >>> fleet_grid = [['.'] * 30 for _ in range(30)]
+    >>> target_grid[12][3] = 'X'
+    >>> crop_grids(target_grid, fleet_grid, 15, 2, 3, 6)
+    ['------', '---X--', '------']
+    >>> lines = format_grids(target_grid, fleet_grid).splitlines()
+    >>> all(crop_grids(target_grid, fleet_grid, top, left, 4, 9)
+    ...     == [line[left:left + 9] for line in lines[top:top + 4]]
+    ...     for top in range(0, 40, 3) for left in range(0, 70, 5))
+    True
+    """
+    grid_size = len(target_grid)
+    gap_between_grids = ' ' * (28 - grid_size)
+    right = left + num_chars
+    lines = []
+    for line in range(top, min(top + num_lines,
+                               grid_size + GRIDS_EXTRA_LINES)):
+        row = line - GRIDS_FIRST_ROW_LINE
+        if not 0 <= row < grid_size:
+            lines.append(format_grids_line(target_grid, fleet_grid,
+                                           line)[left:right])
+            continue
+        label = str(row)
+        parts = []
+        start = 0
+        for piece in (label, target_grid[row], gap_between_grids, label,
+                      fleet_grid[row]):
+            end = start + len(piece)
+            if start < right and end > left:
+                parts.extend(piece[col] for col in
+                             range(max(left, start) - start,
+                                   min(right, end) - start))
+            start = end
+        lines.append(''.join(parts))
+    return lines
+
+
+def get_grids_width(grid_size: int) -> int:
+    """Return the length of the longest line of the text of format_grids
+    for grid_size by grid_size grids.
+
+    >>> get_grids_width(2) == max(len(line) for line in format_grids(
+    ...     [['-'] * 2] * 2, [['.'] * 2] * 2).splitlines())
+    True
+    """
+    col_numbers = sum(len(str(col)) for col in range(grid_size))
+    gap = max(0, 28 - grid_size)
+    return max(2 + 2 * col_numbers + gap,
+               2 * len(str(max(grid_size - 1, 0))) + 2 * grid_size + gap,
+               len(GRIDS_TITLE), len(HIT_LEGEND))
+
+def format_grid_panels(panels: list[tuple]) -> list[str]:
+    """Return the lines that play_game prints for panels, a list of (title,
+    grid) pairs: each title followed by its grid the way display_grid prints
+    it.
+
+    >>> format_grid_panels([('Mine:', [['-', 'X']]), ('Yours:', [['a', '.']])])
+    ['Mine:', '- X', 'Yours:', 'a .']
+    """
+    lines = []
+    for title, grid in panels:
+        lines.append(title)
+        lines.extend(' '.join(row) for row in grid)
+    return lines
+
+
+def move_cursor(row: int, col: int) -> str:
+    """Return the ANSI escape sequence that moves the cursor to the 0-based
+    row and column of the terminal.
+
+    >>> move_cursor(0, 4)
+    '\\x1b[1;5H'
+    """
+    return f'\x1b[{row + 1};{col + 1}H'
+
+
+def changed_runs(old_line: str, new_line: str) -> list[list[int]]:
+    """Return [start, end] for each run of characters that must be redrawn
+    to turn old_line into new_line on the screen.  Runs closer together than
+    MIN_GAP are merged.
+
+    >>> changed_runs('abcdef', 'abXdeY')
+    [[2, 6]]
+    >>> changed_runs('a' * 20, 'b' + 'a' * 18 + 'b')
+    [[0, 1], [19, 20]]
+    >>> changed_runs('abc', 'a')
+    [[1, 3]]
+    """
+    width = max(len(old_line), len(new_line))
+    old_line = old_line.ljust(width)
+    new_line = new_line.ljust(width)
+    runs = []
+    for col in range(width):
+        if old_line[col] != new_line[col]:
+            if runs and col - runs[-1][1] < MIN_GAP:
+                runs[-1][1] = col + 1
+            else:
+                runs.append([col, col + 1])
+    return runs
+
+
+class GridRenderer:
+    """A renderer that draws frames to output, redrawing only what changed
+    since the previous frame.
+
+    The frame is drawn at the top-left corner of the screen.  The viewport
+    is viewport_rows by viewport_cols characters; by default it is as big as
+    the terminal, less PROMPT_LINES lines.
+
+    >>> import io
+    >>> output = io.StringIO()
+    >>> renderer = GridRenderer(output, viewport_rows=3, viewport_cols=10)
+    >>> renderer.render_grid([['-', '-'], ['-', '-']])
+    >>> output.getvalue() == CLEAR_SCREEN + move_cursor(0, 0) + '- -\\n- -' \\
+    ...     + move_cursor(2, 0) + CLEAR_TO_END_OF_SCREEN
+    True
+    >>> _ = output.seek(0), output.truncate()
+    >>> renderer.render_grid([['-', '-'], ['-', 'X']])
+    >>> output.getvalue() == move_cursor(1, 2) + 'X' + move_cursor(2, 0) \\
+    ...     + CLEAR_TO_END_OF_SCREEN
+    True
+
+    Once the prompts below a frame may have scrolled the terminal, the next
+    frame is drawn in full.
+
+    >>> renderer = GridRenderer(output, viewport_rows=3, viewport_cols=10,
+    ...                         terminal_lines=4)
+    >>> renderer.render_grid([['-', '-'], ['-', '-']])
+    >>> renderer.print('Invalid move!')
+    >>> renderer.print('Try again.')
+    >>> _ = output.seek(0), output.truncate()
+    >>> renderer.render_grid([['-', '-'], ['-', 'X']])
+    >>> output.getvalue().startswith(CLEAR_SCREEN)
+    True
+    """
+
+    def __init__(self, output: TextIO = None, viewport_rows: int = None,
+                 viewport_cols: int = None,
+                 terminal_lines: int = None) -> None:
+        """Initialize a renderer that writes to output, sys.stdout by
+        default, on a terminal terminal_lines lines tall, and has not drawn
+        anything yet."""
+        if output is None:
+            output = sys.stdout
+        terminal_size = shutil.get_terminal_size()
+        if terminal_lines is None:
+            terminal_lines = terminal_size.lines
+        if viewport_rows is None:
+            viewport_rows = max(1, terminal_lines - PROMPT_LINES)
+        if viewport_cols is None:
+            viewport_cols = terminal_size.columns
+        self.output = output
+        self.viewport_rows = viewport_rows
+        self.viewport_cols = viewport_cols
+        self.terminal_lines = terminal_lines
+        self.terminal_cols = terminal_size.columns
+        self.top = 0
+        self.left = 0
+        self.prompt_lines = 0
+        self._frame = None
+        self._screen = None
+
+    def _count_lines(self, text: str) -> int:
+        """Return the number of terminal lines that text takes when printed
+        from the start of a line, wrapped lines included."""
+        return sum(max(1, -(-len(line) // self.terminal_cols))
+                   for line in text.split('\n'))
+
+    def print(self, text: str = '') -> None:
+        """Print text and a newline below the frame, like print, counting the
+        lines they take."""
+        self.output.write(text + '\n')
+        self.output.flush()
+        self.prompt_lines += self._count_lines(text)
+
+    def input(self, prompt: str = '') -> str:
+        """Show prompt below the frame and return the line the user types,
+        like input, counting the lines they take."""
+        self.output.write(prompt)
+        self.output.flush()
+        line = input()
+        self.prompt_lines += self._count_lines(prompt + line)
+        return line
+
+    def scroll(self, rows: int, cols: int) -> None:
+        """Move the viewport down by rows lines and right by cols characters
+        (up and left for negative values) and redraw the last frame."""
+        self.top += rows
+        self.left += cols
+        if self._frame is not None:
+            self._render(*self._frame)
+
+    def render_lines(self, lines: list[str]) -> None:
+        """Draw the frame made of lines, through the viewport, with a single
+        write to the output, and leave the cursor on the line below it.  The
+        viewport is first moved, if needed, to lie inside the frame."""
+
+        def crop(top: int, left: int, num_lines: int,
+                 num_chars: int) -> list[str]:
+            return [line[left:left + num_chars]
+                    for line in lines[top:top + num_lines]]
+
+        self._render(len(lines), max((len(line) for line in lines),
+                                     default=0), crop)
+
+    def _render(self, height: int, width: int, crop) -> None:
+        """Draw a frame of height lines, the longest width characters long,
+        through the viewport, like render_lines.  crop(top, left, num_lines,
+        num_chars) returns the part of the frame in the viewport: its
+        num_lines lines from line top on, cut to num_chars characters from
+        left on."""
+        self.top = max(0, min(self.top, height - self.viewport_rows))
+        self.left = max(0, min(self.left, width - self.viewport_cols))
+        self._frame = (height, width, crop)
+        screen = crop(self.top, self.left, self.viewport_rows,
+                      self.viewport_cols)
+        parts = []
+        if self._screen is not None and self.prompt_lines \
+                >= self.terminal_lines - len(self._screen):
+            # The prompts may have scrolled the terminal under the frame
+            self._screen = None
+        if self._screen is None:
+            parts.append(CLEAR_SCREEN)
+            parts.append(move_cursor(0, 0))
+            parts.append('\n'.join(screen))
+        else:
+            old_screen = self._screen
+            for row in range(max(len(screen), len(old_screen))):
+                old_line = old_screen[row] if row < len(old_screen) else ''
+                new_line = screen[row] if row < len(screen) else ''
+                new_line = new_line.ljust(len(old_line))
+                for start, end in changed_runs(old_line, new_line):
+                    parts.append(move_cursor(row, start))
+                    parts.append(new_line[start:end])
+        parts.append(move_cursor(len(screen), 0))
+        parts.append(CLEAR_TO_END_OF_SCREEN)
+        self._screen = screen
+        self.prompt_lines = 0
+        self.output.write(''.join(parts))
+        self.output.flush()
+
+    def render_grid(self, grid: list[list[str]]) -> None:
+        """Draw grid the way display_grid prints it."""
+        self.render_lines([' '.join(row) for row in grid])
+
+    def render_grids(self, target_grid: list[list[str]],
+                     fleet_grid: list[list[str]]) -> None:
+        """Draw target_grid and fleet_grid the way display_grids prints
+        them.  Only the cells in the viewport are read, so a frame of a
+        large board costs as much as one of a board the size of the
+        viewport.
+
+        >>> import io
+        >>> from large_board import SparseFleetGrid, SparseTargetGrid
+        >>> output = io.StringIO()
+        >>> renderer = GridRenderer(output, viewport_rows=2, viewport_cols=4)
+        >>> target, fleet = SparseTargetGrid(100000), SparseFleetGrid(100000)
+        >>> target[0][1] = HIT
+        >>> renderer.scroll(4, 0)
+        >>> renderer.render_grids(target, fleet)
+        >>> output.getvalue().endswith('0-X-\\n1---' + move_cursor(2, 0)
+        ...                            + CLEAR_TO_END_OF_SCREEN)
+        True
+        """
+
+        def crop(top: int, left: int, num_lines: int,
+                 num_chars: int) -> list[str]:
+            return crop_grids(target_grid, fleet_grid, top, left, num_lines,
+                              num_chars)
+
+        self._render(len(target_grid) + GRIDS_EXTRA_LINES,
+                     get_grids_width(len(target_grid)), crop)
+
+    def render_panels(self, panels: list[tuple]) -> None:
+        """Draw the titled grids in panels, a list of (title, grid) pairs, as
+        one frame, the way play_game prints them."""
+        self.render_lines(format_grid_panels(panels))
+
+    def reset(self) -> None:
+        """Forget the previous frame, so the next frame is drawn in full."""
+        self._frame = None
+        self._screen = None
+        self.prompt_lines = 0
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,428 @@
+# The file contains an incremental version of the probability-density
+# targeting strategy (see probability_density.py).
+#
+# A placement is one ship size at one start cell in one direction.  An
+# inverted index lists, for every cell, the placements that cover it, and
+# for every placement the index keeps how many MISS cells and how many HIT
+# cells it covers.  The density of a cell is the number of placements that
+# cover it and no MISS (its hunt density), and the number of those that also
+# cover a HIT (its target density), each counted once per afloat ship of
+# that size.
+#
+# A shot only touches the placements through the cell that was shot: a MISS
+# removes them and takes them off the densities of their cells, and a HIT
+# moves the ones that had no HIT yet into the target densities.  The work
+# per shot is proportional to the placements touched, not to the board
+# size.  The densities of each ship size on its own are kept too, with the
+# cells they are not 0 on, so sinking a ship, which changes the count of its
+# size, only touches the cells that a placement of that size can still
+# cover.
+#
+# The UNKNOWN cells are also kept in buckets by density, one sorted list of
+# cells per density value, so the densest cells are the top bucket, already
+# in order.  The hunt buckets keep the cells of density 0 too, so when no
+# ship fits anywhere the UNKNOWN cells are the top bucket.
+
+from bisect import bisect_left, insort
+from functools import lru_cache
+from random import randint
+from battleship_game_functions import UNKNOWN, HIT, MISS
+from grid_engine import ObservedGrid
+
+
+@lru_cache(maxsize=None)
+def get_cell_placements(grid_size: int, ship_size: int) -> list[list[int]]:
+    """Return, for each cell number row * grid_size + col of a grid_size by
+    grid_size grid, the placements of a ship of size ship_size that cover
+    it.  A placement is numbered 2 * start for a ship across from cell
+    number start, and 2 * start + 1 for a ship down from it.
+
+    >>> get_cell_placements(2, 2)
+    [[0, 1], [0, 3], [1, 4], [3, 4]]
+    """
+    placements = [[] for _ in range(grid_size * grid_size)]
+    for row in range(grid_size):
+        for col in range(grid_size):
+            start = row * grid_size + col
+            if col + ship_size <= grid_size:
+                for offset in range(ship_size):
+                    placements[start + offset].append(2 * start)
+            if row + ship_size <= grid_size:
+                for offset in range(ship_size):
+                    placements[start + offset * grid_size].append(
+                        2 * start + 1)
+    return placements
+
+
+class DensityBuckets:
+    """Cells grouped by density, each group in increasing order, with the
+    largest density found quickly.  Cells of density 0 are only kept if
+    keep_zero is True.
+
+    >>> buckets = DensityBuckets()
+    >>> buckets.add(5, 2)
+    >>> buckets.add(3, 2)
+    >>> buckets.add(4, 1)
+    >>> buckets.add(6, 0)
+    >>> buckets.densest()
+    [3, 5]
+    >>> buckets.discard(3, 2)
+    >>> buckets.discard(5, 2)
+    >>> buckets.densest()
+    [4]
+    >>> buckets.discard(4, 1)
+    >>> buckets.densest()
+    []
+    """
+
+    def __init__(self, keep_zero: bool = False) -> None:
+        """Initialize buckets holding no cells."""
+        self.keep_zero = keep_zero
+        self._buckets = {0: []}
+        self._max_density = 0
+
+    def add(self, cell: int, density: int) -> None:
+        """Add cell with density, if density is not 0 or keep_zero is
+        True."""
+        if density or self.keep_zero:
+            insort(self._buckets.setdefault(density, []), cell)
+            if density > self._max_density:
+                self._max_density = density
+
+    def discard(self, cell: int, density: int) -> None:
+        """Remove cell, which was added with density, if it is there."""
+        if density or self.keep_zero:
+            bucket = self._buckets[density]
+            index = bisect_left(bucket, cell)
+            if index < len(bucket) and bucket[index] == cell:
+                del bucket[index]
+
+    def move(self, cell: int, old_density: int, new_density: int) -> None:
+        """Move cell, which was added with old_density, to new_density."""
+        buckets = self._buckets
+        if old_density or self.keep_zero:
+            bucket = buckets[old_density]
+            index = bisect_left(bucket, cell)
+            if index < len(bucket) and bucket[index] == cell:
+                del bucket[index]
+        if new_density or self.keep_zero:
+            bucket = buckets.get(new_density)
+            if bucket is None:
+                buckets[new_density] = [cell]
+            else:
+                insort(bucket, cell)
+            if new_density > self._max_density:
+                self._max_density = new_density
+
+    def move_all(self, moves: list[tuple[int, int, int]]) -> None:
+        """Move every cell of moves, a list of (cell, old density, new
+        density), like move, going over each bucket touched once.
+
+        >>> buckets = DensityBuckets(keep_zero=True)
+        >>> for cell in range(6):
+        ...     buckets.add(cell, cell % 2)
+        >>> buckets.move_all([(1, 1, 0), (2, 0, 3), (4, 0, 3)])
+        >>> buckets.densest(), buckets._buckets[0], buckets._buckets[1]
+        ([2, 4], [0, 1], [3, 5])
+        """
+        buckets = self._buckets
+        leaving = {}
+        arriving = {}
+        for cell, old_density, new_density in moves:
+            if old_density == new_density:
+                continue
+            if old_density or self.keep_zero:
+                leaving.setdefault(old_density, set()).add(cell)
+            if new_density or self.keep_zero:
+                arriving.setdefault(new_density, []).append(cell)
+        for density, cells in leaving.items():
+            buckets[density] = [cell for cell in buckets[density]
+                                if cell not in cells]
+        for density, cells in arriving.items():
+            bucket = buckets.setdefault(density, [])
+            # Sorting a sorted list followed by sorted cells merges them
+            bucket.extend(sorted(cells))
+            bucket.sort()
+            if density > self._max_density:
+                self._max_density = density
+
+    def densest(self) -> list[int]:
+        """Return the cells with the largest density, in increasing order,
+        or an empty list if there are none.  The list must not be
+        changed."""
+        while self._max_density and not self._buckets[self._max_density]:
+            self._max_density -= 1
+            self._buckets.setdefault(self._max_density, [])
+        return self._buckets[self._max_density]
+
+
+class IncrementalDensity:
+    """The hunt and target densities of the cells of a target grid, kept up
+    to date as cells are shot.
+
+    An IncrementalDensity is an observer for an ObservedGrid (see
+    grid_engine.py), so it can follow a target grid as cells are shot and
+    shots are undone.
+
+    >>> grid = [[UNKNOWN, MISS, UNKNOWN],
+    ...         [MISS, UNKNOWN, MISS],
+    ...         [UNKNOWN, UNKNOWN, UNKNOWN]]
+    >>> density = IncrementalDensity(grid, [2])
+    >>> density.get_density_map()
+    [[0, 0, 0], [0, 1, 0], [1, 3, 1]]
+    >>> density.get_guess_cells() == 1 << 7
+    True
+    >>> density.cell_changed(2, 1, UNKNOWN, HIT)
+    >>> density.target_density(1, 1), density.target_density(2, 2)
+    (1, 1)
+    >>> density.cell_changed(2, 1, HIT, UNKNOWN)
+    >>> density.target_density(1, 1)
+    0
+    """
+
+    def __init__(self, target_grid: list[list[str]],
+                 ship_sizes: list[int]) -> None:
+        """Initialize the densities of target_grid for the afloat ships in
+        ship_sizes."""
+        self.grid_size = len(target_grid)
+        num_cells = self.grid_size * self.grid_size
+        self._cells = [UNKNOWN] * num_cells
+        for row in range(self.grid_size):
+            for col in range(self.grid_size):
+                self._cells[row * self.grid_size + col] = target_grid[row][col]
+        self._hunt = [0] * num_cells
+        self._target = [0] * num_cells
+        self._hunt_buckets = DensityBuckets(keep_zero=True)
+        self._target_buckets = DensityBuckets()
+        for cell in range(num_cells):
+            if self._cells[cell] == UNKNOWN:
+                self._hunt_buckets.add(cell, 0)
+        self._ship_counts = {}
+        self._misses = {}
+        self._hits = {}
+        self._size_hunt = {}
+        self._size_target = {}
+        self._size_cells = {}
+        self.set_ship_sizes(ship_sizes)
+
+    def hunt_density(self, row: int, col: int) -> int:
+        """Return the number of placements without a MISS that cover (row,
+        col)."""
+        return self._hunt[row * self.grid_size + col]
+
+    def target_density(self, row: int, col: int) -> int:
+        """Return the number of placements without a MISS and with a HIT that
+        cover (row, col)."""
+        return self._target[row * self.grid_size + col]
+
+    def get_density_map(self) -> list[list[int]]:
+        """Return the hunt density of every cell, like get_density_map in
+        probability_density.py."""
+        return [self._hunt[row * self.grid_size:(row + 1) * self.grid_size]
+                for row in range(self.grid_size)]
+
+    def set_ship_sizes(self, ship_sizes: list[int]) -> None:
+        """Change the afloat ships to those in ship_sizes.
+
+        Each size whose count changes costs one pass over the cells that a
+        placement of that size still covers.
+
+        >>> grid = [[UNKNOWN, MISS, UNKNOWN], [UNKNOWN] * 3, [UNKNOWN] * 3]
+        >>> density = IncrementalDensity(grid, [3, 2])
+        >>> density.set_ship_sizes([3])
+        >>> density.get_density_map() == IncrementalDensity(grid, [3]
+        ...                                                 ).get_density_map()
+        True
+        >>> density.set_ship_sizes([])
+        >>> density.get_guess_cells() == 0b111111101
+        True
+        """
+        new_counts = {}
+        for ship_size in ship_sizes:
+            new_counts[ship_size] = new_counts.get(ship_size, 0) + 1
+        if new_counts == self._ship_counts:
+            return
+        for ship_size in set(new_counts) | set(self._ship_counts):
+            change = new_counts.get(ship_size, 0) \
+                     - self._ship_counts.get(ship_size, 0)
+            if not change:
+                continue
+            if ship_size not in self._misses:
+                self._add_size(ship_size)
+            size_hunt = self._size_hunt[ship_size]
+            size_target = self._size_target[ship_size]
+            hunt = self._hunt
+            target = self._target
+            hunt_moves = []
+            target_moves = []
+            for cell in self._size_cells[ship_size]:
+                hunt_change = change * size_hunt[cell]
+                target_change = change * size_target[cell]
+                if self._cells[cell] == UNKNOWN:
+                    hunt_moves.append((cell, hunt[cell],
+                                       hunt[cell] + hunt_change))
+                    if target_change:
+                        target_moves.append((cell, target[cell],
+                                             target[cell] + target_change))
+                hunt[cell] += hunt_change
+                target[cell] += target_change
+            self._hunt_buckets.move_all(hunt_moves)
+            self._target_buckets.move_all(target_moves)
+        self._ship_counts = new_counts
+
+    def cell_changed(self, row: int, col: int, old_value: str,
+                     new_value: str) -> None:
+        """Update the densities after the cell at (row, col) changed from
+        old_value to new_value."""
+        cell = row * self.grid_size + col
+        if old_value == UNKNOWN:
+            self._hunt_buckets.discard(cell, self._hunt[cell])
+            self._target_buckets.discard(cell, self._target[cell])
+        # The cell stays out of the buckets until its densities are final
+        self._cells[cell] = old_value if new_value == UNKNOWN else new_value
+        for ship_size in self._misses:
+            misses = self._misses[ship_size]
+            hits = self._hits[ship_size]
+            for placement in get_cell_placements(self.grid_size,
+                                                 ship_size)[cell]:
+                was_open = misses[placement] == 0
+                was_hit = was_open and hits[placement] > 0
+                if old_value == MISS:
+                    misses[placement] -= 1
+                elif old_value == HIT:
+                    hits[placement] -= 1
+                if new_value == MISS:
+                    misses[placement] += 1
+                elif new_value == HIT:
+                    hits[placement] += 1
+                is_open = misses[placement] == 0
+                is_hit = is_open and hits[placement] > 0
+                if was_open != is_open or was_hit != is_hit:
+                    self._change_placement(ship_size, placement,
+                                           is_open - was_open,
+                                           is_hit - was_hit)
+        if new_value == UNKNOWN:
+            self._cells[cell] = UNKNOWN
+            self._hunt_buckets.add(cell, self._hunt[cell])
+            self._target_buckets.add(cell, self._target[cell])
+
+    def get_guess_cells(self) -> int:
+        """Return the bitboard of the UNKNOWN cells with the largest target
+        density or, if none has one, the largest hunt density, or else of
+        every UNKNOWN cell: the cells make_density_guess chooses from."""
+        best = 0
+        for cell in self._get_guess_list():
+            best |= 1 << cell
+        return best
+
+    def make_guess(self) -> list[int]:
+        """Return the row and column of a cell chosen at random from
+        get_guess_cells(), the same cell choose_random_cell in
+        probability_density.py would choose.
+
+        Preconditions:
+            - UNKNOWN appears in the target grid
+        """
+        cells = self._get_guess_list()
+        return list(divmod(cells[randint(0, len(cells) - 1)],
+                           self.grid_size))
+
+    def _get_guess_list(self) -> list[int]:
+        """Return the cell numbers of get_guess_cells(), in order."""
+        cells = self._target_buckets.densest()
+        if not cells:
+            # With no hunt density anywhere, these are the UNKNOWN cells
+            cells = self._hunt_buckets.densest()
+        return cells
+
+    def _add_size(self, ship_size: int) -> None:
+        """Start keeping the MISS and HIT counts of the placements of ships
+        of size ship_size, and the densities of those placements alone, with
+        no such ship afloat."""
+        grid_size = self.grid_size
+        num_cells = grid_size * grid_size
+        misses = [0] * (2 * num_cells)
+        hits = [0] * (2 * num_cells)
+        cell_placements = get_cell_placements(grid_size, ship_size)
+        for cell in range(num_cells):
+            if self._cells[cell] == MISS:
+                for placement in cell_placements[cell]:
+                    misses[placement] += 1
+            elif self._cells[cell] == HIT:
+                for placement in cell_placements[cell]:
+                    hits[placement] += 1
+        size_hunt = [0] * num_cells
+        size_target = [0] * num_cells
+        size_cells = set()
+        for cell in range(num_cells):
+            for placement in cell_placements[cell]:
+                if misses[placement] == 0:
+                    size_hunt[cell] += 1
+                    if hits[placement]:
+                        size_target[cell] += 1
+            if size_hunt[cell]:
+                size_cells.add(cell)
+        self._misses[ship_size] = misses
+        self._hits[ship_size] = hits
+        self._size_hunt[ship_size] = size_hunt
+        self._size_target[ship_size] = size_target
+        self._size_cells[ship_size] = size_cells
+
+    def _change_placement(self, ship_size: int, placement: int,
+                          hunt_change: int, target_change: int) -> None:
+        """Add hunt_change and target_change to the densities of the cells of
+        placement, a placement of a ship of size ship_size, for one ship and
+        for every afloat ship of that size."""
+        start = placement // 2
+        step = self.grid_size if placement % 2 else 1
+        size_hunt = self._size_hunt[ship_size]
+        size_target = self._size_target[ship_size]
+        size_cells = self._size_cells[ship_size]
+        count = self._ship_counts.get(ship_size, 0)
+        hunt = self._hunt
+        target = self._target
+        for cell in range(start, start + step * ship_size, step):
+            size_hunt[cell] += hunt_change
+            size_target[cell] += target_change
+            if not size_hunt[cell]:
+                size_cells.discard(cell)
+            elif size_hunt[cell] == hunt_change:
+                size_cells.add(cell)
+            if not count:
+                continue
+            if self._cells[cell] == UNKNOWN:
+                if hunt_change:
+                    self._hunt_buckets.move(cell, hunt[cell],
+                                            hunt[cell] + count * hunt_change)
+                if target_change:
+                    self._target_buckets.move(cell, target[cell], target[cell]
+                                              + count * target_change)
+            hunt[cell] += count * hunt_change
+            target[cell] += count * target_change
+
+
+class DensityTargetGrid(ObservedGrid):
+    """A target grid whose densities for the afloat ships are kept in
+    density_index as the grid changes.  make_density_guess uses
+    density_index when it is there.
+
+    >>> from probability_density import make_density_guess
+    >>> target = DensityTargetGrid([[UNKNOWN] * 3 for _ in range(3)], [3])
+    >>> target[1][1] = MISS
+    >>> target.density_index.get_density_map()
+    [[2, 1, 2], [1, 0, 1], [2, 1, 2]]
+    >>> make_density_guess(target, [3]) in [[0, 0], [0, 2], [2, 0], [2, 2]]
+    True
+    """
+
+    def __init__(self, target_grid: list[list[str]],
+                 ship_sizes: list[int]) -> None:
+        """Initialize a view of target_grid with the densities of the afloat
+        ships in ship_sizes."""
+        self.density_index = IncrementalDensity(target_grid, ship_sizes)
+        super().__init__(target_grid, [self.density_index])
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
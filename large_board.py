@@ -0,0 +1,201 @@
+# The file contains the large-board mode: sparse fleet and target grids whose
+# memory grows with the number of ships and shots rather than with the number
+# of cells, so boards of 1,000 by 1,000 cells and beyond can be played.
+#
+# Both grids support grid[row][col] like a list[list[str]], so the validators
+# and move functions work on them unchanged.  A sparse fleet grid names its
+# ships by symbol like every other fleet grid, so it holds at most the 1396
+# ships make_ship_symbols (ship_table.py) has symbols for; larger fleets are
+# tracked by ship id without a fleet grid (see ShipTracker.from_ship_cells).
+
+from battleship_game_functions import MAX_GRID_SIZE, EMPTY, UNKNOWN, HIT, \
+                                      MISS
+from grid_engine import GridEngine
+from ship_table import place_ships
+
+# The largest grid size accepted for a large board.
+MAX_LARGE_GRID_SIZE = 1000000
+
+
+class SparseFleetGrid(GridEngine):
+    """A fleet grid that stores only its ship cells.
+
+    segments maps each ship symbol to the list of cells (row, col) that the
+    ship occupies, and the coordinate index maps each occupied cell back to
+    its ship symbol.  Cells that have been hit are kept in a set.
+
+    >>> fleet = SparseFleetGrid(1000)
+    >>> fleet.add_ship(5, 998, 5, 999, 'a')
+    >>> fleet[5][999], fleet[999][5]
+    ('a', '.')
+    >>> fleet[5][999] = 'A'
+    >>> fleet.segments['a'], sorted(fleet.hits)
+    ([(5, 998), (5, 999)], [(5, 999)])
+    """
+
+    def __init__(self, grid_size: int) -> None:
+        """Initialize an EMPTY grid_size by grid_size fleet grid."""
+        self.grid_size = grid_size
+        self.segments = {}
+        self.hits = set()
+        self._index = {}
+
+    def add_ship(self, row1: int, col1: int, row2: int, col2: int,
+                 ship_symbol: str) -> None:
+        """Place ship_symbol from (row1, col1) to (row2, col2), inclusive."""
+        if row1 == row2:
+            cells = [(row1, col) for col in range(min(col1, col2),
+                                                  max(col1, col2) + 1)]
+        else:
+            cells = [(row, col1) for row in range(min(row1, row2),
+                                                  max(row1, row2) + 1)]
+        for row, col in cells:
+            self.set_cell(row, col, ship_symbol)
+
+    def get_cell(self, row: int, col: int) -> str:
+        symbol = self._index.get((row, col), EMPTY)
+        if (row, col) in self.hits:
+            return symbol.upper()
+        return symbol
+
+    def set_cell(self, row: int, col: int, value: str) -> None:
+        """Set the cell at (row, col) to value.  An upper-case value whose
+        lower-case symbol is a ship (this cell's included) is a hit on that
+        ship.
+
+        >>> fleet = SparseFleetGrid(1000)
+        >>> fleet.add_ship(0, 0, 0, 0, 'a')
+        >>> fleet[0][0] = 'A'
+        >>> fleet.segments, fleet.hits
+        ({'a': [(0, 0)]}, {(0, 0)})
+        """
+        cell = (row, col)
+        # Resolve a hit before the old symbol's segment can be emptied
+        symbol = value
+        is_hit = value not in self.segments and value.lower() != value \
+            and value.lower() in self.segments
+        if is_hit:
+            symbol = value.lower()
+        old_symbol = self._index.pop(cell, None)
+        if old_symbol is not None:
+            self.segments[old_symbol].remove(cell)
+            if not self.segments[old_symbol]:
+                del self.segments[old_symbol]
+            self.hits.discard(cell)
+        if value == EMPTY:
+            return
+        if is_hit:
+            self.hits.add(cell)
+        self._index[cell] = symbol
+        self.segments.setdefault(symbol, []).append(cell)
+
+    def ship_at(self, row: int, col: int) -> str:
+        """Return the lower-case symbol of the ship at (row, col), or EMPTY."""
+        return self._index.get((row, col), EMPTY)
+
+    def occupied_cells(self) -> list[tuple[int, int]]:
+        """Return the cells that hold a ship, in no particular order."""
+        return list(self._index)
+
+
+class SparseTargetGrid(GridEngine):
+    """A target grid that records only the cells that have been shot.
+
+    shots maps the cell number row * grid_size + col of each shot cell to
+    HIT or MISS.
+
+    >>> target = SparseTargetGrid(1000)
+    >>> target[999][999] = MISS
+    >>> target[999][999], target[0][0], target.num_moves()
+    ('M', '-', 1)
+    """
+
+    def __init__(self, grid_size: int) -> None:
+        """Initialize a grid_size by grid_size target grid of UNKNOWN
+        cells."""
+        self.grid_size = grid_size
+        self.shots = {}
+
+    def get_cell(self, row: int, col: int) -> str:
+        return self.shots.get(row * self.grid_size + col, UNKNOWN)
+
+    def set_cell(self, row: int, col: int, value: str) -> None:
+        cell = row * self.grid_size + col
+        if value == UNKNOWN:
+            self.shots.pop(cell, None)
+        elif value in (HIT, MISS):
+            self.shots[cell] = value
+        else:
+            raise ValueError(f'{value!r} is not a target grid symbol')
+
+    def num_moves(self) -> int:
+        """Return the number of cells that are not UNKNOWN."""
+        return len(self.shots)
+
+
+def is_large_board(grid: list[list[str]]) -> bool:
+    """Return True if and only if grid is a large-board grid.
+
+    >>> is_large_board(SparseTargetGrid(20))
+    True
+    >>> is_large_board([[EMPTY]])
+    False
+    """
+    return isinstance(grid, (SparseFleetGrid, SparseTargetGrid))
+
+
+def get_max_grid_size(grid: list[list[str]]) -> int:
+    """Return the largest grid size allowed for a grid like grid.
+
+    >>> get_max_grid_size(SparseFleetGrid(20)) == MAX_LARGE_GRID_SIZE
+    True
+    >>> get_max_grid_size([[EMPTY]]) == MAX_GRID_SIZE
+    True
+    """
+    if is_large_board(grid):
+        return MAX_LARGE_GRID_SIZE
+    return MAX_GRID_SIZE
+
+
+def make_sparse_fleet_grid(rows: list[str]) -> SparseFleetGrid:
+    """Return a sparse fleet grid whose row i holds the cells of rows[i],
+    one character per cell.  Raise ValueError if the grid is not square.
+
+    >>> fleet = make_sparse_fleet_grid(['a..', 'a.b', '..b'])
+    >>> fleet.segments
+    {'a': [(0, 0), (1, 0)], 'b': [(1, 2), (2, 2)]}
+    """
+    grid_size = len(rows)
+    fleet_grid = SparseFleetGrid(grid_size)
+    for row in range(grid_size):
+        if len(rows[row]) != grid_size:
+            raise ValueError(f'row {row} is not {grid_size} cells long')
+        for col in range(grid_size):
+            if rows[row][col] != EMPTY:
+                fleet_grid.set_cell(row, col, rows[row][col])
+    return fleet_grid
+
+
+def generate_large_fleet_grid(grid_size: int, ship_symbols: list[str],
+                              ship_sizes: list[int]) -> SparseFleetGrid:
+    """Return a new grid_size by grid_size sparse fleet grid with the ships in
+    ship_symbols and the corresponding ship sizes in ship_sizes placed at
+    random, non-overlapping positions.  There can be at most as many ships
+    as make_ship_symbols has symbols for.
+
+    >>> fleet = generate_large_fleet_grid(1000, ['a', 'b'], [3, 2])
+    >>> sorted(len(cells) for cells in fleet.segments.values())
+    [2, 3]
+    """
+    fleet_grid = SparseFleetGrid(grid_size)
+    for ship_symbol, cells in zip(ship_symbols,
+                                  place_ships(grid_size, ship_sizes)):
+        for cell in cells:
+            fleet_grid.set_cell(cell // grid_size, cell % grid_size,
+                                ship_symbol)
+    return fleet_grid
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,143 @@
+# The file contains a move journal: the record of the shots fired at one
+# fleet grid, in order, with undo and redo.
+#
+# Each shot is stored as a ShotRecord of its cell, its result and the index
+# of the ship it hit.  That is all that is needed to undo it exactly: the
+# target grid cell goes back to UNKNOWN, a hit ship cell goes back to lower
+# case and its count in the hits list goes down by one.  Nothing is copied,
+# so a search can make and unmake thousands of shots per decision, and the
+# number of moves is the length of the journal instead of a scan of the
+# target grid.
+#
+# Cells are changed by item assignment, so observed grids (see
+# grid_engine.py) see undone and redone shots like any other change.
+
+from typing import NamedTuple
+from battleship_game_functions import UNKNOWN, HIT, MISS
+from ship_tracker import ShipTracker, ShotResult
+
+
+class ShotRecord(NamedTuple):
+    """A shot at (row, col): its kind of result (see ship_tracker.py) and the
+    index of the ship that was hit, or -1 for a miss."""
+    row: int
+    col: int
+    kind: str
+    ship_index: int
+
+
+class MoveJournal:
+    """The shots fired at fleet_grid and recorded in target_grid and
+    hits_list, with undo and redo.
+
+    The journal keeps a ShipTracker, tracker, of the ships in fleet_grid, so
+    every shot reports whether it sank a ship or won the game.
+
+    >>> from battleship_game_functions import EMPTY
+    >>> fleet_grid = [['a', 'a'], [EMPTY, EMPTY]]
+    >>> target_grid = [[UNKNOWN] * 2 for _ in range(2)]
+    >>> hits_list = [0]
+    >>> journal = MoveJournal(fleet_grid, target_grid, ['a'], [2], hits_list)
+    >>> journal.shoot(1, 0)
+    ShotRecord(row=1, col=0, kind='miss', ship_index=-1)
+    >>> journal.shoot(0, 1)
+    ShotRecord(row=0, col=1, kind='hit', ship_index=0)
+    >>> fleet_grid, target_grid, hits_list, journal.num_moves()
+    ([['a', 'A'], ['.', '.']], [['-', 'X'], ['M', '-']], [1], 2)
+    >>> journal.undo()
+    ShotRecord(row=0, col=1, kind='hit', ship_index=0)
+    >>> fleet_grid, target_grid, hits_list, journal.num_moves()
+    ([['a', 'a'], ['.', '.']], [['-', '-'], ['M', '-']], [0], 1)
+    >>> journal.redo().kind, hits_list
+    ('hit', [1])
+    >>> journal.shoot(0, 0).kind, journal.tracker.has_won()
+    ('win', True)
+    """
+
+    def __init__(self, fleet_grid: list[list[str]],
+                 target_grid: list[list[str]], ship_symbols: list[str],
+                 ship_sizes: list[int], hits_list: list[int]) -> None:
+        """Initialize an empty journal of the shots at fleet_grid, which
+        holds the ships in ship_symbols with the sizes in ship_sizes, that
+        are recorded in target_grid and hits_list.
+
+        ship_symbols, ship_sizes and hits_list are parallel lists."""
+        self.fleet_grid = fleet_grid
+        self.target_grid = target_grid
+        self.hits_list = hits_list
+        self.tracker = ShipTracker(fleet_grid, ship_symbols, ship_sizes)
+        self.records = []
+        self._position = 0
+
+    def num_moves(self) -> int:
+        """Return the number of shots made and not undone."""
+        return self._position
+
+    def can_undo(self) -> bool:
+        """Return True if and only if there is a shot to undo."""
+        return self._position > 0
+
+    def can_redo(self) -> bool:
+        """Return True if and only if there is an undone shot to redo."""
+        return self._position < len(self.records)
+
+    def shoot(self, row: int, col: int) -> ShotRecord:
+        """Fire a shot at (row, col), record it in the target grid, fleet
+        grid and hits list, and return its record.  Any undone shots can no
+        longer be redone.
+
+        Raise ValueError if (row, col) has already been shot at."""
+        if self.target_grid[row][col] != UNKNOWN:
+            raise ValueError(f'cell ({row}, {col}) has already been shot at')
+        result = self.tracker.shoot(row, col)
+        record = ShotRecord(row, col, result.kind, result.ship_index)
+        del self.records[self._position:]
+        self.records.append(record)
+        self._apply(record)
+        return record
+
+    def undo(self) -> ShotRecord:
+        """Undo the most recent shot that has not been undone and return its
+        record.
+
+        Raise ValueError if there is no shot to undo."""
+        if not self.can_undo():
+            raise ValueError('there is no shot to undo')
+        self._position -= 1
+        record = self.records[self._position]
+        row, col = record.row, record.col
+        self.target_grid[row][col] = UNKNOWN
+        if record.ship_index != -1:
+            self.fleet_grid[row][col] = self.fleet_grid[row][col].lower()
+            self.hits_list[record.ship_index] -= 1
+        self.tracker.unshoot(row, col,
+                             ShotResult(record.kind, record.ship_index))
+        return record
+
+    def redo(self) -> ShotRecord:
+        """Redo the most recently undone shot and return its record.
+
+        Raise ValueError if there is no shot to redo."""
+        if not self.can_redo():
+            raise ValueError('there is no shot to redo')
+        record = self.records[self._position]
+        self.tracker.shoot(record.row, record.col)
+        self._apply(record)
+        return record
+
+    def _apply(self, record: ShotRecord) -> None:
+        """Record the shot in record, which is the next shot in the journal,
+        in the target grid, fleet grid and hits list."""
+        row, col = record.row, record.col
+        if record.ship_index == -1:
+            self.target_grid[row][col] = MISS
+        else:
+            self.target_grid[row][col] = HIT
+            self.fleet_grid[row][col] = self.fleet_grid[row][col].upper()
+            self.hits_list[record.ship_index] += 1
+        self._position += 1
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -1,4 +1,5 @@
 import os
+import sys
 from typing import TextIO
 from battleship_game_functions import MIN_SHIP_SIZE, MAX_SHIP_SIZE, \
                                       MAX_GRID_SIZE, UNKNOWN, EMPTY, HIT, MISS
@@ -8,6 +9,12 @@ from battleship_game_functions import valid_cell_indexes, \
                                       validate_symbol_counts, \
                                       validate_ship_positions
 from computer_play_functions import generate_fleet_grid, make_computer_guess
+from large_board import SparseTargetGrid, get_max_grid_size, \
+                        make_sparse_fleet_grid
+from fleet_validation import diagnose_fleet_grid
+from ship_tracker import SUNK_RESULT, WIN_RESULT
+from move_journal import MoveJournal
+from grid_renderer import GridRenderer, format_grids
 
 HIT_MESSAGE = 'hit a ship'
 MISS_MESSAGE = 'missed'
@@ -54,11 +61,18 @@ def read_ship_data(game_file: TextIO) -> list[list]:
 
 
 def read_fleet_grid(game_file: TextIO) -> list[list[str]]:
-    """Return the fleet grid that is found in game_file."""
-    fleet_grid = []
-    for line in game_file:
-        fleet_grid.append(list(line.strip()))
-    return fleet_grid
+    """Return the fleet grid that is found in game_file.  A square grid
+    wider than MAX_GRID_SIZE is read into a large-board grid (see
+    large_board.py), which keeps only its ship cells.
+    """
+    rows = [line.strip() for line in game_file]
+    if len(rows) > MAX_GRID_SIZE:
+        try:
+            return make_sparse_fleet_grid(rows)
+        except ValueError:
+            # Not square: left for validate_game_parameters to reject
+            pass
+    return [list(row) for row in rows]
 
 
 def is_valid_game(fleet_grid: list[list[str]], ship_symbols: list[str],
@@ -74,12 +88,13 @@ def validate_game_parameters(fleet_grid: list[list[str]],
                              ship_symbols: list[str],
                              ship_sizes: list[int]) -> bool:
     """Return True if and only if fleet_grid is square with at least one cell
-    and at most MAX_GRID_SIZE cells per row, the number of ship symbols in
-    ship_symbols is the same as the number of sizes in ship_sizes, that there
-    is at least one ship, all ships have a valid size, and all ships have a
-    valid, unique character label.
+    and at most MAX_GRID_SIZE cells per row (MAX_LARGE_GRID_SIZE for a
+    large-board grid), the number of ship symbols in ship_symbols is the same
+    as the number of sizes in ship_sizes, that there is at least one ship, all
+    ships have a valid size, and all ships have a valid, unique character
+    label.
     """
-    if len(fleet_grid) == 0 or len(fleet_grid) > MAX_GRID_SIZE:
+    if len(fleet_grid) == 0 or len(fleet_grid) > get_max_grid_size(fleet_grid):
         return False
     for row in fleet_grid:
         if len(row) != len(fleet_grid):
@@ -92,11 +107,7 @@ def validate_game_parameters(fleet_grid: list[list[str]],
     for ship_symbol in ship_symbols:
         if len(ship_symbol) != 1:
             return False
-    for i in range(len(ship_symbols)):
-        for j in range(len(ship_symbols)):
-            if i != j and ship_symbols[i] == ship_symbols[j]:
-                return False
-    return True
+    return len(set(ship_symbols)) == len(ship_symbols)
 
 
 def validate_fleet_grid(fleet_grid: list[list[str]],
@@ -107,50 +118,42 @@ def validate_fleet_grid(fleet_grid: list[list[str]],
     ship_sizes, and nothing else except for the EMPTY character. Each ship in
     ship_symbols must also have a valid alignment (all symbols appearing across
     a row or down a column) in fleet_grid.
+
+    The grid is checked in a single pass by diagnose_fleet_grid, which gives
+    the same verdict as validate_symbol_counts and validate_ship_positions.
     """
-    return validate_symbol_counts(fleet_grid, ship_symbols, ship_sizes) \
-           and validate_ship_positions(fleet_grid, ship_symbols, ship_sizes)
+    return diagnose_fleet_grid(fleet_grid, ship_symbols, ship_sizes) == []
 
 
 def get_target_grid(grid_size: int) -> list[list[str]]:
-    """Return a grid_size by grid_size grid of UNKNOWN characters."""
+    """Return a grid_size by grid_size grid of UNKNOWN characters, a
+    large-board grid if grid_size is more than MAX_GRID_SIZE."""
+    if grid_size > MAX_GRID_SIZE:
+        return SparseTargetGrid(grid_size)
     return [[UNKNOWN] * grid_size for _ in range(grid_size)]
 
 
 def display_grids(target_grid: list[list[str]],
-                  fleet_grid: list[list[str]]) -> None:
-    """Display the target_grid and the fleet_grid that belong to a player."""
-    print('\nMy target grid.               My fleet grid.\n')
-    gap_between_grids = ' ' * (28 - len(target_grid))
-
-    # Display the column numbers
-    print(' ', end='')
-    for col in range(len(target_grid)):
-        print(col, end='')
-    print(gap_between_grids + ' ', end='')
-    for col in range(len(target_grid)):
-        print(col, end='')
-    print()
-
-    # Display row numbers and cell contents.
-    for row in range(len(target_grid)):
-        print(row, end='')
-        for col in range(len(target_grid)):
-            print(target_grid[row][col], end='')
-        print(gap_between_grids + str(row), end='')
-        for col in range(len(fleet_grid)):
-            print(fleet_grid[row][col], end='')
-        print()
-
-    print()
-    print(' ' + HIT + ' means hit,                Upper-case means hit.')
-    print(' ' + MISS + ' means miss.')
-
-
-def get_row_col() -> list[int]:
-    """Return the row and column indexes entered by the user when prompted."""
-    row = input('Please enter the row: ')
-    col = input('Please enter the column: ')
+                  fleet_grid: list[list[str]],
+                  renderer: GridRenderer = None) -> None:
+    """Display the target_grid and the fleet_grid that belong to a player.
+
+    The grids are printed in one call, or drawn by renderer, redrawing only
+    what changed since its last frame, if renderer is not None.
+    """
+    if renderer is None:
+        print(format_grids(target_grid, fleet_grid), end='')
+    else:
+        renderer.render_grids(target_grid, fleet_grid)
+
+
+def get_row_col(renderer: GridRenderer = None) -> list[int]:
+    """Return the row and column indexes entered by the user when prompted.
+    The prompts go through renderer if it is not None, so that it knows how
+    many lines they take."""
+    ask = input if renderer is None else renderer.input
+    row = ask('Please enter the row: ')
+    col = ask('Please enter the column: ')
     if row.isdigit() and col.isdigit():
         row = int(row)
         col = int(col)
@@ -160,14 +163,17 @@ def get_row_col() -> list[int]:
     return [row, col]
 
 
-def get_valid_player_move(target_grid: list[list[str]]) -> list[int]:
-    """Return a two-item list that contains the player's move."""
+def get_valid_player_move(target_grid: list[list[str]],
+                          renderer: GridRenderer = None) -> list[int]:
+    """Return a two-item list that contains the player's move.  The prompts
+    go through renderer if it is not None (see get_row_col)."""
+    show = print if renderer is None else renderer.print
     grid_size = len(target_grid)
-    [row, col] = get_row_col()
+    [row, col] = get_row_col(renderer)
     while (not valid_cell_indexes(row, col, grid_size) or
            is_not_given_symbol(row, col, target_grid, UNKNOWN)):
-        print('Invalid move! Either already known or invalid indexes! \n')
-        [row, col] = get_row_col()
+        show('Invalid move! Either already known or invalid indexes! \n')
+        [row, col] = get_row_col(renderer)
     return [row, col]
 
 
@@ -188,7 +194,11 @@ def make_move(row: int, col: int, fleet_grid: list[list[str]],
 
 
 def get_num_moves(target_grid: list[list[str]]) -> int:
-    """Return the number of moves made so far for the board target_grid."""
+    """Return the number of moves made so far for the board target_grid.
+    Grids that count their moves, like large-board and bitboard grids, are
+    not scanned."""
+    if hasattr(target_grid, 'num_moves'):
+        return target_grid.num_moves()
     moves_count = 0
     for row in target_grid:
         for symbol in row:
@@ -197,38 +207,48 @@ def get_num_moves(target_grid: list[list[str]]) -> int:
     return moves_count
 
 
-def play_single_player() -> None:
-    """A single-player game with no opponent."""
+def play_single_player(renderer: GridRenderer = None) -> None:
+    """A single-player game with no opponent.  The grids are drawn by
+    renderer if it is not None (see display_grids)."""
     ship_symbols, ship_sizes, fleet_grid = read_game_file()
     if not is_valid_game(fleet_grid, ship_symbols, ship_sizes):
         print('The supplied game is not valid. Game exiting.')
+        if validate_game_parameters(fleet_grid, ship_symbols, ship_sizes):
+            for problem in diagnose_fleet_grid(fleet_grid, ship_symbols,
+                                               ship_sizes):
+                print(f'  - {problem.message}')
         return
 
     target_grid = get_target_grid(len(fleet_grid))
-    display_grids(target_grid, fleet_grid)
+    display_grids(target_grid, fleet_grid, renderer)
     hits_list = [0] * len(ship_sizes)
-
-    while not is_win(ship_sizes, hits_list):
-        print('\nTake a turn.')
-        [row, col] = get_valid_player_move(target_grid)
-        print()
-
-        message = make_move(row, col, fleet_grid, ship_symbols,
-                            hits_list, target_grid)
-        print(f'You {message}!')
-
-        if is_not_given_symbol(row, col, fleet_grid, EMPTY):
-            ship_index = ship_symbols.index(fleet_grid[row][col].lower())
-            if hits_list[ship_index] >= ship_sizes[ship_index]:
-                ship_size = ship_sizes[ship_index]
-                ship_symbol = ship_symbols[ship_index]
-                print(f'The size {ship_size} {ship_symbol} ship ' \
-                       'has been sunk!')
-
-        display_grids(target_grid, fleet_grid)
-
-    print(f'\nYou won in {get_num_moves(target_grid)} move(s)!')
+    journal = MoveJournal(fleet_grid, target_grid, ship_symbols, ship_sizes,
+                          hits_list)
+
+    # Prompts go through the renderer, which counts the lines they take
+    show = print if renderer is None else renderer.print
+    while not journal.tracker.has_won():
+        show('\nTake a turn.')
+        [row, col] = get_valid_player_move(target_grid, renderer)
+        show()
+
+        result = journal.shoot(row, col)
+        if result.ship_index == -1:
+            show(f'You {MISS_MESSAGE}!')
+        else:
+            show(f'You {HIT_MESSAGE}!')
+
+        if result.kind in (SUNK_RESULT, WIN_RESULT):
+            ship_size = journal.tracker.table.sizes[result.ship_index]
+            ship_symbol = journal.tracker.table.symbol_of(result.ship_index)
+            show(f'The size {ship_size} {ship_symbol} ship ' \
+                  'has been sunk!')
+
+        display_grids(target_grid, fleet_grid, renderer)
+
+    print(f'\nYou won in {journal.num_moves()} move(s)!')
     
 
 if __name__ == '__main__':
-    play_single_player()
+    # Redraw in place on a terminal, and print every turn otherwise
+    play_single_player(GridRenderer() if sys.stdout.isatty() else None)
@@ -0,0 +1,526 @@
+# The file contains a sampler of the fleet layouts that are consistent with
+# what a player has seen of the enemy's grid, and the shot probabilities
+# estimated from the samples.
+#
+# A layout is consistent when no ship covers a MISS, every HIT is covered,
+# every sunk ship lies on HIT cells only (which pins it down once only one
+# such placement is left) and every ship still afloat covers at least one
+# cell that is not a HIT.  Each ship's placements come from the placement
+# bitboards of fleet_placement.py, the generator behind generate_fleet_grid.
+#
+# Every sample is drawn uniformly from the consistent layouts, independently
+# of the others.  Drawing every ship independently and throwing away the
+# layouts that overlap or leave a HIT uncovered wastes almost every draw
+# once there are a few HITs, so the sampler only throws away the layouts
+# that overlap: it draws uniformly from the layouts that cover each HIT
+# once, whether their ships overlap elsewhere or not, and keeps the first
+# one with no overlap.
+#
+# Those layouts can be counted exactly.  The HITs are split into clusters
+# that no placement spans, and the placements of each cluster are drawn in
+# turn, weighted by the number of ways the remaining ships can cover the
+# clusters after it.  That number only depends on how many ships of each
+# kind (ships that share a list of placements) are left, and the ships
+# left over after the last cluster each take a placement that covers no
+# HIT.
+#
+# In a crowded endgame, where few layouts are left, almost every draw can
+# overlap.  After MAX_DRAW_ATTEMPTS draws in a row are thrown away, the
+# sampler lists the layouts instead, if there are at most
+# MAX_LISTED_LAYOUTS, and draws from the list from then on.  A sampler that
+# cannot count or list the layouts before its deadline raises
+# OverflowError, so that a layout too hard to find in time is told apart
+# from one that does not exist.
+#
+# The probability that a cell holds a ship is the fraction of samples that
+# cover it.  Samples are counted with the bit-sliced counters of
+# probability_density.py, and can be drawn by several worker processes.
+
+from multiprocessing import Pool
+import os
+import random
+import time
+from bisect import bisect_right
+from math import perm
+from operator import sub
+from random import randrange
+from fleet_placement import get_placements
+from bitboard_grid import full_mask
+from probability_density import Observation, add_to_counter, \
+                                get_densest_cells, choose_random_cell
+
+# The number of draws in a row thrown away for overlapping before the
+# sampler lists the layouts instead.
+MAX_DRAW_ATTEMPTS = 2000
+
+# The most different sets of covered cells the sampler lists layouts for.
+MAX_LISTED_LAYOUTS = 20000
+
+# The number of search nodes visited by list_layouts, and of counts made by
+# the sampler, between looks at the clock.
+NODES_PER_CHECK = 256
+
+# The default number of samples of estimate_shot_probabilities.
+DEFAULT_NUM_SAMPLES = 20000
+
+
+def get_ship_placements(observation: Observation) -> list[list[int]]:
+    """Return, for each ship of observation, the placement bitboards that a
+    consistent layout can give it: the sunk ships first and then the ships
+    afloat, each from largest to smallest.
+
+    >>> observation = Observation(3, 0b11, 0b100, (2,), (2,))
+    >>> legal = get_ship_placements(observation)
+    >>> [bin(mask) for mask in legal[0]], len(legal[1])
+    (['0b11'], 9)
+    """
+    grid_size = observation.grid_size
+    hits = observation.hits
+    misses = observation.misses
+    legal = []
+    for ship_size in sorted(observation.sunk_sizes, reverse=True):
+        legal.append([mask for mask in get_placements(grid_size, ship_size)
+                      if not mask & ~hits])
+    for ship_size in sorted(observation.afloat_sizes, reverse=True):
+        legal.append([mask for mask in get_placements(grid_size, ship_size)
+                      if not mask & misses and mask & ~hits])
+    return legal
+
+
+def share_equal_placements(legal: list[list[int]]) -> list[list[int]]:
+    """Modify legal, the lists of placements of get_ship_placements, so that
+    each list equal to the one before it is that same list object, and
+    return it.
+
+    >>> legal = share_equal_placements([[0b1, 0b10], [0b1, 0b10], [0b11]])
+    >>> legal[1] is legal[0], legal[2] is legal[1]
+    (True, False)
+    """
+    # list_layouts tells ships apart once when they share a list object.
+    for i in range(1, len(legal)):
+        if legal[i] == legal[i - 1]:
+            legal[i] = legal[i - 1]
+    return legal
+
+
+def list_layouts(legal: list[list[int]], hits: int, max_layouts: int,
+                 deadline: float) -> list[int]:
+    """Return the bitboards of the cells covered by every layout that takes
+    one placement from each list in legal, with no two overlapping, and
+    covers every cell of hits.  Ships whose lists are the same are told
+    apart only once (when they are the same list object), so each set of
+    covered cells is listed once.
+
+    Layouts of different ships that cover the same cells are each listed,
+    so that every layout keeps its weight, but only the different sets of
+    covered cells count towards max_layouts.  Return None if there are more
+    than max_layouts of those, or the clock (time.perf_counter) passes
+    deadline first.
+
+    >>> same = [0b1, 0b10]
+    >>> list_layouts([same, same], 0, 10, float('inf'))
+    [3]
+    >>> list_layouts([[0b1, 0b10, 0b100]], 0b100, 10, float('inf'))
+    [4]
+    >>> list_layouts([[0b1, 0b10], [0b10, 0b1]], 0, 1, float('inf'))
+    [3, 3]
+    """
+    remaining_sizes = [0] * (len(legal) + 1)
+    for depth in range(len(legal) - 1, -1, -1):
+        if legal[depth]:
+            remaining_sizes[depth] = remaining_sizes[depth + 1] \
+                                     + legal[depth][0].bit_count()
+    layouts = []
+    distinct = set()
+    nodes = 0
+
+    def search(depth: int, occupied: int, first: int) -> bool:
+        """List the layouts that extend the placements chosen for the ships
+        before depth, which cover occupied, trying only placements from
+        index first on for this ship.  Return False to stop the search."""
+        nonlocal nodes
+        nodes += 1
+        if nodes % NODES_PER_CHECK == 0 and time.perf_counter() > deadline:
+            return False
+        if depth == len(legal):
+            if occupied & hits == hits:
+                layouts.append(occupied)
+                distinct.add(occupied)
+            return len(distinct) <= max_layouts
+        if (hits & ~occupied).bit_count() > remaining_sizes[depth]:
+            return True
+        same_as_next = depth + 1 < len(legal) \
+            and legal[depth + 1] is legal[depth]
+        placements = legal[depth]
+        for i in range(first, len(placements)):
+            if not placements[i] & occupied:
+                if not search(depth + 1, occupied | placements[i],
+                              i + 1 if same_as_next else 0):
+                    return False
+        return True
+
+    if not search(0, 0, 0):
+        return None
+    return layouts
+
+
+class PosteriorSampler:
+    """A source of random fleet layouts, each drawn uniformly from those
+    consistent with an Observation (see probability_density.py).  Raise
+    ValueError if no layout is consistent, and OverflowError if the layouts
+    cannot be counted or listed before the deadline.
+
+    >>> observation = Observation(3, 0b10000, 0b101000101, (2,), ())
+    >>> sampler = PosteriorSampler(observation)
+    >>> layouts = {sampler.draw() for _ in range(200)}
+    >>> sorted(bin(layout) for layout in layouts)
+    ['0b10010', '0b10010000', '0b11000', '0b110000']
+
+    Each of the 115 layouts left in this game on a 10 by 10 grid, as listed
+    by list_layouts, is drawn about as often as the others:
+
+    >>> observation = Observation(10, 0x10043d01000000780000000,
+    ...                           0x1488888056a552898096524a4, (5, 4, 3, 2),
+    ...                           (3,))
+    >>> layouts = list_layouts(get_ship_placements(observation),
+    ...                        observation.hits, 1000, float('inf'))
+    >>> from collections import Counter
+    >>> random.seed(0)
+    >>> sampler = PosteriorSampler(observation)
+    >>> counts = Counter(sampler.draw() for _ in range(46000))
+    >>> expected = Counter(layouts)
+    >>> len(layouts), set(counts) == set(expected)
+    (115, True)
+    >>> all(abs(counts[layout] / 46000 - expected[layout] / 115) < 0.002
+    ...     for layout in expected)
+    True
+    """
+
+    def __init__(self, observation: Observation,
+                 deadline: float = float('inf'),
+                 legal: list[list[int]] = None) -> None:
+        """Initialize a sampler of the layouts consistent with observation
+        whose first layout is drawn before the clock (time.perf_counter)
+        passes deadline.  legal, if it is not None, holds the placements of
+        share_equal_placements(get_ship_placements(observation)), already
+        worked out by the caller."""
+        self.grid_size = observation.grid_size
+        self.hits = observation.hits
+        self._deadline = deadline
+        self._nodes = 0
+        if legal is None:
+            legal = share_equal_placements(get_ship_placements(observation))
+        self._legal = legal
+        # The ships that share a list of placements are of one kind.  Each
+        # kind's placements are grouped by the HITs they cover.
+        kinds = {}
+        self._groups = []
+        self._free = []
+        for placements in self._legal:
+            if id(placements) not in kinds:
+                kinds[id(placements)] = len(self._groups)
+                groups = {}
+                for placement in placements:
+                    self._check_clock()
+                    groups.setdefault(placement & self.hits,
+                                      []).append(placement)
+                self._free.append(groups.pop(0, []))
+                self._groups.append(groups)
+        self._num_ships = [0] * len(self._groups)
+        for placements in self._legal:
+            self._num_ships[kinds[id(placements)]] += 1
+        self._clusters = self._find_clusters()
+        self._covers = [self._find_covers(cluster)
+                        for cluster in self._clusters]
+        # The most ships of each kind that the clusters from each one on
+        # can take, since ships with no placement off the HITs (sunk ships)
+        # must all be taken by some cluster.
+        self._most_taken = [[0] * len(self._groups)]
+        for covers in reversed(self._covers):
+            self._most_taken.insert(0, [
+                most + max(taken[kind] for taken in covers)
+                if covers else most
+                for kind, most in enumerate(self._most_taken[0])])
+        self._choices = {}
+        self._layouts = None
+        if not self._count(0, tuple(self._num_ships)):
+            raise ValueError('no fleet layout is consistent with the '
+                             'observation')
+        # A first draw tells a layout too hard to find from one that does
+        # not exist.
+        self.draw()
+
+    def _check_clock(self) -> None:
+        """Count a step of the work done before sampling, and raise
+        OverflowError if the clock has passed the deadline."""
+        self._nodes += 1
+        if self._nodes % NODES_PER_CHECK == 0 \
+                and time.perf_counter() > self._deadline:
+            raise OverflowError('the layout count is over budget')
+
+    def _find_clusters(self) -> list[int]:
+        """Return the bitboards of the clusters of HITs: the most clusters
+        such that no placement covers HITs of two of them."""
+        clusters = []
+        hits = self.hits
+        while hits:
+            cluster = hits & -hits
+            grown = True
+            while grown:
+                grown = False
+                for groups in self._groups:
+                    for covered in groups:
+                        self._check_clock()
+                        if covered & cluster and covered & ~cluster:
+                            cluster |= covered
+                            grown = True
+            clusters.append(cluster)
+            hits &= ~cluster
+        return clusters
+
+    def _find_covers(self, cluster: int) -> dict:
+        """Return the ways that placements covering no HIT twice can cover
+        every HIT of cluster, by the number of ships of each kind they
+        take.  Each is a tuple of the number of ways to choose the
+        placements of all of them, a list of the running totals of those
+        numbers, and the (kind, covered HITs) of each placement of each
+        way."""
+        # The placements by the lowest HIT they cover, the one each step of
+        # the search covers next.
+        options = {}
+        for kind in range(len(self._groups)):
+            for covered, placements in self._groups[kind].items():
+                if covered & cluster:
+                    options.setdefault(covered & -covered, []).append(
+                        (kind, covered, len(placements)))
+        covers = {}
+        taken = [0] * len(self._groups)
+        chosen = []
+
+        def search(uncovered: int, ways: int) -> None:
+            """Add to covers every way to finish covering uncovered."""
+            self._check_clock()
+            if not uncovered:
+                total, cumulative, choices = covers.setdefault(
+                    tuple(taken), (0, [], []))
+                cumulative.append(total + ways)
+                choices.append(tuple(chosen))
+                covers[tuple(taken)] = (total + ways, cumulative, choices)
+                return
+            for kind, covered, count in options.get(uncovered & -uncovered,
+                                                    ()):
+                if not covered & ~uncovered \
+                        and taken[kind] < self._num_ships[kind]:
+                    taken[kind] += 1
+                    chosen.append((kind, covered))
+                    search(uncovered & ~covered, ways * count)
+                    chosen.pop()
+                    taken[kind] -= 1
+
+        search(cluster, 1)
+        return covers
+
+    def _count(self, cluster: int, ships_left: tuple) -> int:
+        """Return the number of ways to place the ships of ships_left, the
+        number of ships of each kind, so that the clusters from cluster on
+        have each HIT covered once, overlapping or not, with the other
+        ships covering no HIT."""
+        key = (cluster, ships_left)
+        if key in self._choices:
+            return self._choices[key][0]
+        self._check_clock()
+        if any(ships_left[kind] > self._most_taken[cluster][kind]
+               for kind in range(len(ships_left)) if not self._free[kind]):
+            self._choices[key] = (0, [], [])
+            return 0
+        if cluster == len(self._clusters):
+            total = 1
+            for kind in range(len(ships_left)):
+                total *= len(self._free[kind]) ** ships_left[kind]
+            self._choices[key] = (total, [], [])
+            return total
+        total = 0
+        cumulative = []
+        options = []
+        for taken, (ways, _, _) in self._covers[cluster].items():
+            rest = tuple(map(sub, ships_left, taken))
+            if min(rest) < 0:
+                continue
+            # Which ships of each kind take the cluster's placements
+            for kind in range(len(taken)):
+                if taken[kind]:
+                    ways *= perm(ships_left[kind], taken[kind])
+            ways *= self._count(cluster + 1, rest)
+            if ways:
+                total += ways
+                cumulative.append(total)
+                options.append((taken, rest))
+        self._choices[key] = (total, cumulative, options)
+        return total
+
+    def _try_draw(self) -> int:
+        """Draw a layout uniformly from those that cover each HIT once,
+        overlapping or not, and return the bitboard of its cells, or None
+        if it overlaps."""
+        occupied = 0
+        ships_left = tuple(self._num_ships)
+        for cluster in range(len(self._clusters)):
+            total, cumulative, options = self._choices[(cluster, ships_left)]
+            taken, ships_left = \
+                options[bisect_right(cumulative, randrange(total))]
+            total, cumulative, choices = self._covers[cluster][taken]
+            for kind, covered in \
+                    choices[bisect_right(cumulative, randrange(total))]:
+                placements = self._groups[kind][covered]
+                placement = placements[randrange(len(placements))]
+                if placement & occupied:
+                    return None
+                occupied |= placement
+        for kind in range(len(ships_left)):
+            placements = self._free[kind]
+            for _ in range(ships_left[kind]):
+                placement = placements[randrange(len(placements))]
+                if placement & occupied:
+                    return None
+                occupied |= placement
+        return occupied
+
+    def draw(self) -> int:
+        """Return the bitboard of the cells covered by a consistent layout
+        drawn uniformly at random.  Raise ValueError if there is none, and
+        OverflowError if MAX_DRAW_ATTEMPTS draws in a row overlap and the
+        layouts cannot be listed before the deadline."""
+        if self._layouts is not None:
+            return self._layouts[randrange(len(self._layouts))]
+        for _ in range(MAX_DRAW_ATTEMPTS):
+            layout = self._try_draw()
+            if layout is not None:
+                return layout
+        layouts = list_layouts(self._legal, self.hits, MAX_LISTED_LAYOUTS,
+                               self._deadline)
+        if layouts is None:
+            raise OverflowError('the consistent layouts are too rare to '
+                                'draw and too many to list')
+        if not layouts:
+            raise ValueError('no fleet layout is consistent with the '
+                             'observation')
+        self._layouts = layouts
+        return self.draw()
+
+    def add_samples(self, planes: list[int], num_samples: int) -> None:
+        """Add the cells of num_samples sampled layouts to the bit-sliced
+        counter planes."""
+        for _ in range(num_samples):
+            add_to_counter(planes, self.draw())
+
+
+def get_cell_counts(planes: list[int], grid_size: int) -> list[int]:
+    """Return the count of each cell number row * grid_size + col in the
+    bit-sliced counter planes.
+
+    >>> get_cell_counts([0b101, 0b110], 2)
+    [1, 2, 3, 0]
+    """
+    counts = []
+    for cell in range(grid_size * grid_size):
+        count = 0
+        for plane in range(len(planes)):
+            count |= ((planes[plane] >> cell) & 1) << plane
+        counts.append(count)
+    return counts
+
+
+def _sample_chunk(task: tuple) -> list[int]:
+    """Draw the samples described by task, a tuple of (seed, chunk number,
+    number of samples, observation), with a sampler of their own, and
+    return the count of each cell."""
+    seed, chunk, num_samples, observation = task
+    random.seed(f'{seed}-{chunk}')
+    planes = []
+    PosteriorSampler(observation).add_samples(planes, num_samples)
+    return get_cell_counts(planes, observation.grid_size)
+
+
+def _make_sample_tasks(observation: Observation, num_samples: int,
+                       processes: int, seed: int) -> list[tuple]:
+    """Return the tasks of _sample_chunk that draw num_samples samples for
+    observation with seed seed, split into one chunk per worker process of
+    a pool of processes processes (one per CPU if processes is None).
+
+    >>> observation = Observation(3, 0b10000, 0b101000101, (2,), ())
+    >>> [task[2] for task in _make_sample_tasks(observation, 10, 4, 0)]
+    [3, 3, 3, 1]
+    >>> len(_make_sample_tasks(observation, 10, 1, 0))
+    1
+    >>> len(_make_sample_tasks(observation, 1000, None, 0)) \\
+    ...     == min(os.cpu_count() or 1, 1000)
+    True
+    """
+    chunk_size = max(1, -(-num_samples
+                          // (processes or os.cpu_count() or 1)))
+    tasks = []
+    for chunk, start in enumerate(range(0, num_samples, chunk_size)):
+        tasks.append((seed, chunk, min(chunk_size, num_samples - start),
+                      observation))
+    return tasks
+
+
+def estimate_shot_probabilities(observation: Observation,
+                                num_samples: int = DEFAULT_NUM_SAMPLES,
+                                processes: int = 1,
+                                seed: int = 0) -> list[list[float]]:
+    """Return, for each cell of the grid of observation, the fraction of
+    num_samples sampled consistent layouts that cover it.  The samples are
+    drawn by a pool of processes worker processes (one per CPU if processes
+    is None, and none at all if processes is 1), each with its own
+    sampler.
+    Raise ValueError if no layout is consistent with observation, and
+    OverflowError if the layouts are too rare to draw and too many to list
+    (see PosteriorSampler).
+
+    >>> observation = Observation(3, 0b10000, 0b101000101, (2,), ())
+    >>> probabilities = estimate_shot_probabilities(observation, 4000)
+    >>> probabilities[1][1]
+    1.0
+    >>> abs(probabilities[0][1] - 0.25) < 0.05, probabilities[0][0]
+    (True, 0.0)
+    """
+    grid_size = observation.grid_size
+    tasks = _make_sample_tasks(observation, num_samples, processes, seed)
+    counts = [0] * (grid_size * grid_size)
+    if processes == 1:
+        chunk_counts = map(_sample_chunk, tasks)
+    else:
+        with Pool(processes) as pool:
+            chunk_counts = pool.map(_sample_chunk, tasks)
+    for chunk_count in chunk_counts:
+        for cell in range(len(counts)):
+            counts[cell] += chunk_count[cell]
+    return [[counts[row * grid_size + col] / max(num_samples, 1)
+             for col in range(grid_size)] for row in range(grid_size)]
+
+
+def make_posterior_guess(observation: Observation,
+                         num_samples: int = DEFAULT_NUM_SAMPLES) -> list[int]:
+    """Return the [row, col] of a random UNKNOWN cell of observation among
+    those covered by the most of num_samples sampled consistent layouts.
+    Raise ValueError if no layout is consistent with observation, and
+    OverflowError if the layouts are too rare to draw and too many to list
+    (see PosteriorSampler).
+
+    >>> observation = Observation(3, 0b10000, 0b101000101, (2,), ())
+    >>> make_posterior_guess(observation, 100) in [[0, 1], [1, 0], [1, 2],
+    ...                                            [2, 1]]
+    True
+    """
+    grid_size = observation.grid_size
+    unknown = full_mask(grid_size) & ~(observation.hits | observation.misses)
+    planes = []
+    PosteriorSampler(observation).add_samples(planes, num_samples)
+    best = get_densest_cells(planes, unknown) or unknown
+    return choose_random_cell(best, grid_size)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,296 @@
+# The file contains the probability-density targeting strategy for the
+# computer player.
+#
+# For every cell, the strategy counts how many legal placements of each ship
+# that is still afloat cover the cell, and shoots the densest UNKNOWN cell.
+# While some HIT cell is known, only placements through a HIT are counted, so
+# the computer finishes off a ship once it has found one.
+#
+# The counting works on whole-board bitboards (see bitboard_grid.py): the
+# legal start cells of a ship are found with a few shifts and ANDs, and the
+# per-cell counts are kept as bit-sliced counters, where plane i holds bit i
+# of the count of every cell at once.  A 10 by 10 decision is a few hundred
+# integer operations.
+
+from functools import lru_cache
+from random import randint
+from typing import NamedTuple
+from battleship_game_functions import UNKNOWN, HIT, MISS
+from bitboard_grid import BitboardTargetGrid, full_mask, iter_cells
+
+
+@lru_cache(maxsize=None)
+def get_start_masks(grid_size: int, ship_size: int) -> tuple[int, int]:
+    """Return the bitboards of the cells in which a horizontal and a vertical
+    ship of size ship_size can start without leaving a grid_size by grid_size
+    grid.
+
+    >>> [bin(mask) for mask in get_start_masks(3, 2)]
+    ['0b11011011', '0b111111']
+    """
+    if ship_size > grid_size:
+        return 0, 0
+    row_starts = (1 << (grid_size - ship_size + 1)) - 1
+    across = 0
+    for row in range(grid_size):
+        across |= row_starts << (row * grid_size)
+    down = (1 << ((grid_size - ship_size + 1) * grid_size)) - 1
+    return across, down
+
+
+def get_target_masks(target_grid: list[list[str]]) -> tuple[int, int]:
+    """Return the bitboards of the HIT cells and of the MISS cells in
+    target_grid.
+
+    >>> get_target_masks([[HIT, UNKNOWN], [UNKNOWN, MISS]])
+    (1, 8)
+    """
+    if isinstance(target_grid, BitboardTargetGrid):
+        return target_grid.hits, target_grid.misses
+    grid_size = len(target_grid)
+    hits = 0
+    misses = 0
+    for row in range(grid_size):
+        for col in range(grid_size):
+            symbol = target_grid[row][col]
+            if symbol == HIT:
+                hits |= 1 << (row * grid_size + col)
+            elif symbol == MISS:
+                misses |= 1 << (row * grid_size + col)
+    return hits, misses
+
+
+class Observation(NamedTuple):
+    """What a player knows about the fleet they are shooting at: the grid
+    size, the bitboards of their HIT and MISS cells, the sizes of the ships
+    still afloat and the sizes of the ships they have sunk."""
+    grid_size: int
+    hits: int
+    misses: int
+    afloat_sizes: tuple[int, ...]
+    sunk_sizes: tuple[int, ...]
+
+
+def get_observation(target_grid: list[list[str]], afloat_sizes: list[int],
+                    sunk_sizes: list[int] = ()) -> Observation:
+    """Return the Observation of target_grid when the ships in afloat_sizes
+    are afloat and those in sunk_sizes are sunk.
+
+    >>> get_observation([[HIT, UNKNOWN], [UNKNOWN, MISS]], [2], [1])
+    Observation(grid_size=2, hits=1, misses=8, afloat_sizes=(2,), sunk_sizes=(1,))
+    """
+    hits, misses = get_target_masks(target_grid)
+    return Observation(len(target_grid), hits, misses, tuple(afloat_sizes),
+                       tuple(sunk_sizes))
+
+
+def add_to_counter(planes: list[int], mask: int) -> None:
+    """Add one to the bit-sliced counter planes in every cell set in mask.
+
+    >>> planes = []
+    >>> add_to_counter(planes, 0b11)
+    >>> add_to_counter(planes, 0b10)
+    >>> planes
+    [1, 2]
+    """
+    carry = mask
+    plane = 0
+    while carry:
+        if plane == len(planes):
+            planes.append(carry)
+            return
+        planes[plane], carry = planes[plane] ^ carry, planes[plane] & carry
+        plane += 1
+
+
+def get_densest_cells(planes: list[int], candidates: int) -> int:
+    """Return the bitboard of the cells in candidates with the largest count
+    in the bit-sliced counter planes, or 0 if every candidate has count 0.
+
+    >>> bin(get_densest_cells([0b101, 0b110], 0b111))
+    '0b100'
+    """
+    any_count = 0
+    for plane in planes:
+        any_count |= plane
+    candidates &= any_count
+    for plane in reversed(planes):
+        if candidates & plane:
+            candidates &= plane
+    return candidates
+
+
+def count_placements(grid_size: int, hits: int, misses: int,
+                     ship_sizes: list[int]) -> tuple[list[int], list[int]]:
+    """Return the bit-sliced placement counts of every cell for the ships in
+    ship_sizes, given the HIT cells hits and the MISS cells misses.
+
+    The first counter covers every legal placement, the second only the legal
+    placements that cover at least one HIT cell.
+
+    >>> hunt, target = count_placements(2, 0, 0b1000, [2])
+    >>> bin(hunt[0]), bin(hunt[1]), target
+    ('0b110', '0b1', [])
+    """
+    open_cells = full_mask(grid_size) & ~misses
+    hunt_planes = []
+    target_planes = []
+    for ship_size in ship_sizes:
+        across, down = get_start_masks(grid_size, ship_size)
+        for step, starts in ((1, across), (grid_size, down)):
+            through_hit = hits
+            for offset in range(1, ship_size):
+                starts &= open_cells >> (offset * step)
+                through_hit |= hits >> (offset * step)
+            starts &= open_cells
+            target_starts = starts & through_hit
+            for offset in range(ship_size):
+                add_to_counter(hunt_planes, starts << (offset * step))
+                if target_starts:
+                    add_to_counter(target_planes,
+                                   target_starts << (offset * step))
+    return hunt_planes, target_planes
+
+
+def get_density_map(target_grid: list[list[str]],
+                    ship_sizes: list[int]) -> list[list[int]]:
+    """Return, for every cell of target_grid, the number of legal placements
+    of the ships in ship_sizes that cover it.
+
+    >>> get_density_map([[UNKNOWN, UNKNOWN], [UNKNOWN, MISS]], [2])
+    [[2, 1], [1, 0]]
+    """
+    grid_size = len(target_grid)
+    hits, misses = get_target_masks(target_grid)
+    planes = count_placements(grid_size, hits, misses, ship_sizes)[0]
+    density = []
+    for row in range(grid_size):
+        density_row = []
+        for col in range(grid_size):
+            index = row * grid_size + col
+            count = 0
+            for plane in range(len(planes)):
+                count |= ((planes[plane] >> index) & 1) << plane
+            density_row.append(count)
+        density.append(density_row)
+    return density
+
+
+def choose_random_cell(mask: int, grid_size: int) -> list[int]:
+    """Return the row and column of a cell chosen uniformly at random from
+    the non-zero bitboard mask.
+
+    >>> choose_random_cell(0b100, 2)
+    [1, 0]
+    """
+    skip = randint(0, mask.bit_count() - 1)
+    for row, col in iter_cells(mask, grid_size):
+        if skip == 0:
+            return [row, col]
+        skip -= 1
+    return []
+
+
+def get_guess_cells(target_grid: list[list[str]],
+                    ship_sizes: list[int]) -> int:
+    """Return the bitboard of the UNKNOWN cells of target_grid that the most
+    legal placements of the still-afloat ships in ship_sizes cover: those
+    that make_density_guess chooses from.
+
+    Preconditions:
+        - UNKNOWN appears in target_grid
+
+    >>> bin(get_guess_cells([[HIT, UNKNOWN], [UNKNOWN, UNKNOWN]], [2]))
+    '0b110'
+    """
+    return get_observation_guess_cells(get_observation(target_grid,
+                                                       ship_sizes))
+
+
+def get_live_hits(observation: Observation) -> int:
+    """Return the bitboard of the HIT cells of observation that may belong to
+    a ship afloat: those that no sunk ship can cover while lying on HIT cells
+    only.  If that leaves none, but the sunk ships are too few to account
+    for every HIT cell, return all of them.
+
+    >>> bin(get_live_hits(Observation(3, 0b100000011, 0, (2,), (2,))))
+    '0b100000000'
+    >>> bin(get_live_hits(Observation(3, 0b111, 0, (2,), (2,))))
+    '0b111'
+    """
+    grid_size = observation.grid_size
+    hits = observation.hits
+    sunk_cover = 0
+    for ship_size in observation.sunk_sizes:
+        across, down = get_start_masks(grid_size, ship_size)
+        for step, starts in ((1, across), (grid_size, down)):
+            for offset in range(ship_size):
+                starts &= hits >> (offset * step)
+            for offset in range(ship_size):
+                sunk_cover |= starts << (offset * step)
+    live_hits = hits & ~sunk_cover
+    if not live_hits and hits.bit_count() > sum(observation.sunk_sizes):
+        return hits
+    return live_hits
+
+
+def get_observation_guess_cells(observation: Observation) -> int:
+    """Return the bitboard of the UNKNOWN cells of observation that the most
+    legal placements of its ships afloat cover, as get_guess_cells does for
+    a target grid.  Only placements through HIT cells that may belong to a
+    ship afloat (see get_live_hits) count as targets, and the other HIT
+    cells are left to the sunk ships.
+
+    >>> bin(get_observation_guess_cells(Observation(2, 0b1, 0, (2,), ())))
+    '0b110'
+    >>> bin(get_observation_guess_cells(Observation(3, 0b11, 0, (2,), (2,))))
+    '0b10110000'
+    """
+    grid_size = observation.grid_size
+    hits = observation.hits
+    misses = observation.misses
+    unknown = full_mask(grid_size) & ~(hits | misses)
+    live_hits = get_live_hits(observation)
+    hunt_planes, target_planes = count_placements(
+        grid_size, live_hits, misses | (hits & ~live_hits),
+        list(observation.afloat_sizes))
+    best = get_densest_cells(target_planes, unknown)
+    if not best:
+        best = get_densest_cells(hunt_planes, unknown)
+    if not best:
+        best = unknown
+    return best
+
+
+def make_density_guess(target_grid: list[list[str]],
+                       ship_sizes: list[int]) -> list[int]:
+    """Return row and column indexes for the UNKNOWN cell of target_grid that
+    the most legal placements of the still-afloat ships in ship_sizes cover.
+    Ties are broken at random.
+
+    If target_grid keeps a density_index (see incremental_density.py), the
+    densities are read from it instead of being counted from scratch.
+
+    Preconditions:
+        - UNKNOWN appears in target_grid
+
+    >>> make_density_guess([[UNKNOWN, MISS, UNKNOWN],
+    ...                     [MISS, UNKNOWN, MISS],
+    ...                     [UNKNOWN, UNKNOWN, UNKNOWN]], [2])
+    [2, 1]
+    >>> make_density_guess([[HIT, UNKNOWN, UNKNOWN],
+    ...                     [MISS, UNKNOWN, UNKNOWN],
+    ...                     [UNKNOWN, UNKNOWN, UNKNOWN]], [2])
+    [0, 1]
+    """
+    density_index = getattr(target_grid, 'density_index', None)
+    if density_index is not None:
+        density_index.set_ship_sizes(ship_sizes)
+        return density_index.make_guess()
+    return choose_random_cell(get_guess_cells(target_grid, ship_sizes),
+                              len(target_grid))
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,348 @@
+# The file contains a writer and a reader for replay files, a compact binary
+# format that stores many recorded games in one file.
+#
+# A replay file is a file header, the games one after another, an index of
+# the offset of every game and a footer:
+#
+#     file header  FILE_HEADER: magic, version
+#     game         GAME_HEADER: grid size, cell width, number of players,
+#                               number of ships, number of shots, RNG seed
+#                  the ship sizes, 4 bytes each
+#                  the fleet layout of each player, one code per ship
+#                  the shots, one cell per shot
+#     ...
+#     index        the offset of each game, 8 bytes each
+#     footer       FOOTER: offset of the index, number of games, magic
+#
+# A cell is stored as the index row * grid_size + col, and a ship as the
+# code 2 * (index of its top-left cell) + (1 if it is vertical else 0).
+# Both use cell width bytes: 2 for grids of up to 181 by 181, so a shot
+# costs 2 bytes instead of a whole text grid per move.  Shot results are
+# not stored since they follow from the fleet layouts.  Players take turns
+# starting with player 0, and player p shoots at the fleet of player
+# (p + 1) % number of players, so a one-player game shoots at its own fleet.
+#
+# The reader memory-maps the file and uses the index to decode only the game
+# that is asked for.  All numbers are little-endian.
+
+import mmap
+import struct
+from typing import BinaryIO, NamedTuple
+from battleship_game_functions import UNKNOWN, EMPTY, get_ship_symbols
+from fleet_validation import iter_ship_cells
+from move_journal import MoveJournal
+
+REPLAY_MAGIC = b'BSRP'
+REPLAY_VERSION = 1
+
+FILE_HEADER = struct.Struct('<4sH')
+GAME_HEADER = struct.Struct('<IBBHIQ')
+FOOTER = struct.Struct('<QQ4s')
+
+# The struct format of a cell for each cell width.
+CELL_FORMATS = {2: 'H', 4: 'I', 8: 'Q'}
+
+
+class ReplayGame(NamedTuple):
+    """A recorded game: its grid size, ship sizes and RNG seed, the fleet
+    layout of each player (see get_fleet_layout) and the cells shot at, in
+    order."""
+    grid_size: int
+    ship_sizes: list[int]
+    seed: int
+    fleets: list[list[int]]
+    shots: list[int]
+
+
+def get_cell_width(grid_size: int) -> int:
+    """Return the number of bytes used to store a cell or a ship of a
+    grid_size by grid_size grid.
+
+    >>> get_cell_width(10), get_cell_width(181), get_cell_width(182)
+    (2, 2, 4)
+    """
+    for cell_width in sorted(CELL_FORMATS):
+        if 2 * grid_size * grid_size <= 256 ** cell_width:
+            return cell_width
+    raise ValueError(f'a {grid_size} by {grid_size} grid is too large')
+
+
+def get_fleet_layout(fleet_grid: list[list[str]],
+                     ship_symbols: list[str]) -> list[int]:
+    """Return the code of the ship of each symbol in ship_symbols in
+    fleet_grid: 2 * (index of its top-left cell) + (1 if it is vertical else
+    0).  Hit (upper-case) ship cells count as part of their ship.
+
+    >>> get_fleet_layout([['a', 'b'], ['a', 'B']], ['a', 'b'])
+    [1, 3]
+    """
+    grid_size = len(fleet_grid)
+    index_of = {}
+    for i in range(len(ship_symbols)):
+        index_of[ship_symbols[i]] = i
+        index_of.setdefault(ship_symbols[i].upper(), i)
+    first_cells = [-1] * len(ship_symbols)
+    last_cells = [-1] * len(ship_symbols)
+    for row, col, symbol in iter_ship_cells(fleet_grid):
+        i = index_of[symbol]
+        cell = row * grid_size + col
+        if first_cells[i] == -1 or cell < first_cells[i]:
+            first_cells[i] = cell
+        last_cells[i] = max(last_cells[i], cell)
+    return [2 * first_cells[i]
+            + (1 if last_cells[i] - first_cells[i] >= grid_size else 0)
+            for i in range(len(ship_symbols))]
+
+
+def fill_fleet_layout(fleet_grid: list[list[str]], ship_symbols: list[str],
+                      ship_sizes: list[int], layout: list[int]) -> None:
+    """Modify fleet_grid by placing each ship in ship_symbols, with the size
+    in ship_sizes, where its code in layout says.
+
+    >>> grid = [[EMPTY, EMPTY], [EMPTY, EMPTY]]
+    >>> fill_fleet_layout(grid, ['a', 'b'], [2, 1], [1, 6])
+    >>> grid
+    [['a', '.'], ['a', 'b']]
+    """
+    grid_size = len(fleet_grid)
+    for ship_symbol, ship_size, code in zip(ship_symbols, ship_sizes, layout):
+        row, col = divmod(code // 2, grid_size)
+        for i in range(ship_size):
+            if code % 2 == 1:
+                fleet_grid[row + i][col] = ship_symbol
+            else:
+                fleet_grid[row][col + i] = ship_symbol
+
+
+def pack_game(grid_size: int, ship_sizes: list[int],
+              fleets: list[list[int]], shots: list[int],
+              seed: int = 0) -> bytes:
+    """Return the encoding of a game on a grid_size by grid_size grid with
+    the ships in ship_sizes, the fleet layout of each player in fleets (see
+    get_fleet_layout), the cells shot at in shots and the RNG seed.
+
+    >>> len(pack_game(10, [5, 4], [[0, 20], [1, 3]], [0, 1, 2]))
+    42
+    """
+    cell_width = get_cell_width(grid_size)
+    cell_format = CELL_FORMATS[cell_width]
+    codes = [code for fleet in fleets for code in fleet]
+    return GAME_HEADER.pack(grid_size, cell_width, len(fleets),
+                            len(ship_sizes), len(shots), seed) \
+        + struct.pack(f'<{len(ship_sizes)}I', *ship_sizes) \
+        + struct.pack(f'<{len(codes)}{cell_format}', *codes) \
+        + struct.pack(f'<{len(shots)}{cell_format}', *shots)
+
+
+def unpack_game(buffer, offset: int = 0,
+                max_shots: int = None) -> ReplayGame:
+    """Return the game encoded by pack_game at offset in buffer, with only
+    its first max_shots shots, or all of them if max_shots is None.
+
+    >>> unpack_game(pack_game(3, [2], [[1]], [0, 4, 3], seed=5), max_shots=2)
+    ReplayGame(grid_size=3, ship_sizes=[2], seed=5, fleets=[[1]], shots=[0, 4])
+    """
+    grid_size, cell_width, num_players, num_ships, num_shots, seed = \
+        GAME_HEADER.unpack_from(buffer, offset)
+    cell_format = CELL_FORMATS[cell_width]
+    offset += GAME_HEADER.size
+    ship_sizes = list(struct.unpack_from(f'<{num_ships}I', buffer, offset))
+    offset += 4 * num_ships
+    codes = struct.unpack_from(f'<{num_players * num_ships}{cell_format}',
+                               buffer, offset)
+    fleets = [list(codes[i * num_ships:(i + 1) * num_ships])
+              for i in range(num_players)]
+    offset += cell_width * len(codes)
+    if max_shots is not None:
+        num_shots = min(num_shots, max_shots)
+    shots = list(struct.unpack_from(f'<{num_shots}{cell_format}', buffer,
+                                    offset))
+    return ReplayGame(grid_size, ship_sizes, seed, fleets, shots)
+
+
+def replay_journals(game: ReplayGame) -> list[MoveJournal]:
+    """Return a MoveJournal for each player of game after all of its shots:
+    journal p holds the target grid of player p and the fleet grid that
+    player p shoots at.  Ship symbols are made by get_ship_symbols."""
+    ship_symbols = get_ship_symbols(game.ship_sizes)
+    fleet_grids = []
+    for layout in game.fleets:
+        fleet_grid = [[EMPTY] * game.grid_size for _ in range(game.grid_size)]
+        fill_fleet_layout(fleet_grid, ship_symbols, game.ship_sizes, layout)
+        fleet_grids.append(fleet_grid)
+    num_players = len(fleet_grids)
+    journals = []
+    for player in range(num_players):
+        target_grid = [[UNKNOWN] * game.grid_size
+                       for _ in range(game.grid_size)]
+        journals.append(MoveJournal(
+            fleet_grids[(player + 1) % num_players], target_grid,
+            ship_symbols, game.ship_sizes, [0] * len(game.ship_sizes)))
+    for i in range(len(game.shots)):
+        row, col = divmod(game.shots[i], game.grid_size)
+        journals[i % num_players].shoot(row, col)
+    return journals
+
+
+class ReplayWriter:
+    """A writer of games to a replay file opened for binary writing.
+
+    The index and footer are written by close, which must be called once all
+    games have been written.
+    """
+
+    def __init__(self, replay_file: BinaryIO) -> None:
+        """Initialize a writer to replay_file and write the file header."""
+        self.replay_file = replay_file
+        self.offsets = []
+        self._offset = replay_file.write(FILE_HEADER.pack(REPLAY_MAGIC,
+                                                          REPLAY_VERSION))
+
+    def write_game(self, grid_size: int, ship_sizes: list[int],
+                   fleets: list[list[int]], shots: list[int],
+                   seed: int = 0) -> None:
+        """Write a game on a grid_size by grid_size grid with the ships in
+        ship_sizes, the fleet layout of each player in fleets (see
+        get_fleet_layout), the cells shot at in shots and the RNG seed."""
+        self.write_packed(pack_game(grid_size, ship_sizes, fleets, shots,
+                                    seed))
+
+    def write_packed(self, data: bytes) -> None:
+        """Write a game already encoded by pack_game as data."""
+        self.offsets.append(self._offset)
+        self._offset += self.replay_file.write(data)
+
+    def close(self) -> None:
+        """Write the index and the footer.  The file is not closed."""
+        self.replay_file.write(struct.pack(f'<{len(self.offsets)}Q',
+                                           *self.offsets))
+        self.replay_file.write(FOOTER.pack(self._offset, len(self.offsets),
+                                           REPLAY_MAGIC))
+
+    def __enter__(self) -> 'ReplayWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class ReplayReader:
+    """A reader of a replay file, which is memory-mapped so that any game
+    can be read without reading the games before it.
+
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'games.replay')
+    >>> with open(path, 'wb') as replay_file:
+    ...     with ReplayWriter(replay_file) as writer:
+    ...         writer.write_game(2, [2], [[1], [0]], [0, 1, 2, 0], seed=7)
+    ...         writer.write_game(3, [1], [[8]], [4, 0])
+    >>> with ReplayReader(path) as reader:
+    ...     game = reader[0]
+    ...     journals = reader.grids_at(0, 3)
+    ...     len(reader), reader[1].shots
+    (2, [4, 0])
+    >>> game.seed, game.fleets, game.shots
+    (7, [[1], [0]], [0, 1, 2, 0])
+    >>> journals[0].target_grid, journals[0].fleet_grid
+    ([['X', '-'], ['M', '-']], [['A', 'a'], ['.', '.']])
+    >>> journals[1].target_grid, journals[1].num_moves()
+    ([['-', 'M'], ['-', '-']], 1)
+    """
+
+    def __init__(self, filename: str) -> None:
+        """Initialize a reader of the replay file filename."""
+        with open(filename, 'rb') as replay_file:
+            self._map = mmap.mmap(replay_file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        magic, version = FILE_HEADER.unpack_from(self._map, 0)
+        index_offset, num_games, end_magic = FOOTER.unpack_from(
+            self._map, len(self._map) - FOOTER.size)
+        if magic != REPLAY_MAGIC or end_magic != REPLAY_MAGIC:
+            raise ValueError(f'{filename} is not a replay file')
+        if version != REPLAY_VERSION:
+            raise ValueError(f'{filename} has unsupported version {version}')
+        self._index_offset = index_offset
+        self._num_games = num_games
+
+    def __len__(self) -> int:
+        """Return the number of games in the file."""
+        return self._num_games
+
+    def __getitem__(self, game_number: int) -> ReplayGame:
+        """Return game number game_number of the file."""
+        return self._read_game(game_number, None)
+
+    def grids_at(self, game_number: int, move: int) -> list[MoveJournal]:
+        """Return a MoveJournal for each player of game number game_number
+        after its first move shots: journal p holds the target grid of
+        player p and the fleet grid that player p shoots at.  Only those
+        shots are decoded and replayed."""
+        return replay_journals(self._read_game(game_number, move))
+
+    def packed_game(self, game_number: int) -> bytes:
+        """Return the encoding of game number game_number, as written by
+        pack_game, without decoding it."""
+        offset = self._game_offset(game_number)
+        if game_number + 1 < self._num_games:
+            end = self._game_offset(game_number + 1)
+        else:
+            end = self._index_offset
+        return self._map[offset:end]
+
+    def _game_offset(self, game_number: int) -> int:
+        """Return the offset of game number game_number in the file."""
+        if not 0 <= game_number < self._num_games:
+            raise IndexError(f'there is no game {game_number}')
+        offset, = struct.unpack_from('<Q', self._map,
+                                     self._index_offset + 8 * game_number)
+        return offset
+
+    def _read_game(self, game_number: int, max_shots: int) -> ReplayGame:
+        """Return game number game_number with only its first max_shots
+        shots, or all of them if max_shots is None."""
+        return unpack_game(self._map, self._game_offset(game_number),
+                           max_shots)
+
+    def close(self) -> None:
+        """Close the memory map of the file."""
+        self._map.close()
+
+    def __enter__(self) -> 'ReplayReader':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def merge_replay_files(filenames: list[str], replay_file: BinaryIO) -> int:
+    """Write the games of the replay files filenames, in order, to
+    replay_file, opened for binary writing, as one replay file, and return
+    the number of games written.  The games are copied without being
+    decoded.
+
+    >>> import os, tempfile
+    >>> folder = tempfile.mkdtemp()
+    >>> paths = [os.path.join(folder, f'part{i}.replay') for i in range(2)]
+    >>> for i in range(2):
+    ...     with open(paths[i], 'wb') as part_file:
+    ...         with ReplayWriter(part_file) as writer:
+    ...             writer.write_game(3, [1], [[i]], [i, 4], seed=i)
+    >>> path = os.path.join(folder, 'games.replay')
+    >>> with open(path, 'wb') as replay_file:
+    ...     merge_replay_files(paths, replay_file)
+    2
+    >>> with ReplayReader(path) as reader:
+    ...     [reader[i].shots for i in range(len(reader))]
+    [[0, 4], [1, 4]]
+    """
+    with ReplayWriter(replay_file) as writer:
+        for filename in filenames:
+            with ReplayReader(filename) as reader:
+                for game_number in range(len(reader)):
+                    writer.write_packed(reader.packed_game(game_number))
+    return len(writer.offsets)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,140 @@
+# The file contains a run-length index over a fleet grid.
+#
+# For every ship cell the index stores how many cells with the same symbol
+# follow it to the right (its run across, counting itself) and downwards
+# (its run down), and for every symbol the set of cells that hold it.  "Is
+# there a ship of symbol s and size L starting at (r, c)" and "where does
+# ship s start" are then lookups instead of walks over the grid.
+#
+# When a cell changes, only the runs of the cells to its left and above it
+# that ran into it are recomputed, so updates cost at most one ship length.
+# EMPTY cells have runs of 0, so long stretches of water are never walked.
+
+from battleship_game_functions import EMPTY
+from grid_engine import ObservedGrid
+
+
+class RunLengthIndex:
+    """The runs across and down of every cell of a fleet grid.
+
+    A RunLengthIndex is an observer for an ObservedGrid (see grid_engine.py),
+    so it can follow a fleet grid as ships are placed and hit.
+
+    >>> grid = [[EMPTY, 'b', EMPTY], ['a', 'b', EMPTY], [EMPTY, EMPTY, 'c']]
+    >>> index = RunLengthIndex(grid)
+    >>> index.run_down(0, 1), index.run_across(0, 1)
+    (2, 1)
+    >>> index.has_ship(0, 1, 'b', 2), index.has_ship(0, 1, 'b', 1)
+    (True, False)
+    >>> index.ship_start('b'), index.ship_start('z')
+    ([0, 1], [])
+    >>> index.set_cell(2, 0, 'a')
+    >>> index.has_ship(1, 0, 'a', 1), index.run_down(1, 0)
+    (False, 2)
+    """
+
+    def __init__(self, fleet_grid: list[list[str]]) -> None:
+        """Initialize the index of fleet_grid."""
+        grid_size = len(fleet_grid)
+        self.grid_size = grid_size
+        self._symbols = [EMPTY] * (grid_size * grid_size)
+        self._across = [0] * (grid_size * grid_size)
+        self._down = [0] * (grid_size * grid_size)
+        self._cells_of = {}
+        for row in range(grid_size):
+            for col in range(grid_size):
+                if fleet_grid[row][col] != EMPTY:
+                    self.set_cell(row, col, fleet_grid[row][col])
+
+    def run_across(self, row: int, col: int) -> int:
+        """Return the number of cells from (row, col) to the right that hold
+        the same ship symbol as (row, col), or 0 if (row, col) is EMPTY."""
+        return self._across[row * self.grid_size + col]
+
+    def run_down(self, row: int, col: int) -> int:
+        """Return the number of cells from (row, col) downwards that hold the
+        same ship symbol as (row, col), or 0 if (row, col) is EMPTY."""
+        return self._down[row * self.grid_size + col]
+
+    def has_ship(self, row_start: int, col_start: int, ship_symbol: str,
+                 ship_size: int) -> bool:
+        """Return the same result as has_ship(fleet_grid, row_start,
+        col_start, ship_symbol, ship_size) for the indexed fleet_grid."""
+        cell = row_start * self.grid_size + col_start
+        if self._symbols[cell] != ship_symbol:
+            return False
+        across = self._across[cell]
+        down = self._down[cell]
+        return (across == ship_size and down == 1) \
+               or (down == ship_size and across == 1)
+
+    def ship_start(self, ship_symbol: str) -> list[int]:
+        """Return the row and column of the top-most/left-most cell holding
+        ship_symbol, or an empty list if no cell holds it."""
+        cells = self._cells_of.get(ship_symbol)
+        if not cells:
+            return []
+        return list(divmod(min(cells), self.grid_size))
+
+    def set_cell(self, row: int, col: int, value: str) -> None:
+        """Update the index for the cell at (row, col) now holding value."""
+        grid_size = self.grid_size
+        cell = row * grid_size + col
+        old_value = self._symbols[cell]
+        if old_value == value:
+            return
+        if old_value != EMPTY:
+            self._cells_of[old_value].discard(cell)
+        if value != EMPTY:
+            self._cells_of.setdefault(value, set()).add(cell)
+        self._symbols[cell] = value
+        self._update_runs(self._across, row * grid_size, col, 1)
+        self._update_runs(self._down, col, row, grid_size)
+
+    def cell_changed(self, row: int, col: int, old_value: str,
+                     new_value: str) -> None:
+        """Update the index after the cell at (row, col) changed from
+        old_value to new_value."""
+        self.set_cell(row, col, new_value)
+
+    def _update_runs(self, runs: list[int], line_start: int, position: int,
+                     step: int) -> None:
+        """Recompute runs for the cell at position along the line of cells
+        line_start, line_start + step, ..., and for the cells before it whose
+        runs it ends."""
+        symbols = self._symbols
+        for current in range(position, -1, -1):
+            cell = line_start + current * step
+            symbol = symbols[cell]
+            if symbol == EMPTY:
+                run = 0
+            elif current + 1 < self.grid_size \
+                 and symbols[cell + step] == symbol:
+                run = runs[cell + step] + 1
+            else:
+                run = 1
+            if current < position and runs[cell] == run:
+                return
+            runs[cell] = run
+
+
+class IndexedFleetGrid(ObservedGrid):
+    """A fleet grid whose run-length index, run_index, is kept up to date as
+    the grid changes.
+
+    >>> from battleship_game_functions import has_ship, place_ship
+    >>> fleet = IndexedFleetGrid([[EMPTY] * 3 for _ in range(3)])
+    >>> place_ship(0, 2, 2, 2, fleet, 'a')
+    >>> fleet.run_index.ship_start('a'), has_ship(fleet, 0, 2, 'a', 3)
+    ([0, 2], True)
+    """
+
+    def __init__(self, fleet_grid: list[list[str]]) -> None:
+        """Initialize an indexed view of fleet_grid."""
+        self.run_index = RunLengthIndex(fleet_grid)
+        super().__init__(fleet_grid, [self.run_index])
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
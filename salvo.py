@@ -0,0 +1,197 @@
+# The file contains the salvo variant of the game, in which each turn a
+# player fires one shot for every ship of their own that is still afloat,
+# and a batch resolver that resolves a whole salvo in one call.
+#
+# The resolver works on bitboard grids (see bitboard_grid.py).  The shots of
+# a salvo are ORed into one bitboard, a single AND with the fleet's occupancy
+# bitboard splits it into hits and misses, and the target grid and the
+# fleet's hit bitboard are updated with one OR each.  (The shot bitboard is
+# built in a bytearray and converted once, since setting the bits of a large
+# integer one at a time copies it every time.)  Each ship then costs one AND
+# to count its new hits and tell whether it sank, so a salvo of k shots costs
+# k byte writes plus a few whole-board operations, not k calls to make_move.
+# Only the shots that hit are looked at one by one, to say which ship they
+# hit.
+
+from typing import NamedTuple
+from battleship_game_functions import UNKNOWN, valid_cell_indexes, \
+                                      get_ship_symbols
+from bitboard_grid import BitboardFleetGrid, BitboardTargetGrid, full_mask
+from computer_play_functions import generate_fleet_grid
+from probability_density import Observation
+from strategies import get_strategy
+from ship_tracker import ShotResult, MISS_RESULT, HIT_RESULT, SUNK_RESULT, \
+                         WIN_RESULT
+
+
+class SalvoResult(NamedTuple):
+    """The result of a salvo: the result of each shot, in the order they
+    were given, and the indexes of the ships the salvo sank, in index
+    order."""
+    shots: list[ShotResult]
+    sunk: list[int]
+
+
+def fire_salvo(cells: list[list[int]], fleet_grid: BitboardFleetGrid,
+               target_grid: BitboardTargetGrid, ship_symbols: list[str],
+               hits_list: list[int]) -> SalvoResult:
+    """Fire a shot at every [row, col] in cells at once, record them all in
+    target_grid, fleet_grid and hits_list, and return the salvo's result.
+
+    The shots land together, so the last shot of the salvo at a ship it sank
+    is the one reported as SUNK_RESULT, and the last of those as WIN_RESULT
+    if the salvo sank the whole fleet.  ship_symbols and hits_list are
+    parallel lists.  Raise ValueError, and change nothing, if a cell is not
+    on the grid, appears twice or has already been shot at.
+
+    >>> from battleship_game_functions import EMPTY
+    >>> fleet = BitboardFleetGrid.from_grid([['a', 'a', EMPTY],
+    ...                                      [EMPTY, EMPTY, EMPTY],
+    ...                                      ['b', 'b', 'b']])
+    >>> target = BitboardTargetGrid(3)
+    >>> hits_list = [0, 0]
+    >>> result = fire_salvo([[0, 1], [1, 1], [0, 0]], fleet, target,
+    ...                     ['a', 'b'], hits_list)
+    >>> [shot.kind for shot in result.shots], result.sunk, hits_list
+    (['hit', 'miss', 'sunk'], [0], [2, 0])
+    >>> target == [['X', 'X', '-'], ['-', 'M', '-'], ['-', '-', '-']]
+    True
+    >>> fire_salvo([[2, 0], [2, 1], [2, 2]], fleet, target, ['a', 'b'],
+    ...            hits_list).shots[-1]
+    ShotResult(kind='win', ship_index=1)
+    >>> fire_salvo([[1, 0], [1, 1]], fleet, target, ['a', 'b'], hits_list)
+    Traceback (most recent call last):
+    ...
+    ValueError: cell (1, 1) has already been shot at
+    """
+    grid_size = target_grid.grid_size
+    shot_bytes = bytearray((grid_size * grid_size + 7) // 8)
+    for row, col in cells:
+        if not valid_cell_indexes(row, col, grid_size):
+            raise ValueError(f'cell ({row}, {col}) is not on the grid')
+        index = row * grid_size + col
+        if shot_bytes[index >> 3] & (1 << (index & 7)):
+            raise ValueError(f'cell ({row}, {col}) is in the salvo twice')
+        shot_bytes[index >> 3] |= 1 << (index & 7)
+    shot_mask = int.from_bytes(shot_bytes, 'little')
+    if shot_mask & (target_grid.hits | target_grid.misses):
+        for row, col in cells:
+            if target_grid[row][col] != UNKNOWN:
+                raise ValueError(
+                    f'cell ({row}, {col}) has already been shot at')
+
+    hit_mask = shot_mask & fleet_grid.occupied
+    target_grid.hits |= hit_mask
+    target_grid.misses |= shot_mask & ~hit_mask
+    fleet_grid.hits |= hit_mask
+
+    ship_at = {}
+    sunk = []
+    for ship_index in range(len(ship_symbols)):
+        ship_mask = fleet_grid.ship_masks.get(ship_symbols[ship_index], 0)
+        ship_hits = ship_mask & hit_mask
+        if not ship_hits:
+            continue
+        hits_list[ship_index] += ship_hits.bit_count()
+        if ship_mask & fleet_grid.hits == ship_mask:
+            sunk.append(ship_index)
+        while ship_hits:
+            low_bit = ship_hits & -ship_hits
+            ship_at[low_bit.bit_length() - 1] = ship_index
+            ship_hits ^= low_bit
+
+    shots = []
+    last_shot_at = {}
+    for row, col in cells:
+        ship_index = ship_at.get(row * grid_size + col, -1)
+        if ship_index == -1:
+            shots.append(ShotResult(MISS_RESULT, -1))
+        else:
+            last_shot_at[ship_index] = len(shots)
+            shots.append(ShotResult(HIT_RESULT, ship_index))
+    sinking_shots = sorted(last_shot_at[ship_index] for ship_index in sunk)
+    for i in sinking_shots:
+        shots[i] = ShotResult(SUNK_RESULT, shots[i].ship_index)
+    if sinking_shots and fleet_grid.all_sunk():
+        shots[sinking_shots[-1]] = ShotResult(WIN_RESULT,
+                                              shots[sinking_shots[-1]]
+                                              .ship_index)
+    return SalvoResult(shots, sunk)
+
+
+def choose_salvo(target_grid: BitboardTargetGrid, ship_sizes: list[int],
+                 num_shots: int, strategy: str,
+                 sunk_sizes: list[int] = ()) -> list[list[int]]:
+    """Return up to num_shots distinct UNKNOWN cells of target_grid to fire
+    at as a salvo, chosen one by one by the strategy registered under the
+    name strategy (see strategies.py) for the afloat ships in ship_sizes,
+    when the ships in sunk_sizes are sunk.
+
+    Cells already chosen count as misses while the rest are chosen, which
+    spreads the salvo out; target_grid itself is not changed.
+
+    >>> target = BitboardTargetGrid(2)
+    >>> sorted(choose_salvo(target, [1], 5, 'density'))
+    [[0, 0], [0, 1], [1, 0], [1, 1]]
+    >>> target.num_moves()
+    0
+    """
+    grid_size = target_grid.grid_size
+    player = get_strategy(strategy)
+    player.new_game(grid_size, list(ship_sizes) + list(sunk_sizes))
+    hits = target_grid.hits
+    misses = target_grid.misses
+    cells = []
+    while len(cells) < num_shots and full_mask(grid_size) & ~(hits | misses):
+        row, col = player.next_shot(Observation(grid_size, hits, misses,
+                                                tuple(ship_sizes),
+                                                tuple(sunk_sizes)))
+        misses |= 1 << (row * grid_size + col)
+        cells.append([row, col])
+    return cells
+
+
+def play_salvo_game(grid_size: int, ship_sizes: list[int],
+                    strategies: list[str]) -> list[int]:
+    """Play one salvo game between two computer players that use the
+    strategies registered under the two names in strategies (see
+    strategies.py), taking turns with the first player going first.  Each
+    turn a player fires one shot per ship of their own still afloat.  Return
+    a two-item list: the index of the winning player and the number of
+    salvos the winner fired.
+
+    >>> winner, salvos = play_salvo_game(4, [2, 1], ['random', 'density'])
+    >>> winner in (0, 1) and 1 <= salvos <= 16
+    True
+    """
+    ship_symbols = get_ship_symbols(ship_sizes)
+    fleet_grids = [BitboardFleetGrid.from_grid(
+                       generate_fleet_grid(grid_size, ship_symbols, ship_sizes))
+                   for _ in strategies]
+    target_grids = [BitboardTargetGrid(grid_size) for _ in strategies]
+    hits_lists = [[0] * len(ship_sizes) for _ in strategies]
+    num_salvos = [0] * len(strategies)
+
+    player = 0
+    while True:
+        own_fleet = fleet_grids[player]
+        enemy_fleet = fleet_grids[1 - player]
+        num_shots = sum(not own_fleet.is_sunk(ship_symbol)
+                        for ship_symbol in ship_symbols)
+        afloat = [ship_sizes[i] for i in range(len(ship_sizes))
+                  if not enemy_fleet.is_sunk(ship_symbols[i])]
+        sunk = [ship_sizes[i] for i in range(len(ship_sizes))
+                if enemy_fleet.is_sunk(ship_symbols[i])]
+        cells = choose_salvo(target_grids[player], afloat, num_shots,
+                             strategies[player], sunk)
+        fire_salvo(cells, enemy_fleet, target_grids[player], ship_symbols,
+                   hits_lists[player])
+        num_salvos[player] += 1
+        if enemy_fleet.all_sunk():
+            return [player, num_salvos[player]]
+        player = 1 - player
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
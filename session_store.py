@@ -0,0 +1,222 @@
+# The file contains a store of game sessions that keeps recently used
+# sessions in memory and moves idle ones to a SQLite file.
+#
+# Sessions in memory are kept in least recently used order.  When their
+# estimated size goes over the memory budget, the least recently used ones
+# are evicted: each is encoded with pack_game (see replay_format.py), which
+# takes a few bytes per move, and queued for writing.  Queued sessions are
+# written with a single executemany once BATCH_SIZE of them are waiting (or
+# on flush), so a move never waits for the disk.  Getting an evicted
+# session decodes it and replays its shots, so callers never see the
+# difference.
+
+import secrets
+import sqlite3
+import sys
+from collections import OrderedDict
+from battleship_game_functions import get_ship_symbols
+from move_journal import MoveJournal
+from replay_format import pack_game, unpack_game, replay_journals, \
+                          get_fleet_layout
+
+# The default memory budget of the sessions in memory, in bytes.
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
+
+# The number of queued writes that triggers a batch write.
+BATCH_SIZE = 100
+
+
+class GameSession:
+    """The state of one game on the server: the journal of the player's
+    shots and, in a versus game, the journal of the computer's shots and
+    the computer's strategy (None in a single-player game)."""
+
+    def __init__(self, journal: MoveJournal, ai_journal: MoveJournal = None,
+                 strategy: str = None) -> None:
+        """Initialize a session of the game in the journals."""
+        self.journal = journal
+        self.ai_journal = ai_journal
+        self.strategy = strategy
+
+
+def estimate_session_size(session: GameSession) -> int:
+    """Return an estimate, in bytes, of the memory that session can take up
+    by the end of its game: its grids, with one list per row, and a move
+    record for every cell of each target grid."""
+    grid_size = len(session.journal.target_grid)
+    row_size = sys.getsizeof([None] * grid_size)
+    num_journals = 1 if session.ai_journal is None else 2
+    return num_journals * grid_size * (2 * row_size + 100 * grid_size)
+
+
+def encode_session(session: GameSession) -> bytes:
+    """Return the encoding of session's game, in the format of pack_game.
+
+    Player 0 is the human player and player 1, in a versus game, is the
+    computer, which always replies to the player's shot.
+    """
+    journal = session.journal
+    ship_sizes = journal.tracker.ship_sizes
+    ship_symbols = get_ship_symbols(ship_sizes)
+    grid_size = len(journal.target_grid)
+    if session.ai_journal is None:
+        journals = [journal]
+        fleet_grids = [journal.fleet_grid]
+    else:
+        journals = [journal, session.ai_journal]
+        fleet_grids = [session.ai_journal.fleet_grid, journal.fleet_grid]
+    fleets = [get_fleet_layout(fleet_grid, ship_symbols)
+              for fleet_grid in fleet_grids]
+    shots = []
+    num_shots = sum(player_journal.num_moves() for player_journal in journals)
+    for i in range(num_shots):
+        record = journals[i % len(journals)].records[i // len(journals)]
+        shots.append(record.row * grid_size + record.col)
+    return pack_game(grid_size, ship_sizes, fleets, shots)
+
+
+def decode_session(data: bytes, strategy: str) -> GameSession:
+    """Return the session encoded in data by encode_session, whose computer
+    player uses strategy (None in a single-player game)."""
+    journals = replay_journals(unpack_game(data))
+    if strategy is None:
+        return GameSession(journals[0])
+    return GameSession(journals[0], journals[1], strategy)
+
+
+class SessionStore:
+    """Game sessions by id, kept in memory within a memory budget and in a
+    SQLite database otherwise.
+
+    >>> from battleship_game_functions import EMPTY, UNKNOWN
+    >>> store = SessionStore(':memory:', memory_budget=0)
+    >>> fleet_grid = [['a', 'a'], [EMPTY, EMPTY]]
+    >>> journal = MoveJournal(fleet_grid, [[UNKNOWN] * 2 for _ in range(2)],
+    ...                       ['a'], [2], [0])
+    >>> _ = journal.shoot(0, 1)
+    >>> session_id = store.add(GameSession(journal))
+    >>> store.num_in_memory(), store.evictions
+    (0, 1)
+    >>> restored = store.get(session_id)
+    >>> restored.journal.fleet_grid, restored.journal.num_moves()
+    ([['a', 'A'], ['.', '.']], 1)
+    >>> store.restores
+    1
+    """
+
+    def __init__(self, database: str,
+                 memory_budget: int = DEFAULT_MEMORY_BUDGET) -> None:
+        """Initialize a store with a memory budget of memory_budget bytes
+        that keeps evicted sessions in the SQLite file database."""
+        self.memory_budget = memory_budget
+        self.memory_used = 0
+        self.evictions = 0
+        self.restores = 0
+        self._sessions = OrderedDict()
+        self._sizes = {}
+        self._pending = {}
+        self._connection = sqlite3.connect(database)
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS sessions '
+            '(id TEXT PRIMARY KEY, strategy TEXT, game BLOB)')
+
+    def num_in_memory(self) -> int:
+        """Return the number of sessions in memory."""
+        return len(self._sessions)
+
+    def add(self, session: GameSession) -> str:
+        """Add session to the store and return its new id."""
+        session_id = secrets.token_hex(8)
+        self._keep(session_id, session)
+        return session_id
+
+    def get(self, session_id: str) -> GameSession:
+        """Return the session with id session_id, restoring it into memory
+        if it was evicted.  Raise KeyError if there is no such session."""
+        if session_id in self._sessions:
+            self._sessions.move_to_end(session_id)
+            return self._sessions[session_id]
+        if session_id in self._pending:
+            if self._pending[session_id] is None:
+                raise KeyError(session_id)
+            row = self._pending.pop(session_id)
+        else:
+            row = self._connection.execute(
+                'SELECT id, strategy, game FROM sessions WHERE id = ?',
+                (session_id,)).fetchone()
+            if row is None:
+                raise KeyError(session_id)
+        session = decode_session(row[2], row[1])
+        self.restores += 1
+        self._keep(session_id, session)
+        return session
+
+    def put(self, session_id: str, session: GameSession) -> None:
+        """Store session, which may have changed since it was got, as the
+        session with id session_id, and make it the most recently used.  Any
+        copy of it evicted in the meantime is out of date and is dropped."""
+        if session_id in self._sessions:
+            self._sessions.move_to_end(session_id)
+        else:
+            self._pending.pop(session_id, None)
+            self._keep(session_id, session)
+
+    def remove(self, session_id: str) -> None:
+        """Remove the session with id session_id, if there is one."""
+        if session_id in self._sessions:
+            del self._sessions[session_id]
+            self.memory_used -= self._sizes.pop(session_id)
+        self._pending[session_id] = None
+        self._flush_if_full()
+
+    def flush(self) -> None:
+        """Write every queued eviction and removal to the database."""
+        if not self._pending:
+            return
+        removed = [(session_id,) for session_id, row in self._pending.items()
+                   if row is None]
+        evicted = [row for row in self._pending.values() if row is not None]
+        with self._connection:
+            self._connection.executemany(
+                'DELETE FROM sessions WHERE id = ?', removed)
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)', evicted)
+        self._pending = {}
+
+    def close(self) -> None:
+        """Write every session, including those in memory, to the database
+        and close it."""
+        while self._sessions:
+            self._evict()
+        self.flush()
+        self._connection.close()
+
+    def _keep(self, session_id: str, session: GameSession) -> None:
+        """Keep session in memory as the most recently used session, and
+        evict sessions until the memory budget is met."""
+        size = estimate_session_size(session)
+        self._sessions[session_id] = session
+        self._sizes[session_id] = size
+        self.memory_used += size
+        while self.memory_used > self.memory_budget and self._sessions:
+            self._evict()
+
+    def _evict(self) -> None:
+        """Queue the least recently used session in memory to be written
+        and drop it from memory."""
+        session_id, session = self._sessions.popitem(last=False)
+        self.memory_used -= self._sizes.pop(session_id)
+        self._pending[session_id] = (session_id, session.strategy,
+                                     encode_session(session))
+        self.evictions += 1
+        self._flush_if_full()
+
+    def _flush_if_full(self) -> None:
+        """Write the queued writes if there are at least BATCH_SIZE."""
+        if len(self._pending) >= BATCH_SIZE:
+            self.flush()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,178 @@
+# The file contains ship tables, which identify the ships of a fleet by
+# integer ids 0, 1, 2, ... instead of by their symbols.
+#
+# Ship symbols are one character long and are only needed to read and write
+# game files and to display grids, so a fleet whose ships are named by
+# symbols runs out of names after a few dozen letters.  A ship table keeps
+# the ship sizes in a list indexed by ship id and maps symbols to ids with a
+# dictionary, so every lookup takes constant time whatever the number of
+# ships.  Symbols are handed out from the lower-case letters of Unicode that
+# have a distinct upper-case letter (so a hit can still be shown in upper
+# case), and fleets with more ships than that can go without symbols.
+
+from functools import lru_cache
+from random import randint
+from battleship_game_functions import EMPTY, UNKNOWN
+
+# The number of tries at placing one ship before place_ships gives up.
+MAX_PLACEMENT_TRIES = 100000
+
+# Ship symbols are looked for below this code point: the first two planes
+# of Unicode hold every cased letter.
+MAX_SYMBOL_CODE = 0x20000
+
+
+@lru_cache(maxsize=None)
+def get_symbol_alphabet() -> str:
+    """Return every character that can be handed out as a ship symbol, in
+    the order they are handed out: the printable lower-case letters below
+    MAX_SYMBOL_CODE whose upper-case form is a different single character,
+    except EMPTY and UNKNOWN.
+
+    >>> get_symbol_alphabet()[:28]
+    'abcdefghijklmnopqrstuvwxyzàá'
+    """
+    symbols = []
+    for code in range(MAX_SYMBOL_CODE):
+        symbol = chr(code)
+        upper = symbol.upper()
+        if symbol.islower() and symbol.isprintable() and len(upper) == 1 \
+           and upper != symbol and upper.lower() == symbol \
+           and symbol not in (EMPTY, UNKNOWN):
+            symbols.append(symbol)
+    return ''.join(symbols)
+
+
+class ShipSymbols(list):
+    """A list of distinct ship symbols whose index method takes constant
+    time.  It must not be changed after it is created.
+
+    >>> symbols = ShipSymbols(['a', 'b', 'c'])
+    >>> symbols.index('c'), symbols
+    (2, ['a', 'b', 'c'])
+    >>> symbols.index('z')
+    Traceback (most recent call last):
+    ...
+    ValueError: 'z' is not a ship symbol
+    """
+
+    def __init__(self, ship_symbols: list[str]) -> None:
+        """Initialize a list of ship_symbols."""
+        super().__init__(ship_symbols)
+        self._ids = {}
+        for ship_id in range(len(self)):
+            self._ids.setdefault(self[ship_id], ship_id)
+
+    def index(self, ship_symbol: str, *args) -> int:
+        """Return the index of ship_symbol.  Raise ValueError if it is not
+        in the list."""
+        if args:
+            return super().index(ship_symbol, *args)
+        try:
+            return self._ids[ship_symbol]
+        except KeyError:
+            raise ValueError(f'{ship_symbol!r} is not a ship symbol') \
+                from None
+
+    def __contains__(self, ship_symbol: object) -> bool:
+        return ship_symbol in self._ids
+
+
+def make_ship_symbols(num_ships: int) -> ShipSymbols:
+    """Return distinct ship symbols for num_ships ships.  Raise ValueError if
+    there are not enough symbols.
+
+    >>> make_ship_symbols(3)
+    ['a', 'b', 'c']
+    >>> len(make_ship_symbols(1000))
+    1000
+    """
+    alphabet = get_symbol_alphabet()
+    if num_ships > len(alphabet):
+        raise ValueError(f'there are only {len(alphabet)} ship symbols')
+    return ShipSymbols(alphabet[:num_ships])
+
+
+class ShipTable:
+    """The ships of a fleet by id: ship id i has size sizes[i] and, if the
+    fleet has symbols, symbol symbols[i].
+
+    >>> table = ShipTable([5, 4, 3])
+    >>> table.ship_id('b'), table.symbol_of(2), table.sizes[0], len(table)
+    (1, 'c', 5, 3)
+    >>> ShipTable([1] * 5000).symbols is None
+    True
+    """
+
+    def __init__(self, ship_sizes: list[int],
+                 ship_symbols: list[str] = None) -> None:
+        """Initialize a table of the ships in ship_sizes, named by the
+        corresponding symbols in ship_symbols.  If ship_symbols is None,
+        symbols are made with make_ship_symbols, or left out if there are
+        more ships than symbols."""
+        self.sizes = list(ship_sizes)
+        if ship_symbols is not None:
+            self.symbols = ShipSymbols(ship_symbols)
+        elif len(ship_sizes) <= len(get_symbol_alphabet()):
+            self.symbols = make_ship_symbols(len(ship_sizes))
+        else:
+            self.symbols = None
+
+    def __len__(self) -> int:
+        """Return the number of ships."""
+        return len(self.sizes)
+
+    def ship_id(self, ship_symbol: str) -> int:
+        """Return the id of the ship with ship_symbol.  Raise ValueError if
+        there is no such ship."""
+        if self.symbols is None:
+            raise ValueError('the fleet has no ship symbols')
+        return self.symbols.index(ship_symbol)
+
+    def symbol_of(self, ship_id: int) -> str:
+        """Return the symbol of ship ship_id.  Raise ValueError if the fleet
+        has no symbols."""
+        if self.symbols is None:
+            raise ValueError('the fleet has no ship symbols')
+        return self.symbols[ship_id]
+
+
+def place_ships(grid_size: int, ship_sizes: list[int]) -> list[list[int]]:
+    """Return, for each ship in ship_sizes, the cell numbers row * grid_size
+    + col of a random position on a grid_size by grid_size grid, with no two
+    ships overlapping.  The work and memory grow with the total ship size,
+    not with the number of cells.  Raise ValueError if a ship cannot be
+    placed after MAX_PLACEMENT_TRIES tries.
+
+    >>> ships = place_ships(1000, [3] * 2000)
+    >>> len(ships), len({cell for cells in ships for cell in cells})
+    (2000, 6000)
+    """
+    occupied = set()
+    placements = [None] * len(ship_sizes)
+    for ship_id in sorted(range(len(ship_sizes)),
+                          key=lambda i: -ship_sizes[i]):
+        ship_size = ship_sizes[ship_id]
+        for _ in range(MAX_PLACEMENT_TRIES):
+            if randint(0, 1) == 0:
+                row = randint(0, grid_size - 1)
+                col = randint(0, grid_size - ship_size)
+                step = 1
+            else:
+                row = randint(0, grid_size - ship_size)
+                col = randint(0, grid_size - 1)
+                step = grid_size
+            start = row * grid_size + col
+            cells = list(range(start, start + step * ship_size, step))
+            if occupied.isdisjoint(cells):
+                occupied.update(cells)
+                placements[ship_id] = cells
+                break
+        else:
+            raise ValueError(f'ship {ship_id} could not be placed')
+    return placements
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
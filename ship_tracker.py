@@ -0,0 +1,146 @@
+# The file contains a tracker of which ships are hit, sunk and afloat.
+#
+# The tracker identifies the ships by their ids in a ship table (see
+# ship_table.py), maps every unhit ship cell directly to the id of its ship
+# and keeps the number of unhit cells of each ship and of the whole fleet,
+# so resolving a shot, telling whether it sank a ship and telling whether
+# it won the game take constant time.
+
+from typing import NamedTuple
+from fleet_validation import iter_ship_cells
+from ship_table import ShipTable
+
+# The kinds of result a shot can have.
+MISS_RESULT = 'miss'
+HIT_RESULT = 'hit'
+SUNK_RESULT = 'sunk'
+WIN_RESULT = 'win'
+
+
+class ShotResult(NamedTuple):
+    """The result of a shot: one of the kinds of result above and the index
+    of the ship that was hit, or -1 for a miss.  A WIN_RESULT also sinks the
+    ship that was hit."""
+    kind: str
+    ship_index: int
+
+
+class ShipTracker:
+    """The state of the ships in a fleet grid as shots are fired at it.  The
+    index of a ship is its id in table, a ShipTable of the fleet.
+
+    ship_symbols and ship_sizes are parallel lists.
+
+    >>> from battleship_game_functions import EMPTY
+    >>> fleet_grid = [['a', 'a', EMPTY], [EMPTY, EMPTY, 'b'], [EMPTY] * 3]
+    >>> tracker = ShipTracker(fleet_grid, ['a', 'b'], [2, 1])
+    >>> tracker.shoot(2, 2)
+    ShotResult(kind='miss', ship_index=-1)
+    >>> tracker.shoot(0, 0)
+    ShotResult(kind='hit', ship_index=0)
+    >>> tracker.shoot(1, 2)
+    ShotResult(kind='sunk', ship_index=1)
+    >>> tracker.afloat_sizes(), tracker.has_won()
+    ([2], False)
+    >>> tracker.shoot(0, 1)
+    ShotResult(kind='win', ship_index=0)
+    >>> tracker.has_won()
+    True
+    """
+
+    def __init__(self, fleet_grid: list[list[str]], ship_symbols: list[str],
+                 ship_sizes: list[int]) -> None:
+        """Initialize a tracker of the ships in ship_symbols, with the sizes
+        in ship_sizes, in fleet_grid.  Upper-case ship symbols in fleet_grid
+        count as cells that have already been hit."""
+        grid_size = len(fleet_grid)
+        table = ShipTable(ship_sizes, ship_symbols)
+        symbols = table.symbols
+        ship_at = {}
+        hit_counts = [0] * len(table)
+        for row, col, symbol in iter_ship_cells(fleet_grid):
+            if symbol in symbols:
+                ship_at[row * grid_size + col] = symbols.index(symbol)
+            elif symbol.lower() in symbols:
+                hit_counts[symbols.index(symbol.lower())] += 1
+        self._track(grid_size, table, ship_at, hit_counts)
+
+    @classmethod
+    def from_ship_cells(cls, grid_size: int,
+                        ship_cells: list[list[int]]) -> 'ShipTracker':
+        """Return a tracker of the ships of a grid_size by grid_size grid
+        whose ship with id i (see ship_table.py) covers the cell numbers
+        row * grid_size + col in ship_cells[i].  The ships get symbols from
+        ShipTable if there are enough, and no fleet grid is built, so fleets
+        of thousands of ships on large boards can be tracked.
+
+        >>> tracker = ShipTracker.from_ship_cells(1000, [[0, 1], [999999]])
+        >>> tracker.shoot(999, 999), tracker.afloat_sizes()
+        (ShotResult(kind='sunk', ship_index=1), [2])
+        >>> tracker.table.symbol_of(1)
+        'b'
+        """
+        ship_at = {}
+        for ship_id in range(len(ship_cells)):
+            for cell in ship_cells[ship_id]:
+                ship_at[cell] = ship_id
+        # No fleet grid to read the ships from, so __init__ is skipped
+        tracker = cls.__new__(cls)
+        tracker._track(grid_size, ShipTable([len(cells)
+                                             for cells in ship_cells]),
+                       ship_at, [0] * len(ship_cells))
+        return tracker
+
+    def _track(self, grid_size: int, table: ShipTable, ship_at: dict,
+               hit_counts: list[int]) -> None:
+        """Start tracking the ships of table on a grid_size by grid_size
+        grid, where ship_at maps the cell number row * grid_size + col of
+        each unhit ship cell to its ship id and ship i already has
+        hit_counts[i] cells hit."""
+        self.grid_size = grid_size
+        self.table = table
+        self.ship_sizes = table.sizes
+        self.remaining = [table.sizes[i] - hit_counts[i]
+                          for i in range(len(table))]
+        self.total_remaining = sum(self.remaining)
+        self._ship_at = ship_at
+
+    def shoot(self, row: int, col: int) -> ShotResult:
+        """Record a shot at (row, col) and return its result.  A second shot
+        at the same cell is a miss."""
+        ship_index = self._ship_at.pop(row * self.grid_size + col, -1)
+        if ship_index == -1:
+            return ShotResult(MISS_RESULT, -1)
+        self.remaining[ship_index] -= 1
+        self.total_remaining -= 1
+        if self.total_remaining == 0:
+            return ShotResult(WIN_RESULT, ship_index)
+        if self.remaining[ship_index] == 0:
+            return ShotResult(SUNK_RESULT, ship_index)
+        return ShotResult(HIT_RESULT, ship_index)
+
+    def unshoot(self, row: int, col: int, result: ShotResult) -> None:
+        """Undo the shot at (row, col) that returned result, which must be
+        the most recent shot at that cell."""
+        if result.ship_index != -1:
+            self._ship_at[row * self.grid_size + col] = result.ship_index
+            self.remaining[result.ship_index] += 1
+            self.total_remaining += 1
+
+    def is_sunk(self, ship_index: int) -> bool:
+        """Return True if and only if ship number ship_index is sunk."""
+        return self.remaining[ship_index] == 0
+
+    def has_won(self) -> bool:
+        """Return True if and only if every ship is sunk."""
+        return self.total_remaining == 0
+
+    def afloat_sizes(self) -> list[int]:
+        """Return the sizes of the ships that are not sunk."""
+        return [self.ship_sizes[i] for i in range(len(self.ship_sizes))
+                if self.remaining[i] > 0]
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
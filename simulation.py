@@ -0,0 +1,210 @@
+# The file contains a headless engine that plays complete computer vs.
+# computer games with no input or output, and spreads many games over a
+# multiprocessing pool.
+#
+# Each worker plays a chunk of games after seeding its random number
+# generator from the overall seed and the chunk number, so a run is
+# reproducible for a given seed and chunk size however the chunks are
+# scheduled.  When the games are recorded, each chunk writes its own replay
+# file, and the files are merged in chunk order once every chunk is done.
+
+from multiprocessing import Pool
+import os
+import random
+from battleship_game_functions import get_ship_symbols
+from computer_play_functions import generate_fleet_grid
+from bitboard_grid import BitboardTargetGrid
+from ship_tracker import WIN_RESULT
+from move_journal import MoveJournal
+from replay_format import ReplayWriter, get_fleet_layout, \
+                          merge_replay_files
+from anytime_ai import observe_journal
+from strategies import get_strategy
+
+# The largest number of games that one worker task plays.
+MAX_CHUNK_SIZE = 1000
+
+
+def play_headless_game(grid_size: int, ship_sizes: list[int],
+                       strategies: list[str],
+                       replay: ReplayWriter = None) -> list[int]:
+    """Play one game between two computer players that use the strategies
+    registered under the two names in strategies (see strategies.py),
+    taking turns with the first player going first.  Return a two-item
+    list: the index of the winning player and the number of moves the
+    winner made.
+
+    If replay is not None, the game is written to it (see replay_format.py).
+    The random number generator is then first reseeded with a seed drawn
+    from it, which is recorded with the game.
+
+    >>> random.seed(1)
+    >>> winner, moves = play_headless_game(3, [2], ['random', 'random'])
+    >>> winner in (0, 1) and 2 <= moves <= 9
+    True
+    """
+    if replay is not None:
+        seed = random.getrandbits(63)
+        random.seed(seed)
+    ship_symbols = get_ship_symbols(ship_sizes)
+    fleet_grids = [generate_fleet_grid(grid_size, ship_symbols, ship_sizes)
+                   for _ in strategies]
+    if replay is not None:
+        fleets = [get_fleet_layout(fleet_grid, ship_symbols)
+                  for fleet_grid in fleet_grids]
+    players = []
+    journals = []
+    for player in range(len(strategies)):
+        players.append(get_strategy(strategies[player]))
+        players[player].new_game(grid_size, ship_sizes)
+        # Bitboard target grids make each player's Observation cheap
+        journals.append(MoveJournal(fleet_grids[1 - player],
+                                    BitboardTargetGrid(grid_size),
+                                    ship_symbols, ship_sizes,
+                                    [0] * len(ship_sizes)))
+
+    player = 0
+    while True:
+        journal = journals[player]
+        row, col = players[player].next_shot(observe_journal(journal))
+        if journal.shoot(row, col).kind == WIN_RESULT:
+            if replay is not None:
+                num_shots = journals[0].num_moves() + journals[1].num_moves()
+                shots = []
+                for i in range(num_shots):
+                    record = journals[i % 2].records[i // 2]
+                    shots.append(record.row * grid_size + record.col)
+                replay.write_game(grid_size, ship_sizes, fleets, shots, seed)
+            return [player, journal.num_moves()]
+        player = 1 - player
+
+
+def _play_chunk(task: tuple) -> dict:
+    """Play the chunk of games described by task, a tuple of (seed, chunk
+    number, number of games, grid size, ship sizes, strategies, replay file
+    name), and return its results in the form returned by simulate_games.
+    If the replay file name is not None, the games are written to that
+    replay file."""
+    seed, chunk, num_games, grid_size, ship_sizes, strategies, replay = task
+    random.seed(f'{seed}-{chunk}')
+    results = _empty_results()
+    if replay is None:
+        for _ in range(num_games):
+            winner, moves = play_headless_game(grid_size, ship_sizes,
+                                               strategies)
+            _add_game(results, winner, moves)
+        return results
+    with open(replay, 'wb') as replay_file:
+        with ReplayWriter(replay_file) as writer:
+            for _ in range(num_games):
+                winner, moves = play_headless_game(grid_size, ship_sizes,
+                                                   strategies, writer)
+                _add_game(results, winner, moves)
+    return results
+
+
+def _get_chunk_replay(replay: str, chunk: int) -> str:
+    """Return the name of the replay file of chunk number chunk of a run
+    recorded to the replay file replay, or None if replay is None."""
+    if replay is None:
+        return None
+    return f'{replay}.{chunk}'
+
+
+def _empty_results() -> dict:
+    """Return the results of playing no games."""
+    return {'games': 0, 'wins': [0, 0], 'moves_to_win': {}}
+
+
+def _add_game(results: dict, winner: int, moves: int) -> None:
+    """Modify results to account for a game that winner won in moves
+    moves."""
+    results['games'] += 1
+    results['wins'][winner] += 1
+    results['moves_to_win'][moves] = results['moves_to_win'].get(moves, 0) + 1
+
+
+def _merge_results(results: dict, chunk_results: dict) -> None:
+    """Modify results to include chunk_results."""
+    results['games'] += chunk_results['games']
+    for player in range(2):
+        results['wins'][player] += chunk_results['wins'][player]
+    for moves, count in chunk_results['moves_to_win'].items():
+        results['moves_to_win'][moves] = \
+            results['moves_to_win'].get(moves, 0) + count
+
+
+def simulate_games(num_games: int, grid_size: int, ship_sizes: list[int],
+                   strategies: list[str], processes: int = None,
+                   seed: int = 0, replay: str = None) -> dict:
+    """Play num_games headless games between the two registered strategies
+    named in strategies on grid_size by grid_size grids with ships of the
+    sizes in ship_sizes, using a pool of processes worker processes (one per
+    CPU if processes is None, and none at all if processes is 1).  If
+    replay is not None, every game is recorded to the replay file of that
+    name (see replay_format.py), in chunk order.
+
+    Return a dictionary with these keys:
+        - 'games': the number of games played
+        - 'wins': a two-item list of the number of games each player won
+        - 'win_rates': a two-item list of the fraction of games each player
+          won
+        - 'moves_to_win': a dictionary from a number of moves to the number
+          of games won in that many moves
+        - 'mean_moves_to_win': the mean number of moves the winner made
+
+    >>> results = simulate_games(20, 4, [2], ['random', 'density'],
+    ...                          processes=1)
+    >>> results['games'], sum(results['wins'])
+    (20, 20)
+    >>> sum(results['moves_to_win'].values())
+    20
+
+    >>> import tempfile
+    >>> from replay_format import ReplayReader
+    >>> path = os.path.join(tempfile.mkdtemp(), 'games.replay')
+    >>> results = simulate_games(130, 4, [2], ['random', 'random'],
+    ...                          processes=2, replay=path)
+    >>> with ReplayReader(path) as reader:
+    ...     len(reader), 3 <= len(reader[129].shots) <= 31
+    (130, True)
+    >>> os.listdir(os.path.dirname(path))
+    ['games.replay']
+    """
+    chunk_size = max(1, min(MAX_CHUNK_SIZE, num_games // 64))
+    tasks = []
+    for chunk, start in enumerate(range(0, num_games, chunk_size)):
+        tasks.append((seed, chunk, min(chunk_size, num_games - start),
+                      grid_size, ship_sizes, strategies,
+                      _get_chunk_replay(replay, chunk)))
+
+    results = _empty_results()
+    if processes == 1:
+        for task in tasks:
+            _merge_results(results, _play_chunk(task))
+    else:
+        with Pool(processes) as pool:
+            for chunk_results in pool.imap_unordered(_play_chunk, tasks):
+                _merge_results(results, chunk_results)
+    if replay is not None:
+        chunk_replays = [task[-1] for task in tasks]
+        with open(replay, 'wb') as replay_file:
+            merge_replay_files(chunk_replays, replay_file)
+        for chunk_replay in chunk_replays:
+            os.remove(chunk_replay)
+
+    games = max(results['games'], 1)
+    results['win_rates'] = [wins / games for wins in results['wins']]
+    total_moves = 0
+    for moves, count in results['moves_to_win'].items():
+        total_moves += moves * count
+    results['mean_moves_to_win'] = total_moves / games
+    return results
+
+
+if __name__ == '__main__':
+    summary = simulate_games(1000, 10, [5, 4, 3, 3, 2],
+                             ['random', 'density'])
+    print(f"Games played: {summary['games']}")
+    print(f"Win rates: {summary['win_rates']}")
+    print(f"Mean moves to win: {summary['mean_moves_to_win']:.1f}")
@@ -0,0 +1,231 @@
+# The file contains the pluggable strategy API of the computer player and
+# the registry of the strategies it can use.
+#
+# A strategy is an object with two methods: new_game, called once before
+# each game with the grid size and the ship sizes, and next_shot, which is
+# given an Observation of what the player has seen so far (see
+# probability_density.py) and returns the [row, col] to shoot at next.  A
+# strategy may keep state between the shots of a game, so each game gets a
+# fresh object from get_strategy.
+#
+# Strategies are registered by name with a factory, usually the class
+# itself, that takes no arguments.  The built-in ones are registered below;
+# other modules can add their own with register_strategy.
+
+from battleship_game_functions import UNKNOWN, HIT, MISS
+from bitboard_grid import cell_bit, iter_cells
+from probability_density import Observation, get_observation_guess_cells, \
+                                get_live_hits, choose_random_cell
+from unknown_cell_pool import UnknownCellPool
+from incremental_density import IncrementalDensity
+from computer_play_functions import RANDOM_STRATEGY, DENSITY_STRATEGY
+from anytime_ai import ANYTIME_STRATEGY, DEFAULT_DEADLINE_MS, choose_move
+from zobrist import DecisionCache
+
+# The smallest grid size on which the density strategy keeps its densities
+# up to date shot by shot.  On smaller grids, counting them afresh with
+# bitboards is faster.
+INCREMENTAL_MIN_GRID_SIZE = 52
+
+# The number of endgame shots the anytime strategy keeps in its cache.
+ENDGAME_CACHE_SIZE = 10000
+
+# The registered strategy factories by name.
+_registry = {}
+
+
+class Strategy:
+    """A way for the computer player to choose its shots.
+
+    Subclasses implement next_shot, and new_game if they keep state between
+    the shots of a game.  uses_clock is True for a strategy whose shots
+    depend on how long it has to think, so that replaying its games with the
+    same seeds need not give the same shots.
+    """
+
+    uses_clock = False
+
+    def new_game(self, grid_size: int, ship_sizes: list[int]) -> None:
+        """Get ready for a game on a grid_size by grid_size grid against a
+        fleet of ships of the sizes in ship_sizes."""
+
+    def next_shot(self, observation: Observation) -> list[int]:
+        """Return the [row, col] of the UNKNOWN cell of observation to shoot
+        at next."""
+        raise NotImplementedError
+
+
+class RandomStrategy(Strategy):
+    """Shoot at a random UNKNOWN cell.
+
+    The UNKNOWN cells are kept in an UnknownCellPool (see
+    unknown_cell_pool.py) that each shot only takes the newly shot cells out
+    of, so a shot is one draw however full the board is.
+
+    >>> strategy = RandomStrategy()
+    >>> strategy.next_shot(Observation(2, 0b0111, 0, (1,), ()))
+    [1, 1]
+    """
+
+    def __init__(self) -> None:
+        """Initialize a strategy with no game yet."""
+        self._pool = None
+        self._shot = 0
+
+    def new_game(self, grid_size: int, ship_sizes: list[int]) -> None:
+        self._pool = UnknownCellPool([[UNKNOWN] * grid_size
+                                      for _ in range(grid_size)])
+        self._shot = 0
+
+    def next_shot(self, observation: Observation) -> list[int]:
+        grid_size = observation.grid_size
+        shot = observation.hits | observation.misses
+        if self._pool is None or self._pool.grid_size != grid_size \
+                or self._shot & ~shot:
+            # A game that new_game was not called for
+            self.new_game(grid_size, observation.afloat_sizes
+                          + observation.sunk_sizes)
+        for row, col in iter_cells(shot & ~self._shot, grid_size):
+            self._pool.remove(row, col)
+        self._shot = shot
+        return self._pool.choose()
+
+
+class DensityStrategy(Strategy):
+    """Shoot at a random one of the UNKNOWN cells that the most legal
+    placements of the ships afloat cover, like make_density_guess.
+
+    On grids of at least INCREMENTAL_MIN_GRID_SIZE rows, the densities are
+    kept in an IncrementalDensity (see incremental_density.py) that each
+    shot only updates for the newly shot cells.  As in
+    get_observation_guess_cells, the HIT cells left to the sunk ships (see
+    get_live_hits) count as MISS cells there.
+
+    >>> strategy = DensityStrategy()
+    >>> strategy.next_shot(Observation(3, 0b10000, 0b101000101, (2,), ())) \\
+    ...     in [[0, 1], [1, 0], [1, 2], [2, 1]]
+    True
+    >>> observation = Observation(60, 1 << 1830, 0, (3,), ())
+    >>> strategy.next_shot(observation) in [[30, 29], [30, 31], [29, 30],
+    ...                                     [31, 30]]
+    True
+    """
+
+    def __init__(self) -> None:
+        """Initialize a strategy with no game yet."""
+        self._grid_size = 0
+        self._density = None
+        self._hits = 0
+        self._misses = 0
+
+    def new_game(self, grid_size: int, ship_sizes: list[int]) -> None:
+        self._grid_size = grid_size
+        self._density = None
+        if grid_size >= INCREMENTAL_MIN_GRID_SIZE:
+            self._density = IncrementalDensity([[UNKNOWN] * grid_size
+                                                for _ in range(grid_size)],
+                                               ship_sizes)
+        self._hits = 0
+        self._misses = 0
+
+    def next_shot(self, observation: Observation) -> list[int]:
+        grid_size = observation.grid_size
+        if grid_size != self._grid_size:
+            self.new_game(grid_size, observation.afloat_sizes)
+        if self._density is None:
+            return choose_random_cell(
+                get_observation_guess_cells(observation), grid_size)
+        hits = get_live_hits(observation)
+        misses = observation.misses | (observation.hits & ~hits)
+        if (self._hits | self._misses) & ~(hits | misses):
+            # A game that new_game was not called for
+            self.new_game(grid_size, observation.afloat_sizes)
+        changed = (hits ^ self._hits) | (misses ^ self._misses)
+        for row, col in iter_cells(changed, grid_size):
+            bit = cell_bit(row, col, grid_size)
+            self._density.cell_changed(
+                row, col, _get_cell_value(self._hits, self._misses, bit),
+                _get_cell_value(hits, misses, bit))
+        self._hits = hits
+        self._misses = misses
+        self._density.set_ship_sizes(observation.afloat_sizes)
+        return self._density.make_guess()
+
+
+class AnytimeStrategy(Strategy):
+    """Shoot where the anytime player (see anytime_ai.py) chooses, thinking
+    for about deadline_ms milliseconds a shot.  The endgame shots are kept
+    in endgame_cache, which every game in the process shares, so that
+    positions that come up again are not searched again.
+
+    >>> strategy = AnytimeStrategy(5)
+    >>> strategy.next_shot(Observation(3, 0b10000, 0b101000101, (2,), ())) \\
+    ...     in [[0, 1], [1, 0], [1, 2], [2, 1]]
+    True
+    """
+
+    uses_clock = True
+    endgame_cache = DecisionCache(ENDGAME_CACHE_SIZE)
+
+    def __init__(self, deadline_ms: float = DEFAULT_DEADLINE_MS) -> None:
+        """Initialize a strategy that thinks for deadline_ms milliseconds a
+        shot."""
+        self.deadline_ms = deadline_ms
+
+    def next_shot(self, observation: Observation) -> list[int]:
+        choice = choose_move(observation, self.deadline_ms,
+                             cache=self.endgame_cache)
+        return [choice.row, choice.col]
+
+
+def _get_cell_value(hits: int, misses: int, bit: int) -> str:
+    """Return HIT, MISS or UNKNOWN: the value of the cell of bitboard bit
+    given the HIT cells hits and the MISS cells misses."""
+    if hits & bit:
+        return HIT
+    if misses & bit:
+        return MISS
+    return UNKNOWN
+
+
+def register_strategy(name: str, factory) -> None:
+    """Register factory, a callable that takes no arguments and returns a
+    Strategy, under name, replacing any strategy already registered under
+    it."""
+    _registry[name] = factory
+
+
+def get_strategy(name: str) -> Strategy:
+    """Return a new Strategy of the strategy registered under name.  Raise
+    ValueError if there is none.
+
+    >>> isinstance(get_strategy('density'), DensityStrategy)
+    True
+    >>> get_strategy('psychic')
+    Traceback (most recent call last):
+    ...
+    ValueError: unknown strategy 'psychic'
+    """
+    if name not in _registry:
+        raise ValueError(f'unknown strategy {name!r}')
+    return _registry[name]()
+
+
+def get_strategy_names() -> list[str]:
+    """Return the names of the registered strategies, in the order they were
+    registered.
+
+    >>> get_strategy_names()[:3]
+    ['random', 'density', 'anytime']
+    """
+    return list(_registry)
+
+
+register_strategy(RANDOM_STRATEGY, RandomStrategy)
+register_strategy(DENSITY_STRATEGY, DensityStrategy)
+register_strategy(ANYTIME_STRATEGY, AnytimeStrategy)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,324 @@
+# The file contains a round-robin tournament between the registered
+# strategies of the computer player (see strategies.py).
+#
+# Every strategy plays the same seeded fleets: fleet number i is placed
+# after seeding the random number generator with the tournament seed and i,
+# so all strategies face exactly the same games.  The players of a game of
+# Battleship never affect each other's shots, so the game between two
+# strategies on fleet i is decided by how many moves each needs to sink it
+# (the first player wins ties, and the strategies take turns going first).
+# Each strategy therefore plays each fleet once, and every pair is compared
+# game by game on the same fleets, which takes out the luck of the fleets.
+#
+# Games are played in rounds of ROUND_GAMES fleets, spread over a pool of
+# worker processes.  After each round the strategies are ranked by mean
+# moves, and the tournament stops early once each strategy is better than
+# the next one down with confidence: the confidence interval of their mean
+# paired difference, STOP_Z standard errors wide on each side, leaves out
+# zero.  STOP_Z is wider than the CONFIDENCE_Z of the reported intervals,
+# since the ranking is looked at after every round.
+#
+# By default, strategies whose shots depend on the clock (such as the
+# anytime player) are left out, since their games could not be replayed
+# with the same seeds; the report names them.
+
+import math
+import os
+import random
+from multiprocessing import Pool
+from fleet_placement import place_fleet
+from probability_density import Observation
+from strategies import get_strategy, get_strategy_names
+
+# The number of standard errors on each side of a reported confidence
+# interval of a mean (95% confidence).
+CONFIDENCE_Z = 1.96
+
+# The number of standard errors on each side of a paired difference that
+# settles a ranking.
+STOP_Z = 3.0
+
+# The percentiles of the moves to sink a fleet that are reported.
+REPORTED_PERCENTILES = (0.5, 0.9)
+
+# The number of fleets each strategy plays in a round.
+ROUND_GAMES = 32
+
+# The default least and largest number of fleets each strategy plays.
+DEFAULT_MIN_GAMES = 64
+DEFAULT_MAX_GAMES = 2000
+
+
+def make_fleet(game: int, grid_size: int, ship_sizes: list[int],
+               seed: int) -> list[int]:
+    """Return the placement bitboard of each ship in ship_sizes in fleet
+    number game of the tournament with seed seed.
+
+    >>> make_fleet(3, 5, [3, 2], 0) == make_fleet(3, 5, [3, 2], 0)
+    True
+    """
+    random.seed(f'{seed}-fleet-{game}')
+    return place_fleet(grid_size, ship_sizes)
+
+
+def play_solo_game(strategy_name: str, fleet: list[int], grid_size: int,
+                   ship_sizes: list[int]) -> int:
+    """Return the number of moves the strategy registered as strategy_name
+    takes to sink the fleet of ships of the sizes in ship_sizes placed on
+    the bitboards in fleet.  Raise ValueError if the strategy shoots off
+    the grid or at a cell twice.
+
+    >>> play_solo_game('random', [0b11], 2, [2]) in (2, 3, 4)
+    True
+    """
+    strategy = get_strategy(strategy_name)
+    strategy.new_game(grid_size, ship_sizes)
+    hits = 0
+    misses = 0
+    sunk = [False] * len(ship_sizes)
+    moves = 0
+    while not all(sunk):
+        afloat_sizes = tuple(ship_sizes[i] for i in range(len(ship_sizes))
+                             if not sunk[i])
+        sunk_sizes = tuple(ship_sizes[i] for i in range(len(ship_sizes))
+                           if sunk[i])
+        row, col = strategy.next_shot(Observation(grid_size, hits, misses,
+                                                  afloat_sizes, sunk_sizes))
+        bit = 1 << (row * grid_size + col)
+        if not (0 <= row < grid_size and 0 <= col < grid_size) \
+                or bit & (hits | misses):
+            raise ValueError(f'strategy {strategy_name!r} shot at '
+                             f'({row}, {col}), which is not UNKNOWN')
+        moves += 1
+        for i in range(len(fleet)):
+            if fleet[i] & bit:
+                hits |= bit
+                sunk[i] = fleet[i] & hits == fleet[i]
+                break
+        else:
+            misses |= bit
+    return moves
+
+
+def _play_games(task: tuple) -> tuple[str, int, list[int]]:
+    """Play the games described by task, a tuple of (seed, strategy name,
+    first fleet number, number of fleets, grid size, ship sizes), and return
+    the strategy name, the first fleet number and the moves taken on each
+    fleet."""
+    seed, strategy_name, first_game, num_games, grid_size, ship_sizes = task
+    moves = []
+    for game in range(first_game, first_game + num_games):
+        fleet = make_fleet(game, grid_size, ship_sizes, seed)
+        random.seed(f'{seed}-{strategy_name}-{game}')
+        moves.append(play_solo_game(strategy_name, fleet, grid_size,
+                                    ship_sizes))
+    return strategy_name, first_game, moves
+
+
+def get_mean_interval(values: list[float],
+                      z: float = CONFIDENCE_Z) -> tuple[float, float, float]:
+    """Return the mean of values and the low and high ends of its normal
+    confidence interval, z standard errors wide on each side.
+
+    >>> [round(value, 2) for value in get_mean_interval([1, 3, 1, 3])]
+    [2.0, 0.87, 3.13]
+    """
+    mean = sum(values) / len(values)
+    if len(values) < 2:
+        return mean, -math.inf, math.inf
+    variance = sum((value - mean) ** 2 for value in values) \
+        / (len(values) - 1)
+    margin = z * math.sqrt(variance / len(values))
+    return mean, mean - margin, mean + margin
+
+
+def get_percentile_interval(values: list[float], fraction: float,
+                            z: float = CONFIDENCE_Z) \
+                            -> tuple[float, float, float]:
+    """Return the nearest-rank fraction percentile of values and the low and
+    high ends of its distribution-free confidence interval: the values whose
+    ranks are z standard deviations of the binomial rank on either side.
+
+    >>> values = list(range(1, 101))
+    >>> get_percentile_interval(values, 0.5)
+    (50, 40, 60)
+    """
+    ordered = sorted(values)
+    count = len(ordered)
+    rank = max(1, math.ceil(fraction * count))
+    spread = z * math.sqrt(count * fraction * (1 - fraction))
+    low_rank = max(1, math.floor(fraction * count - spread))
+    high_rank = min(count, math.ceil(fraction * count + spread))
+    return ordered[rank - 1], ordered[low_rank - 1], ordered[high_rank - 1]
+
+
+def get_ranking(moves: dict[str, list[int]]) -> list[str]:
+    """Return the names of the strategies in moves, which maps each to its
+    moves on each fleet, from the fewest mean moves to the most."""
+    return sorted(moves, key=lambda name: sum(moves[name])
+                  / max(len(moves[name]), 1))
+
+
+def is_settled(moves: dict[str, list[int]], z: float = STOP_Z) -> bool:
+    """Return True if and only if each strategy in the ranking of moves
+    takes fewer moves than the next one, with the mean of their paired
+    differences more than z standard errors below zero.
+
+    >>> is_settled({'a': [10, 11, 10, 12], 'b': [20, 21, 22, 20]})
+    True
+    >>> is_settled({'a': [10, 20, 10, 20], 'b': [20, 10, 20, 10]})
+    False
+    """
+    ranking = get_ranking(moves)
+    for better, worse in zip(ranking, ranking[1:]):
+        differences = [moves[better][game] - moves[worse][game]
+                       for game in range(len(moves[better]))]
+        if get_mean_interval(differences, z)[2] >= 0:
+            return False
+    return True
+
+
+def get_default_strategy_names() -> list[str]:
+    """Return the names of the registered strategies that play the same
+    shots whenever they are given the same games, that is, whose shots do
+    not depend on the clock.
+
+    >>> get_default_strategy_names()[:2]
+    ['random', 'density']
+    >>> 'anytime' in get_default_strategy_names()
+    False
+    """
+    return [name for name in get_strategy_names()
+            if not get_strategy(name).uses_clock]
+
+
+def run_tournament(grid_size: int, ship_sizes: list[int],
+                   strategy_names: list[str] = None,
+                   min_games: int = DEFAULT_MIN_GAMES,
+                   max_games: int = DEFAULT_MAX_GAMES,
+                   processes: int = None, seed: int = 0) -> dict:
+    """Play a round-robin tournament between the strategies in
+    strategy_names (those of get_default_strategy_names if it is None) on
+    grid_size by grid_size grids with ships of the sizes in ship_sizes,
+    using a pool of processes worker processes (one per CPU if processes is
+    None, and none at all if processes is 1).  Each strategy plays between min_games and
+    max_games fleets, stopping early once the ranking is settled.
+
+    Return a dictionary with these keys:
+        - 'games': the number of fleets each strategy played
+        - 'left_out': the registered strategies that did not play because
+          their shots depend on the clock, if strategy_names is None
+        - 'settled': whether the ranking was settled
+        - 'ranking': the strategy names from best to worst
+        - 'moves': a dictionary from each strategy name to the moves it
+          took on each fleet
+        - 'means': a dictionary from each strategy name to its mean moves
+          and the ends of their confidence interval
+        - 'percentiles': a dictionary from each strategy name to a
+          dictionary from each of REPORTED_PERCENTILES to the percentile of
+          its moves and the ends of its confidence interval
+        - 'pairs': a dictionary from each pair of strategy names, in ranking
+          order, to a dictionary with the games each won head to head
+          ('wins') and their mean paired difference in moves and the ends
+          of its confidence interval ('difference')
+
+    >>> results = run_tournament(4, [2], ['random', 'density'], min_games=32,
+    ...                          max_games=64, processes=1)
+    >>> results['games'] in (32, 64), results['ranking']
+    (True, ['density', 'random'])
+    >>> sum(results['pairs'][('density', 'random')]['wins']) \\
+    ...     == results['games']
+    True
+    """
+    left_out = []
+    if strategy_names is None:
+        strategy_names = get_default_strategy_names()
+        left_out = [name for name in get_strategy_names()
+                    if name not in strategy_names]
+    for name in strategy_names:
+        get_strategy(name)
+    moves = {name: [] for name in strategy_names}
+    games = 0
+    pool = None if processes == 1 else Pool(processes)
+    try:
+        while games < max_games and (games < min_games
+                                     or not is_settled(moves)):
+            round_games = min(ROUND_GAMES, max_games - games)
+            chunk_size = max(1, -(-round_games
+                                    // (processes or os.cpu_count() or 1)))
+            tasks = [(seed, name, start,
+                      min(chunk_size, games + round_games - start),
+                      grid_size, ship_sizes)
+                     for name in strategy_names
+                     for start in range(games, games + round_games,
+                                        chunk_size)]
+            if pool is None:
+                chunks = map(_play_games, tasks)
+            else:
+                chunks = pool.map(_play_games, tasks)
+            for name, first_game, chunk_moves in sorted(chunks):
+                moves[name].extend(chunk_moves)
+            games += round_games
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    ranking = get_ranking(moves)
+    pairs = {}
+    for i in range(len(ranking)):
+        for j in range(i + 1, len(ranking)):
+            first, second = moves[ranking[i]], moves[ranking[j]]
+            wins = [0, 0]
+            for game in range(games):
+                # The strategies take turns going first, and the first
+                # player wins a tie.
+                if game % 2 == 0:
+                    wins[0 if first[game] <= second[game] else 1] += 1
+                else:
+                    wins[1 if second[game] <= first[game] else 0] += 1
+            pairs[(ranking[i], ranking[j])] = {
+                'wins': wins,
+                'difference': get_mean_interval(
+                    [first[game] - second[game] for game in range(games)])}
+    return {'games': games,
+            'left_out': left_out,
+            'settled': is_settled(moves),
+            'ranking': ranking,
+            'moves': moves,
+            'means': {name: get_mean_interval(moves[name])
+                      for name in strategy_names},
+            'percentiles': {name: {fraction: get_percentile_interval(
+                                       moves[name], fraction)
+                                   for fraction in REPORTED_PERCENTILES}
+                            for name in strategy_names},
+            'pairs': pairs}
+
+
+def format_report(results: dict) -> list[str]:
+    """Return the lines of a text report of the results of run_tournament.
+    """
+    settled = 'settled' if results['settled'] else 'not settled'
+    lines = [f"Fleets played by each strategy: {results['games']} "
+             f"(ranking {settled})"]
+    for place, name in enumerate(results['ranking'], 1):
+        mean, low, high = results['means'][name]
+        line = f'{place}. {name}: mean {mean:.2f} [{low:.2f}, {high:.2f}]'
+        for fraction, (value, low, high) in \
+                results['percentiles'][name].items():
+            line += f', p{round(fraction * 100)} {value} [{low}, {high}]'
+        lines.append(line)
+    for (first, second), pair in results['pairs'].items():
+        difference, low, high = pair['difference']
+        lines.append(f'{first} vs {second}: wins {pair["wins"][0]}-'
+                     f'{pair["wins"][1]}, moves {difference:+.2f} '
+                     f'[{low:+.2f}, {high:+.2f}]')
+    if results['left_out']:
+        lines.append(f"Left out, since their moves depend on the clock: "
+                     f"{', '.join(results['left_out'])}")
+    return lines
+
+
+if __name__ == '__main__':
+    for report_line in format_report(run_tournament(10, [5, 4, 3, 3, 2])):
+        print(report_line)
@@ -0,0 +1,105 @@
+# The file contains a pool of the UNKNOWN cells of a target grid.
+#
+# The pool keeps the cell numbers (row * grid_size + col) of the UNKNOWN cells
+# in an array, plus the position of each cell in that array.  Removing a cell
+# swaps the last cell into its place, so adding, removing and drawing a random
+# cell each take constant time however full the board is.
+
+from random import randint
+from battleship_game_functions import UNKNOWN
+from grid_engine import ObservedGrid
+
+
+class UnknownCellPool:
+    """The UNKNOWN cells of a target grid.
+
+    A pool is an observer for an ObservedGrid (see grid_engine.py), so it can
+    follow a target grid as cells are shot.
+
+    >>> pool = UnknownCellPool([[UNKNOWN, 'M'], [UNKNOWN, UNKNOWN]])
+    >>> len(pool), (0, 1) in pool
+    (3, False)
+    >>> pool.remove(1, 0)
+    >>> sorted(pool)
+    [(0, 0), (1, 1)]
+    >>> pool.add(0, 1)
+    >>> sorted(pool)
+    [(0, 0), (0, 1), (1, 1)]
+    """
+
+    def __init__(self, target_grid: list[list[str]]) -> None:
+        """Initialize a pool holding the UNKNOWN cells of target_grid."""
+        self.grid_size = len(target_grid)
+        self._cells = []
+        self._positions = {}
+        for row in range(self.grid_size):
+            for col in range(self.grid_size):
+                if target_grid[row][col] == UNKNOWN:
+                    self.add(row, col)
+
+    def __len__(self) -> int:
+        return len(self._cells)
+
+    def __contains__(self, cell: tuple[int, int]) -> bool:
+        return cell[0] * self.grid_size + cell[1] in self._positions
+
+    def __iter__(self):
+        for cell in self._cells:
+            yield divmod(cell, self.grid_size)
+
+    def add(self, row: int, col: int) -> None:
+        """Add the cell at (row, col) to the pool, if it is not there."""
+        cell = row * self.grid_size + col
+        if cell not in self._positions:
+            self._positions[cell] = len(self._cells)
+            self._cells.append(cell)
+
+    def remove(self, row: int, col: int) -> None:
+        """Remove the cell at (row, col) from the pool, if it is there."""
+        cell = row * self.grid_size + col
+        position = self._positions.pop(cell, None)
+        if position is None:
+            return
+        last_cell = self._cells.pop()
+        if last_cell != cell:
+            self._cells[position] = last_cell
+            self._positions[last_cell] = position
+
+    def choose(self) -> list[int]:
+        """Return the row and column of a cell chosen uniformly at random from
+        the pool.  Raise ValueError if the pool is empty."""
+        if not self._cells:
+            raise ValueError('there are no UNKNOWN cells left')
+        cell = self._cells[randint(0, len(self._cells) - 1)]
+        return list(divmod(cell, self.grid_size))
+
+    def cell_changed(self, row: int, col: int, old_value: str,
+                     new_value: str) -> None:
+        """Update the pool after the cell at (row, col) changed from old_value
+        to new_value."""
+        if new_value == UNKNOWN:
+            self.add(row, col)
+        elif old_value == UNKNOWN:
+            self.remove(row, col)
+
+
+class PooledTargetGrid(ObservedGrid):
+    """A target grid whose UNKNOWN cells are kept in unknown_pool as the grid
+    changes.
+
+    >>> target = PooledTargetGrid([[UNKNOWN, UNKNOWN], [UNKNOWN, UNKNOWN]])
+    >>> target[0][0] = 'M'
+    >>> target[1][1] = 'X'
+    >>> sorted(target.unknown_pool)
+    [(0, 1), (1, 0)]
+    """
+
+    def __init__(self, target_grid: list[list[str]]) -> None:
+        """Initialize a pooled view of target_grid."""
+        self.unknown_pool = UnknownCellPool(target_grid)
+        super().__init__(target_grid, [self.unknown_pool])
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,409 @@
+# The file contains Zobrist hashing of target grids and a bounded cache of
+# the computer player's decisions keyed by those hashes.
+#
+# Every (cell, symbol) pair of a grid size gets a fixed random 64-bit key,
+# and the hash of a target grid is the XOR of the keys of its HIT and MISS
+# cells.  A ZobristHash follows a target grid as an observer (see
+# grid_engine.py), so each shot updates the hash with two XORs instead of a
+# rescan of the grid.
+#
+# With symmetries on, the hash keeps one value for each of the 8 rotations
+# and reflections of the board and the smallest is the key, so a position
+# and its mirror images share one cache entry.  Cached values are stored in
+# the orientation of the smallest hash and turned back on the way out.
+#
+# The density strategy's candidate cells and density maps, and the endgame
+# solver's shots (see endgame_solver.py), are cached in a DecisionCache, an
+# LRU cache with a fixed number of entries that counts its hits and misses
+# so that it can be sized.  The endgame solver works on an Observation, so
+# its key is hashed from the Observation's bitboards with the same keys.
+
+import random
+from collections import OrderedDict
+from functools import lru_cache
+from battleship_game_functions import UNKNOWN, HIT, MISS
+from grid_engine import ObservedGrid
+from bitboard_grid import full_mask, iter_cells
+from endgame_solver import DEFAULT_MAX_LAYOUTS, DEFAULT_MAX_NODES, \
+                           EndgameSolution, solve_endgame, solve_layouts
+from probability_density import Observation, get_guess_cells, \
+                                get_density_map, choose_random_cell
+
+# The default number of entries a DecisionCache holds.
+DEFAULT_CACHE_SIZE = 100000
+
+# The number of rotations and reflections of a square board.
+NUM_SYMMETRIES = 8
+
+# The inverse of each symmetry made by transform_cell.
+INVERSE_SYMMETRY = [0, 3, 2, 1, 4, 5, 6, 7]
+
+
+def transform_cell(row: int, col: int, grid_size: int,
+                   symmetry: int) -> tuple[int, int]:
+    """Return where (row, col) of a grid_size by grid_size grid goes under
+    symmetry, a number from 0 (no change) to NUM_SYMMETRIES - 1: the
+    rotations by 0, 90, 180 and 270 degrees, then the reflections in the
+    vertical axis, the main diagonal, the horizontal axis and the other
+    diagonal.
+
+    >>> [transform_cell(0, 1, 3, symmetry) for symmetry in range(8)]
+    [(0, 1), (1, 2), (2, 1), (1, 0), (0, 1), (1, 0), (2, 1), (1, 2)]
+    """
+    last = grid_size - 1
+    if symmetry == 0:
+        return row, col
+    if symmetry == 1:
+        return col, last - row
+    if symmetry == 2:
+        return last - row, last - col
+    if symmetry == 3:
+        return last - col, row
+    if symmetry == 4:
+        return row, last - col
+    if symmetry == 5:
+        return col, row
+    if symmetry == 6:
+        return last - row, col
+    return last - col, last - row
+
+
+@lru_cache(maxsize=None)
+def get_zobrist_keys(grid_size: int) -> dict[str, list[int]]:
+    """Return the random 64-bit keys of the HIT and MISS symbols in each cell
+    number row * grid_size + col of a grid_size by grid_size grid.  The keys
+    only depend on grid_size, so hashes agree across runs and processes.
+
+    >>> keys = get_zobrist_keys(3)
+    >>> len(keys[HIT]), keys[MISS] == get_zobrist_keys(3)[MISS]
+    (9, True)
+    """
+    generator = random.Random(f'zobrist-{grid_size}')
+    return {symbol: [generator.getrandbits(64)
+                     for _ in range(grid_size * grid_size)]
+            for symbol in (HIT, MISS)}
+
+
+@lru_cache(maxsize=None)
+def get_symmetry_cells(grid_size: int, symmetry: int) -> list[int]:
+    """Return, for each cell number of a grid_size by grid_size grid, the
+    number of the cell it goes to under symmetry.
+
+    >>> get_symmetry_cells(2, 1)
+    [1, 3, 0, 2]
+    """
+    cells = []
+    for row in range(grid_size):
+        for col in range(grid_size):
+            new_row, new_col = transform_cell(row, col, grid_size, symmetry)
+            cells.append(new_row * grid_size + new_col)
+    return cells
+
+
+class ZobristHash:
+    """The Zobrist hash of a target grid, kept up to date as an observer of
+    the grid.  If symmetries is True, the hashes of all NUM_SYMMETRIES
+    transformed grids are kept and key() is the same for all of them.
+
+    >>> grid = [[UNKNOWN] * 3 for _ in range(3)]
+    >>> zobrist = ZobristHash(grid, symmetries=True)
+    >>> grid[0][1] = MISS
+    >>> zobrist.cell_changed(0, 1, UNKNOWN, MISS)
+    >>> zobrist.key() == ZobristHash(grid, True).key()
+    True
+    >>> mirror = [[UNKNOWN] * 3 for _ in range(3)]
+    >>> mirror[1][2] = MISS
+    >>> zobrist.key() == ZobristHash(mirror, True).key()
+    True
+    >>> ZobristHash(grid).key() == ZobristHash(mirror).key()
+    False
+    """
+
+    def __init__(self, target_grid: list[list[str]],
+                 symmetries: bool = False) -> None:
+        """Initialize the hash of target_grid."""
+        self.grid_size = len(target_grid)
+        num_symmetries = NUM_SYMMETRIES if symmetries else 1
+        self._keys = get_zobrist_keys(self.grid_size)
+        self._cells = [get_symmetry_cells(self.grid_size, symmetry)
+                       for symmetry in range(num_symmetries)]
+        self.hashes = [0] * num_symmetries
+        for row in range(self.grid_size):
+            for col in range(self.grid_size):
+                if target_grid[row][col] != UNKNOWN:
+                    self.cell_changed(row, col, UNKNOWN,
+                                      target_grid[row][col])
+
+    def cell_changed(self, row: int, col: int, old_value: str,
+                     new_value: str) -> None:
+        """Update the hash after the cell at (row, col) changed from
+        old_value to new_value."""
+        cell = row * self.grid_size + col
+        for symmetry in range(len(self.hashes)):
+            new_cell = self._cells[symmetry][cell]
+            if old_value in self._keys:
+                self.hashes[symmetry] ^= self._keys[old_value][new_cell]
+            if new_value in self._keys:
+                self.hashes[symmetry] ^= self._keys[new_value][new_cell]
+
+    def key(self) -> int:
+        """Return the hash, the smallest of the symmetric hashes if they are
+        kept."""
+        return min(self.hashes)
+
+    def symmetry(self) -> int:
+        """Return the symmetry whose hash is key()."""
+        return self.hashes.index(min(self.hashes))
+
+
+class HashedTargetGrid(ObservedGrid):
+    """A target grid whose Zobrist hash is kept in zobrist as the grid
+    changes.
+
+    >>> target = HashedTargetGrid([[UNKNOWN, UNKNOWN], [UNKNOWN, UNKNOWN]])
+    >>> target[0][0] = MISS
+    >>> target.zobrist.key() == ZobristHash([[MISS, UNKNOWN],
+    ...                                      [UNKNOWN, UNKNOWN]]).key()
+    True
+    """
+
+    def __init__(self, target_grid: list[list[str]],
+                 symmetries: bool = False) -> None:
+        """Initialize a hashed view of target_grid."""
+        self.zobrist = ZobristHash(target_grid, symmetries)
+        super().__init__(target_grid, [self.zobrist])
+
+
+class DecisionCache:
+    """A least recently used cache of at most max_entries values, which
+    counts the lookups that found a value (hits) and those that did not
+    (misses).
+
+    >>> cache = DecisionCache(2)
+    >>> cache.put('a', 1)
+    >>> cache.put('b', 2)
+    >>> cache.get('a'), cache.get('z')
+    (1, None)
+    >>> cache.put('c', 3)
+    >>> cache.get('b'), len(cache), cache.hits, cache.misses
+    (None, 2, 1, 2)
+    >>> round(cache.hit_rate(), 2)
+    0.33
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_CACHE_SIZE) -> None:
+        """Initialize an empty cache of at most max_entries values."""
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: object) -> object:
+        """Return the value cached for key, or None if there is none."""
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: object, value: object) -> None:
+        """Cache value, which must not be None, for key, dropping the least
+        recently used values to stay within max_entries."""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def hit_rate(self) -> float:
+        """Return the fraction of lookups that were hits, or 0.0 if there
+        were none."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def clear(self) -> None:
+        """Drop every value and reset the counters."""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+def _get_zobrist(target_grid: list[list[str]]) -> ZobristHash:
+    """Return the ZobristHash kept by target_grid, or a new one (without
+    symmetries) if it keeps none."""
+    zobrist = getattr(target_grid, 'zobrist', None)
+    if zobrist is None:
+        zobrist = ZobristHash(target_grid)
+    return zobrist
+
+
+def _transform_mask(mask: int, grid_size: int, symmetry: int) -> int:
+    """Return the bitboard of the cells of mask moved by symmetry."""
+    if symmetry == 0:
+        return mask
+    new_mask = 0
+    for row, col in iter_cells(mask, grid_size):
+        new_row, new_col = transform_cell(row, col, grid_size, symmetry)
+        new_mask |= 1 << (new_row * grid_size + new_col)
+    return new_mask
+
+
+def make_cached_density_guess(target_grid: list[list[str]],
+                              ship_sizes: list[int],
+                              cache: DecisionCache) -> list[int]:
+    """Return the same guess as make_density_guess (see
+    probability_density.py), looking up its candidate cells in cache by the
+    hash of target_grid and the sizes in ship_sizes before computing them.
+
+    target_grid is hashed from scratch unless it keeps a ZobristHash in
+    zobrist, as a HashedTargetGrid does.
+
+    >>> cache = DecisionCache()
+    >>> target = HashedTargetGrid([[UNKNOWN, MISS, UNKNOWN],
+    ...                            [MISS, UNKNOWN, MISS],
+    ...                            [UNKNOWN, UNKNOWN, UNKNOWN]], True)
+    >>> make_cached_density_guess(target, [2], cache)
+    [2, 1]
+    >>> make_cached_density_guess(target, [2], cache), cache.hits
+    ([2, 1], 1)
+    """
+    grid_size = len(target_grid)
+    zobrist = _get_zobrist(target_grid)
+    symmetry = zobrist.symmetry()
+    key = ('guess', grid_size, zobrist.key(), tuple(sorted(ship_sizes)))
+    best = cache.get(key)
+    if best is None:
+        best = get_guess_cells(getattr(target_grid, 'grid', target_grid),
+                               ship_sizes)
+        cache.put(key, _transform_mask(best, grid_size, symmetry))
+    else:
+        best = _transform_mask(best, grid_size, INVERSE_SYMMETRY[symmetry])
+    return choose_random_cell(best, grid_size)
+
+
+def get_cached_density_map(target_grid: list[list[str]],
+                           ship_sizes: list[int],
+                           cache: DecisionCache) -> list[list[int]]:
+    """Return get_density_map(target_grid, ship_sizes) (see
+    probability_density.py), looking it up in cache like
+    make_cached_density_guess.  The returned map is a new list of lists.
+
+    >>> cache = DecisionCache()
+    >>> get_cached_density_map([[UNKNOWN, UNKNOWN], [UNKNOWN, MISS]], [2],
+    ...                        cache)
+    [[2, 1], [1, 0]]
+    >>> cache.misses
+    1
+    """
+    grid_size = len(target_grid)
+    zobrist = _get_zobrist(target_grid)
+    symmetry = zobrist.symmetry()
+    key = ('map', grid_size, zobrist.key(), tuple(sorted(ship_sizes)))
+    density = cache.get(key)
+    if density is None:
+        density = get_density_map(getattr(target_grid, 'grid', target_grid),
+                                  ship_sizes)
+        stored = [[0] * grid_size for _ in range(grid_size)]
+        for row in range(grid_size):
+            for col in range(grid_size):
+                new_row, new_col = transform_cell(row, col, grid_size,
+                                                  symmetry)
+                stored[new_row][new_col] = density[row][col]
+        cache.put(key, stored)
+        return density
+    inverse = INVERSE_SYMMETRY[symmetry]
+    result = [[0] * grid_size for _ in range(grid_size)]
+    for row in range(grid_size):
+        for col in range(grid_size):
+            new_row, new_col = transform_cell(row, col, grid_size, inverse)
+            result[new_row][new_col] = density[row][col]
+    return result
+
+
+def get_observation_key(observation: Observation) -> tuple[int, int]:
+    """Return the key and the symmetry that a ZobristHash with symmetries
+    would have for the target grid of observation (see
+    probability_density.py), hashed from its HIT and MISS bitboards.
+
+    >>> grid = [[UNKNOWN, HIT, MISS], [UNKNOWN] * 3, [UNKNOWN] * 3]
+    >>> zobrist = ZobristHash(grid, True)
+    >>> get_observation_key(Observation(3, 0b10, 0b100, (2,), ())) \\
+    ...     == (zobrist.key(), zobrist.symmetry())
+    True
+    """
+    grid_size = observation.grid_size
+    keys = get_zobrist_keys(grid_size)
+    hashes = []
+    for symmetry in range(NUM_SYMMETRIES):
+        cells = get_symmetry_cells(grid_size, symmetry)
+        value = 0
+        for symbol, mask in ((HIT, observation.hits),
+                             (MISS, observation.misses)):
+            for row, col in iter_cells(mask, grid_size):
+                value ^= keys[symbol][cells[row * grid_size + col]]
+        hashes.append(value)
+    key = min(hashes)
+    return key, hashes.index(key)
+
+
+def solve_cached_endgame(observation: Observation, cache: DecisionCache,
+                         max_layouts: int = DEFAULT_MAX_LAYOUTS,
+                         max_nodes: int = DEFAULT_MAX_NODES,
+                         deadline: float = float('inf'),
+                         layouts: list[int] = None) -> EndgameSolution:
+    """Return solve_endgame(observation, max_layouts, max_nodes, deadline)
+    (see endgame_solver.py), looking the solution up in cache first by the
+    hash of observation with its symmetries folded in and by its ship
+    sizes.  If layouts, the layouts consistent with observation, is given,
+    they are solved instead of being listed again.  Only solutions are
+    cached, so a search cut short by deadline is tried again.
+
+    >>> cache = DecisionCache()
+    >>> observation = Observation(3, 0b10000, 0b101000101, (2,), ())
+    >>> solution = solve_cached_endgame(observation, cache)
+    >>> solve_cached_endgame(observation, cache) == solution, cache.hits
+    (True, 1)
+
+    The mirror image of a position is found in the cache and its shot is
+    mirrored back:
+
+    >>> solution = solve_cached_endgame(Observation(3, 0, 0b10011, (2,), ()),
+    ...                                 cache)
+    >>> mirror = solve_cached_endgame(Observation(3, 0, 0b10110, (2,), ()),
+    ...                               cache)
+    >>> [solution.row, solution.col], [mirror.row, mirror.col], cache.hits
+    ([1, 2], [1, 0], 2)
+    """
+    grid_size = observation.grid_size
+    key, symmetry = get_observation_key(observation)
+    cache_key = ('endgame', grid_size, key,
+                 tuple(sorted(observation.afloat_sizes)),
+                 tuple(sorted(observation.sunk_sizes)), max_layouts,
+                 max_nodes)
+    solution = cache.get(cache_key)
+    if solution is not None:
+        row, col = transform_cell(solution.row, solution.col, grid_size,
+                                  INVERSE_SYMMETRY[symmetry])
+        return solution._replace(row=row, col=col)
+    if layouts is None:
+        solution = solve_endgame(observation, max_layouts, max_nodes,
+                                 deadline)
+    else:
+        unknown = full_mask(grid_size) & ~(observation.hits
+                                           | observation.misses)
+        solution = solve_layouts(layouts, unknown, grid_size, max_layouts,
+                                 max_nodes, deadline)
+    if solution is not None:
+        row, col = transform_cell(solution.row, solution.col, grid_size,
+                                  symmetry)
+        cache.put(cache_key, solution._replace(row=row, col=col))
+    return solution
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()